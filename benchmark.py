@@ -0,0 +1,281 @@
+"""
+BENCHMARK: funciones update_* sobre datos sintéticos
+=====================================================
+Genera tablas con la forma de metaR y cruces en distintos tamaños y mide cada
+función update_* de la app (y los dos modos de update_liga): tiempo de pared,
+memoria pico y bytes del payload que Dash enviaría al navegador.
+
+Uso:
+    python benchmark.py                                   # tamaños por defecto
+    python benchmark.py --filas 10000 1000000 5000000 --arquetipos 20 200
+    python benchmark.py --salida benchmark_baseline.json  # guarda la línea base
+    python benchmark.py --comparar benchmark_baseline.json --tolerancia 0.25
+
+Con --comparar el script termina con código 1 si algún caso empeora más que la
+tolerancia respecto de la línea base (mismos filas/arquetipos/caso).
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import pythontest6 as app
+
+# ── Configuración ──────────────────────────────────────────────────────────────
+FILAS = [10_000, 100_000, 1_000_000]
+ARQUETIPOS = [20, 200]
+ANIOS = 3
+REPETICIONES = 3
+FIN = pd.Timestamp("2026-08-28")
+MESES_ES = ["Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+
+# Resultados de un match (v1, v2) con frecuencias parecidas a las de cruces.xlsx
+RESULTADOS = np.array([(2, 0), (2, 1), (1, 1), (1, 0), (0, 0), (1, 2), (0, 2)], dtype=np.float64)
+PROB_RESULTADOS = np.array([0.50, 0.34, 0.05, 0.02, 0.01, 0.05, 0.03])
+
+
+# ── Datos sintéticos ───────────────────────────────────────────────────────────
+def generar_meta(filas, arquetipos, anios=ANIOS, semilla=0):
+    """
+    metaR sintético: torneos los martes (liga) y los viernes/sábados (abiertos)
+    repartidos en `anios` años, arquetipos con popularidad tipo Zipf y jugadores
+    únicos dentro de cada torneo (la tabla mensual de la liga pivotea por jugador).
+    """
+    rng = np.random.default_rng(semilla)
+    dias = pd.date_range(FIN - pd.DateOffset(years=anios), FIN, freq="D")
+    fechas = dias[dias.dayofweek.isin([1, 4, 5])]
+    n_torneos = min(len(fechas), max(1, filas // 8))
+    fechas = fechas[np.linspace(0, len(fechas) - 1, n_torneos).astype(int)]
+
+    tamanos = np.full(n_torneos, filas // n_torneos)
+    tamanos[:filas % n_torneos] += 1
+    torneo = np.repeat(np.arange(n_torneos), tamanos)
+    inicio = np.repeat(np.cumsum(tamanos) - tamanos, tamanos)
+    standing = np.arange(filas) - inicio + 1
+    rondas = np.ceil(np.log2(np.maximum(tamanos, 2))).astype(np.int64)[torneo]
+
+    # Las victorias bajan con el standing; unos pocos empates
+    wins = np.minimum(((1 - (standing - 1) / tamanos[torneo]) * (rondas + 1)).astype(np.int64), rondas)
+    draws = ((rng.random(filas) < 0.05) & (wins < rondas)).astype(np.int64)
+    loses = rondas - wins - draws
+
+    pesos = 1 / np.arange(1, arquetipos + 1) ** 1.1
+    nombres = np.array([f"Arquetipo {i:03d}" for i in range(arquetipos)], dtype=object)
+    arquetipo = nombres[rng.choice(arquetipos, size=filas, p=pesos / pesos.sum())]
+
+    n_jugadores = max(50, int(tamanos.max()), filas // 20)
+    jugadores = np.array([f"Jugador {i:05d}" for i in range(n_jugadores)], dtype=object)
+    desplazamiento = rng.integers(0, n_jugadores, n_torneos)[torneo]
+    jugador = jugadores[rng.permutation(n_jugadores)[(desplazamiento + standing - 1) % n_jugadores]]
+
+    fecha = fechas[torneo]
+    es_liga = fecha.dayofweek == 1
+    porcentajes = {
+        col: np.where(es_liga, np.clip(rng.normal(media, desvio, filas), 0, 100).round(1), np.nan)
+        for col, media, desvio in [('%VPO', 53, 10), ('%JG', 53, 17), ('%JGO', 53, 8)]
+    }
+
+    return pd.DataFrame({
+        'Fecha': fecha,
+        'Fecha2': torneo + 1,
+        'Standing': standing,
+        'Mes': np.array(MESES_ES, dtype=object)[fecha.month - 1] + "_" + fecha.year.astype(str),
+        'Trimestre': (fecha.month - 1) // 3 + 1,
+        'Liga': np.where(es_liga, "Si", "No").astype(object),
+        'Arquetipo': arquetipo,
+        'Variante': np.where(rng.random(filas) < 0.05, "Variante", None),
+        'Jugador': jugador,
+        'Wins': wins,
+        'Loses': loses,
+        'Draws': draws,
+        **porcentajes,
+        'Top3': (standing <= 3).astype(np.int64),
+        'Top1': (standing == 1).astype(np.int64),
+    })
+
+
+def generar_cruces(meta, filas=None, semilla=1):
+    """
+    cruces sintético: cada fila enfrenta el mazo de un jugador con el de un rival del
+    mismo torneo. Incluye byes (mazo2 vacío) y algunas filas sin fecha, como el real.
+    """
+    rng = np.random.default_rng(semilla)
+    filas = len(meta) if filas is None else filas
+    codigos, _ = pd.factorize(meta['Fecha'], sort=True)
+    tamanos = np.bincount(codigos)
+    inicios = np.cumsum(tamanos) - tamanos
+
+    fila = rng.integers(0, len(meta), filas)
+    torneo = codigos[fila]
+    rival = inicios[torneo] + rng.integers(0, tamanos[torneo])
+    rondas = np.ceil(np.log2(np.maximum(tamanos, 2))).astype(np.int64)[torneo]
+
+    mazo2 = meta['Arquetipo'].to_numpy()[rival].copy()
+    mazo2[rng.random(filas) < 0.08] = None
+    resultado = RESULTADOS[rng.choice(len(RESULTADOS), size=filas, p=PROB_RESULTADOS)]
+    fecha = meta['Fecha'].to_numpy()[fila].copy()
+    fecha[rng.random(filas) < 0.005] = np.datetime64("NaT")
+
+    return pd.DataFrame({
+        'fecha': fecha,
+        'ronda': rng.integers(1, rondas + 1),
+        'mazo1': meta['Arquetipo'].to_numpy()[fila],
+        'mazo2': mazo2,
+        'v1': resultado[:, 0],
+        'v2': resultado[:, 1],
+    })
+
+
+# ── Casos ──────────────────────────────────────────────────────────────────────
+def casos(datos):
+    """
+    (nombre, función) para cada update_* sobre todo el rango de fechas. Como en la app,
+    las tabs que solo agregan por arquetipo reciben el resumen de las sumas acumuladas,
+    evolution los conteos del cubo mensual y el heatmap la matriz del cubo de cruces.
+    Cada caso mide desde la ventana hasta la figura (la consulta o el filtro van dentro
+    de la función), así los tiempos se comparan con la línea base aunque cambie cómo
+    se arma la entrada de la tab; si un caso deja de medir ese camino, hay que
+    regenerar benchmark_baseline.json en el mismo commit.
+    """
+    todo = ("fechas", datos.meta_fecha_min, datos.meta_fecha_max)
+    ultima = pd.Timestamp(datos.fechas_unicas[0])
+    mes = datos.meses_disponibles[0] if datos.meses_disponibles else None
+    inicio, fin = str(datos.meta_fecha_min.date()), str(datos.meta_fecha_max.date())
+
+    return [
+        ("metagame", lambda: app.update_metagame(datos.resumen(todo), "fechas", None, inicio, fin, None, 20)),
+        ("metagame_torneo", lambda: app.update_metagame(datos.filtrar_meta(("fecha_puntual", ultima)), "fecha_puntual", None, None, None, ultima, 20)),
+        ("top_distribution", lambda: app.update_top_distribution(datos.resumen(todo), "Top1")),
+        ("conversion_table", lambda: app.update_conversion_table(datos.resumen(todo), "Top3")),
+        ("evolution", lambda: app.update_evolution(datos.conteos_mensuales(todo), 5)),
+        ("winrate", lambda: app.update_winrate(datos.resumen(todo), 30)),
+        ("winrate_juego", lambda: app.update_winrate_juego(datos.resumen(todo), "Top1")),
+        ("heatmap", lambda: app.update_heatmap(datos.matriz(todo), 30)),
+        ("liga_acumulada", lambda: app.update_liga(datos.meta, "Acumulada")),
+        ("liga_mes", lambda: app.update_liga(datos.meta, mes)),
+    ]
+
+
+def en_frio():
+    # Sin ventana ni versión las update_* no usan la caché de agregados; el motor
+    # de la liga sí congela meses, así que se empieza cada corrida con uno vacío y
+    # sin caché de disco
+    app.motor_liga = app.MotorLiga()
+    gc.collect()
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        en_frio()
+        t0 = time.perf_counter()
+        salida = funcion()
+        tiempos.append(time.perf_counter() - t0)
+
+    # La memoria pico se mide en una corrida aparte: tracemalloc enlentece lo medido
+    en_frio()
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'segundos_min': round(min(tiempos), 6),
+        'segundos_mediana': round(statistics.median(tiempos), 6),
+        'pico_bytes': pico,
+        'payload_bytes': len(to_json_plotly(salida).encode()),
+        'error': None,
+    }
+
+
+def correr(filas_lista, arquetipos_lista, anios, repeticiones, filtro=None):
+    resultados = []
+    for filas in filas_lista:
+        for arquetipos in arquetipos_lista:
+            meta = generar_meta(filas, arquetipos, anios)
+            cruces = generar_cruces(meta)
+            datos = app.DatosVersion(meta, cruces, f"sintetico-{filas}-{arquetipos}")
+            filas_cruces = len(cruces)
+            del meta, cruces
+
+            for caso, funcion in casos(datos):
+                if filtro and caso not in filtro:
+                    continue
+                try:
+                    medida = medir(funcion, repeticiones)
+                except Exception as e:
+                    medida = {'segundos_min': None, 'segundos_mediana': None, 'pico_bytes': None,
+                              'payload_bytes': None, 'error': f"{type(e).__name__}: {e}"}
+                resultados.append({'filas': filas, 'filas_cruces': filas_cruces,
+                                   'arquetipos': arquetipos, 'caso': caso, **medida})
+                r = resultados[-1]
+                if r['error']:
+                    print(f"  {filas:>9} x {arquetipos:>3}  {caso:<18} ✗ {r['error']}")
+                else:
+                    print(f"  {filas:>9} x {arquetipos:>3}  {caso:<18} {r['segundos_mediana']:>9.4f} s"
+                          f"  {r['pico_bytes'] / 2**20:>8.1f} MB  {r['payload_bytes'] / 1024:>9.1f} KB")
+    return resultados
+
+
+def comparar(resultados, base, tolerancia):
+    """Casos que empeoran más que `tolerancia` (fracción) en tiempo, memoria o payload."""
+    previos = {(r['filas'], r['arquetipos'], r['caso']): r for r in base['resultados']}
+    regresiones = []
+    for r in resultados:
+        previo = previos.get((r['filas'], r['arquetipos'], r['caso']))
+        if previo is None:
+            continue
+        for metrica in ('segundos_mediana', 'pico_bytes', 'payload_bytes'):
+            antes, ahora = previo[metrica], r[metrica]
+            if antes and ahora and ahora > antes * (1 + tolerancia):
+                regresiones.append(f"{r['filas']} x {r['arquetipos']} {r['caso']}: {metrica} {antes} → {ahora}")
+    return regresiones
+
+
+# ── Ejecución ──────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de las funciones update_* con datos sintéticos")
+    parser.add_argument("--filas", type=int, nargs="+", default=FILAS)
+    parser.add_argument("--arquetipos", type=int, nargs="+", default=ARQUETIPOS)
+    parser.add_argument("--anios", type=int, default=ANIOS)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--casos", nargs="+", help="medir solo estos casos")
+    parser.add_argument("--salida", type=Path, help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", type=Path, help="línea base JSON contra la que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    args = parser.parse_args()
+
+    resultados = correr(args.filas, args.arquetipos, args.anios, args.repeticiones, args.casos)
+    informe = {
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'fecha': pd.Timestamp.now().isoformat(timespec="seconds"),
+        },
+        'parametros': {'anios': args.anios, 'repeticiones': args.repeticiones},
+        'resultados': resultados,
+    }
+
+    if args.salida:
+        args.salida.write_text(json.dumps(informe, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\n  ✓ Guardado {args.salida}")
+
+    if args.comparar:
+        regresiones = comparar(resultados, json.loads(args.comparar.read_text(encoding="utf-8")), args.tolerancia)
+        for r in regresiones:
+            print(f"  ✗ {r}")
+        if regresiones:
+            sys.exit(1)
+        print(f"\n  ✓ Sin regresiones respecto de {args.comparar}")
@@ -0,0 +1,191 @@
+"""
+COMPROBAR LA LIGA EN SEGUNDO PLANO
+==================================
+Corre la tabla Acumulada como la pide el navegador (el callback en segundo plano,
+con server.test_client()) sobre una copia de los parquet en un directorio temporal,
+y comprueba que lo que calcula el proceso del trabajo no se pierde al terminar:
+
+1. la primera Acumulada calcula todos los meses de liga;
+2. el paginador, que corre en el worker, sirve la tabla del trabajo sin rearmarla;
+3. después de corregir una fila del mes abierto y recargar los datos, la segunda
+   Acumulada solo recalcula ese mes.
+
+Uso:
+    python comprobar_liga.py
+
+Termina con código 1 si alguna comprobación falla. Requiere el modo en segundo plano
+(dash[diskcache] y un sistema con fork).
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+DIRECTORIO = Path(__file__).resolve().parent
+ARCHIVOS = ["metaR.parquet", "cruces.parquet"]
+ESPERA = 120    # segundos máximos por trabajo
+
+
+def preparar(temporal):
+    """Copia los parquet y deja la app configurada con cachés propias en `temporal`."""
+    for nombre in ARCHIVOS:
+        shutil.copy(DIRECTORIO / nombre, temporal)
+    # La app lee los datos relativos al directorio actual; sin la tabla torneo × arquetipo
+    # la calcula desde meta en cada versión
+    os.chdir(temporal)
+    os.environ.update(
+        METAGAME_SEGUNDO_PLANO=str(temporal / "segundo_plano"),
+        METAGAME_IPC=str(temporal / "ipc"),
+        METAGAME_CACHE_RESPUESTAS="",
+        METAGAME_METRICAS="",
+        METAGAME_RECARGA_SEGUNDOS="0",
+    )
+    sys.path.insert(0, str(DIRECTORIO))
+
+
+def contar_llamadas(app, nombre, registro, etiqueta):
+    """
+    Reemplaza app.<nombre> por una versión que anota cada llamada en `registro`. Es un
+    archivo y no una lista: los trabajos corren en procesos hijos (nacen con fork, así
+    que heredan el reemplazo).
+    """
+    original = getattr(app, nombre)
+
+    def contada(*args, **kwargs):
+        with open(registro, "a", encoding="utf-8") as f:
+            f.write(json.dumps([nombre, etiqueta(*args, **kwargs)]) + "\n")
+        return original(*args, **kwargs)
+
+    setattr(app, nombre, contada)
+
+
+def llamadas(registro, nombre):
+    if not registro.exists():
+        return []
+    filas = [json.loads(linea) for linea in registro.read_text(encoding="utf-8").splitlines()]
+    return [etiqueta for funcion, etiqueta in filas if funcion == nombre]
+
+
+def cuerpo_liga(parametros):
+    return {
+        "output": "..contenido-liga.children...renderizado-liga.data..",
+        "outputs": [{"id": "contenido-liga", "property": "children"},
+                    {"id": "renderizado-liga", "property": "data"}],
+        "inputs": [{"id": "parametros-liga", "property": "data", "value": parametros}],
+        "changedPropIds": ["parametros-liga.data"],
+        "state": [],
+    }
+
+
+def acumulada(cliente):
+    """Lanza el trabajo de la Acumulada y lo consulta hasta que trae el resultado."""
+    respuesta = cliente.post("/_dash-update-component", json=cuerpo_liga({"mes_liga": "Acumulada"})).get_json()
+    if "response" in respuesta:
+        raise RuntimeError("la liga no corrió en segundo plano")
+    consulta = f"/_dash-update-component?cacheKey={respuesta['cacheKey']}&job={respuesta['job']}"
+    limite = time.monotonic() + ESPERA
+    while time.monotonic() < limite:
+        time.sleep(0.1)
+        respuesta = cliente.post(consulta, json=cuerpo_liga(None)).get_json(silent=True)
+        if respuesta and "response" in respuesta:
+            return respuesta["response"]
+    raise RuntimeError(f"el trabajo no terminó en {ESPERA} s")
+
+
+def pagina_acumulada(cliente, pagina):
+    """Pide una página de la tabla Acumulada al paginador (un callback normal, en el worker)."""
+    def id_tabla(tipo, vista="liga|Acumulada"):
+        return {"type": tipo, "vista": vista}
+
+    def texto(componente):
+        return json.dumps(componente, sort_keys=True, separators=(",", ":"))
+
+    # La salida va con el comodín, como en el registro del callback; los ids, con la vista
+    salida = "...".join(f"{texto(id_tabla(tipo, ['MATCH']))}.{propiedad}" for tipo, propiedad in
+                        [("tabla-cuerpo", "children"), ("tabla-estado", "data"), ("tabla-pagina", "active_page")])
+    cuerpo = {
+        "output": f"..{salida}..",
+        "outputs": [{"id": id_tabla("tabla-cuerpo"), "property": "children"},
+                    {"id": id_tabla("tabla-estado"), "property": "data"},
+                    {"id": id_tabla("tabla-pagina"), "property": "active_page"}],
+        "inputs": [{"id": id_tabla("tabla-pagina"), "property": "active_page", "value": pagina}, []],
+        "state": [{"id": id_tabla("tabla-estado"), "property": "data",
+                   "value": {"columna": None, "ascendente": True}}],
+        "changedPropIds": [f"{texto(id_tabla('tabla-pagina'))}.active_page"],
+    }
+    respuesta = cliente.post("/_dash-update-component", json=cuerpo)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"el paginador respondió {respuesta.status_code}")
+
+
+def corregir_mes_abierto(app):
+    """Cambia el %VPO de una fila del último mes de liga, reescribe metaR y devuelve ese mes."""
+    meta = pd.read_parquet("metaR.parquet")
+    mes = str(app.almacen.actual.meses_disponibles[0])
+    fila = meta.index[(meta['Mes'] == mes) & meta['Liga'].astype(str).str.strip().str.lower().eq('si')][0]
+    meta.loc[fila, '%VPO'] = meta.loc[fila, '%VPO'] + 1
+    meta.to_parquet("metaR.parquet", index=False)
+    return mes
+
+
+def comprobar(app, registro):
+    fallas = []
+
+    def verificar(condicion, mensaje):
+        print(f"  {'✓' if condicion else '✗'} {mensaje}")
+        if not condicion:
+            fallas.append(mensaje)
+
+    cliente = app.server.test_client()
+    meses = [str(m) for m in app.almacen.actual.meses_disponibles]
+
+    acumulada(cliente)
+    calculados = llamadas(registro, "standings_mes")
+    verificar(sorted(calculados) == sorted(meses),
+              f"primera Acumulada: {len(calculados)} de {len(meses)} meses calculados")
+
+    pagina_acumulada(cliente, 2)
+    # La única tabla armada es la del trabajo
+    verificar(len(llamadas(registro, "tabla_liga")) == 1, "el paginador usa la tabla que armó el trabajo")
+
+    version = app.almacen.actual.version
+    abierto = corregir_mes_abierto(app)
+    app.almacen.revisar()
+    verificar(app.almacen.actual.version != version, "la corrección se cargó como una versión nueva")
+
+    registro.unlink()
+    acumulada(cliente)
+    calculados = llamadas(registro, "standings_mes")
+    verificar(calculados == [abierto], f"segunda Acumulada: recalculados {calculados or 'ninguno'}, "
+                                       f"se esperaba solo {abierto}")
+    return fallas
+
+
+# ── Ejecución ──────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    temporal = Path(tempfile.mkdtemp(prefix="metagame_liga_"))
+    try:
+        preparar(temporal)
+        import pythontest6 as app
+
+        if app.gestor_segundo_plano is None:
+            sys.exit("  ✗ El modo en segundo plano no está disponible (dash[diskcache] y fork)")
+
+        registro = temporal / "llamadas.jsonl"
+        contar_llamadas(app, "standings_mes", registro, lambda df_m: str(df_m['Mes'].iloc[0]))
+        contar_llamadas(app, "tabla_liga", registro, lambda df, mes: mes)
+
+        fallas = comprobar(app, registro)
+    finally:
+        os.chdir(DIRECTORIO)
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    if fallas:
+        sys.exit(1)
+    print("\n  ✓ Lo que calcula el trabajo de la liga queda para el worker y los trabajos siguientes")
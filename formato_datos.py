@@ -0,0 +1,51 @@
+"""
+FORMATO DE LOS DATOS
+====================
+Lo que comparten xlsxtoparquet.py (que escribe los archivos) y la app (que los
+lee): nombres de archivo, la tabla agregada torneo × arquetipo y el hash con que
+se marca de qué archivo salió. Solo depende de pandas, así la app no importa el
+script de conversión (ni openpyxl) en cada worker.
+"""
+
+import hashlib
+
+import pandas as pd
+
+# Manifiesto de los datasets particionados (--incremental); pyarrow ignora los
+# archivos que empiezan con "_"
+MANIFIESTO = "_manifiesto.json"
+
+# Tabla torneo × arquetipo que se deriva de metaR, y la clave de sus metadatos con el
+# hash del archivo del que salió
+ARCHIVO_TORNEOS = "torneos_arquetipos.parquet"
+CLAVE_ORIGEN = b"origen"
+
+COLUMNAS_SUMA = ['Wins', 'Loses', 'Draws', 'Top1', 'Top3']
+
+
+def hash_archivo(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def agregar_torneos(meta: pd.DataFrame):
+    """
+    Una fila por (Fecha, Arquetipo) con Apariciones (filas), Jugadores (Standing no
+    nulos) y las sumas de W/L/D, Top1 y Top3. Las filas quedan ordenadas por fecha y,
+    dentro de cada torneo, por primera aparición del arquetipo, igual que en metaR
+    ordenado por fecha: así los empates se resuelven igual que sobre las filas de
+    jugadores. Se conserva el grupo sin arquetipo para no perder torneos al contarlos.
+    La usan xlsxtoparquet.py para escribir ARCHIVO_TORNEOS y la app cuando el archivo
+    falta o no corresponde a metaR.
+    """
+    meta = meta.rename(columns=str.strip)
+    meta = meta[meta['Fecha'].notna()].sort_values('Fecha', kind='stable')
+    agregado = meta.groupby(['Fecha', 'Arquetipo'], sort=False, observed=True, dropna=False).agg(
+        Apariciones=('Fecha', 'size'),
+        Jugadores=('Standing', 'count'),
+        **{c: (c, 'sum') for c in COLUMNAS_SUMA}
+    ).reset_index()
+    return agregado.astype({c: 'int64' for c in ['Apariciones', 'Jugadores'] + COLUMNAS_SUMA})
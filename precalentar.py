@@ -0,0 +1,118 @@
+"""
+PRECALENTAR LA CACHÉ DE RESPUESTAS
+==================================
+Calcula todas las vistas canónicas de la app en procesos en paralelo y guarda sus
+respuestas en la caché de respuestas compartida, así el primer visitante después de
+un deploy (o de subir datos nuevos) ya no paga el cálculo en frío.
+
+Las vistas canónicas son las que se piden sin tocar los filtros de fecha: cada tab con
+los valores iniciales de los controles, variando el evento, el color (Top1/Top3) y el
+mes de la liga entre todas sus opciones, y los sliders (top de mazos, top y media
+móvil de la evolución, mínimo de partidas) entre las marcas que muestran.
+
+Uso:
+    python precalentar.py                   # al arrancar o después de xlsxtoparquet.py
+    python precalentar.py --procesos 4
+    python precalentar.py --forzar          # recalcula también las que ya están en la caché
+
+Usa la misma configuración que la app (METAGAME_CACHE_RESPUESTAS, etc.) y debe correr en
+la misma máquina que gunicorn. Las respuestas llevan la versión de los datos: si los
+parquet cambian, la app las descarta y se puede volver a correr.
+
+El Procfile lo lanza en segundo plano junto con gunicorn, que toma el puerto enseguida:
+el arranque no espera al precalentamiento (una plataforma con límite de tiempo para
+abrir el puerto mataría el proceso) y mientras tanto las vistas se calculan como
+siempre. --procesos acota cuánta CPU le quita a los workers. No sirve como fase de
+release: corre en otra máquina y la caché es un archivo local.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from plotly.io.json import to_json_plotly
+
+import pythontest6 as app
+
+# ── Configuración ──────────────────────────────────────────────────────────────
+# Controles cuyas opciones (o las marcas, en los sliders) se recorren todas; el resto
+# queda en su valor inicial
+VARIANTES = ["evento", "color_opcion", "mes_liga", "n_top", "n_top_evolution", "meses_media", "min_juegos"]
+
+
+def valores_control(control):
+    """Opciones de un dropdown o radio, o las marcas de un slider."""
+    if getattr(control, 'options', None) is not None:
+        return [o['value'] for o in control.options]
+    return sorted(control.marks)
+
+
+# ── Vistas ─────────────────────────────────────────────────────────────────────
+def vistas_canonicas():
+    """(tab, parámetros) de cada vista canónica, con los parámetros tal como llegan en JSON."""
+    layout = app.serve_layout()
+    valores = {nombre: getattr(layout[id_control], prop, None) for nombre, id_control, prop in app.CONTROLES}
+    opciones = {nombre: valores_control(layout[id_control])
+                for nombre, id_control, _ in app.CONTROLES if nombre in VARIANTES}
+
+    vistas = []
+    for tab in app.TABS:
+        base = app.parametros_tab(tab, valores)
+        claves = [c for c in VARIANTES if c in base]
+        for combinacion in itertools.product(*(opciones[c] for c in claves)):
+            parametros = {**base, **dict(zip(claves, combinacion))}
+            # Ida y vuelta por JSON: fechas y números quedan como los manda el navegador
+            vistas.append((tab, json.loads(to_json_plotly(parametros))))
+    return vistas
+
+
+def calcular(vista):
+    tab, parametros = vista
+    inicio = time.perf_counter()
+    try:
+        return tab, parametros, app.respuesta_tab(tab, parametros), time.perf_counter() - inicio, None
+    except Exception as e:
+        return tab, parametros, None, time.perf_counter() - inicio, f"{type(e).__name__}: {e}"
+
+
+def precalentar(procesos=None, forzar=False):
+    cache = app.cache_respuestas
+    if cache is None:
+        print("  ✗ La caché de respuestas está desactivada (METAGAME_CACHE_RESPUESTAS vacío)")
+        return False
+
+    version = app.almacen.actual.version
+    vistas = [v for v in vistas_canonicas() if forzar or cache.obtener(app.clave_vista(version, *v)) is None]
+    print(f"Precalentando {len(vistas)} vistas (versión {version}) ...")
+
+    inicio = time.perf_counter()
+    errores = 0
+    # Los procesos heredan la app ya cargada; las vistas de una misma tab van juntas
+    # para que compartan la caché de agregados de cada proceso
+    procesos = procesos or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        for tab, parametros, cuerpo, segundos, error in pool.map(
+                calcular, vistas, chunksize=max(1, len(vistas) // (procesos * 4))):
+            if error:
+                errores += 1
+                print(f"  ✗ {tab} {parametros}: {error}")
+                continue
+            cache.guardar(app.clave_vista(version, tab, parametros), version, cuerpo)
+            print(f"  ✓ {tab:<17} {segundos:>7.3f} s  {len(cuerpo) / 1024:>8.1f} KB  {parametros}")
+
+    cache.purgar(version)
+    print(f"Listo en {time.perf_counter() - inicio:.1f} s ({errores} errores)")
+    return errores == 0
+
+
+# ── Ejecución ──────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalienta la caché de respuestas con las vistas canónicas")
+    parser.add_argument("--procesos", type=int, help="procesos en paralelo (por defecto, uno por CPU)")
+    parser.add_argument("--forzar", action="store_true", help="recalcula también las vistas ya guardadas")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if precalentar(args.procesos, args.forzar) else 1)
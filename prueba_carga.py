@@ -0,0 +1,372 @@
+"""
+PRUEBA DE CARGA
+===============
+Reproduce requests de callbacks de tabs (POST a /_dash-update-component, tal como los
+manda el navegador) contra la app servida por gunicorn, con varios usuarios a la vez,
+y reporta por tab el throughput y las latencias p50/p95/p99. Con --configuraciones
+levanta gunicorn con cada combinación de workers × hilos, así el tamaño del deploy
+sale de mediciones y no de suposiciones.
+
+Las cargas son los cuerpos de esos requests, uno por línea (JSONL): se pueden copiar
+de las herramientas de desarrollo del navegador o generar con --grabar, que arma una
+mezcla de todas las tabs de update_tab_content variando evento, filtros, rango de
+fechas, sliders, color y mes de la liga. Las tabs en segundo plano se miden como las
+ve el usuario: desde que se lanza el trabajo hasta la consulta que trae el resultado.
+
+Uso:
+    python prueba_carga.py --grabar cargas.jsonl --peticiones 500
+    python prueba_carga.py --cargas cargas.jsonl --configuraciones 1x1 2x4 4x2
+    python prueba_carga.py --configuraciones 2x4 --usuarios 32 --duracion 60 --sin-cache
+    python prueba_carga.py --url http://127.0.0.1:8000 --cargas cargas.jsonl
+
+Cada configuración arranca con sus propias cachés vacías (respuestas y segundo plano);
+con --precalentar corre antes precalentar.py, como el Procfile, y con --sin-cache la
+caché de respuestas queda desactivada y cada request se vuelve a calcular. El resto de
+la configuración de la app (METAGAME_MOTOR, etc.) se hereda del entorno.
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+
+# ── Configuración ──────────────────────────────────────────────────────────────
+CONFIGURACIONES = ["1x1", "1x4", "2x4", "4x2"]   # workers x hilos de gunicorn
+USUARIOS = 8                # usuarios concurrentes, cada uno espera su respuesta antes de seguir
+DURACION = 30               # segundos medidos por configuración
+CALENTAMIENTO = 5           # segundos previos que no se miden
+PETICIONES = 400            # cargas generadas cuando no se pasa --cargas
+PROBABILIDAD_CAMBIO = 0.5   # probabilidad de que una carga generada mueva cada control de su valor inicial
+ESPERA_ARRANQUE = 180       # segundos máximos para que gunicorn empiece a responder
+TIMEOUT = 120               # segundos máximos por request (incluidas las consultas de un trabajo)
+DIRECTORIO = Path(__file__).resolve().parent
+RUTA_CALLBACKS = "/_dash-update-component"
+
+
+# ── Cargas ─────────────────────────────────────────────────────────────────────
+def generar_cargas(peticiones, semilla=0, tabs=None):
+    """
+    Cuerpos de requests de callbacks de tabs: cada uno toma una tab al azar y parte de
+    los valores iniciales de los controles, moviendo cada uno con PROBABILIDAD_CAMBIO a
+    otra opción (o a otro valor del slider, o a otro rango de fechas).
+    """
+    from plotly.io.json import to_json_plotly
+
+    import pythontest6 as app
+
+    layout = app.serve_layout()
+    control = {nombre: layout[id_control] for nombre, id_control, _ in app.CONTROLES}
+    iniciales = {nombre: getattr(layout[id_control], prop, None) for nombre, id_control, prop in app.CONTROLES}
+    opciones = {nombre: [o['value'] for o in c.options]
+                for nombre, c in control.items() if getattr(c, 'options', None)}
+    # Sin fecha elegida el torneo puntual no muestra nada: se parte del último
+    iniciales['fecha_unica'] = iniciales['fecha_unica'] or opciones['fecha_unica'][0]
+    fechas = sorted(opciones['fecha_unica'])
+
+    rng = random.Random(semilla)
+
+    def sortear(nombre):
+        c = control[nombre]
+        if nombre in opciones:
+            return rng.choice(opciones[nombre])
+        return rng.randrange(int(c.min), int(c.max) + 1, int(c.step or 1))
+
+    cargas = []
+    for _ in range(peticiones):
+        tab = rng.choice(tabs or app.TABS)
+        valores = dict(iniciales)
+        for nombre in valores:
+            if nombre not in ('start_date', 'end_date') and rng.random() < PROBABILIDAD_CAMBIO:
+                valores[nombre] = sortear(nombre)
+        if rng.random() < PROBABILIDAD_CAMBIO:
+            # El selector manda los días como texto, sin hora
+            inicio = rng.randrange(len(fechas))
+            fin = rng.randrange(inicio, len(fechas))
+            valores['start_date'], valores['end_date'] = (str(fechas[i].date()) for i in (inicio, fin))
+
+        # Ida y vuelta por JSON: fechas y números quedan como los manda el navegador
+        parametros = json.loads(to_json_plotly(app.parametros_tab(tab, valores)))
+        cargas.append({
+            "inputs": [{"id": f"parametros-{tab}", "property": "data", "value": parametros}],
+            "changedPropIds": [f"parametros-{tab}.data"],
+        })
+    return cargas
+
+
+def tab_carga(cuerpo):
+    """Tab de un cuerpo de request (el Store de parámetros que lo dispara), o None si no es de una tab."""
+    entradas = cuerpo.get("inputs") or [{}]
+    id_entrada = entradas[0].get("id")
+    if isinstance(id_entrada, str) and id_entrada.startswith("parametros-"):
+        return id_entrada[len("parametros-"):]
+    return None
+
+
+def leer_cargas(ruta):
+    cargas = [json.loads(linea) for linea in ruta.read_text(encoding="utf-8").splitlines() if linea.strip()]
+    validas = [c for c in cargas if tab_carga(c) is not None]
+    if len(validas) < len(cargas):
+        print(f"  ✗ {len(cargas) - len(validas)} requests de {ruta} no son de tabs y se ignoran")
+    return validas
+
+
+def callbacks_tabs(base):
+    """
+    Por tab, la salida registrada en el servidor y el intervalo de consulta si corre en
+    segundo plano. Las cargas se completan con esto al reproducirlas: un mismo archivo
+    sirve con o sin callbacks en segundo plano.
+    """
+    callbacks = {}
+    for dependencia in requests.get(base + "/_dash-dependencies", timeout=TIMEOUT).json():
+        entradas = dependencia.get("inputs", [])
+        if dependencia.get("clientside_function") or len(entradas) != 1:
+            continue
+        tab = tab_carga({"inputs": entradas})
+        if tab is None:
+            continue
+        salida = dependencia["output"]
+        if salida.startswith(".."):
+            # Varias salidas: "..<id>.<prop>...<id>.<prop>.."
+            salidas = [dict(zip(("id", "property"), s.rsplit(".", 1))) for s in salida[2:-2].split("...")]
+        else:
+            salidas = dict(zip(("id", "property"), salida.rsplit(".", 1)))
+        segundo_plano = dependencia.get("background")
+        callbacks[tab] = {
+            "cuerpo": {"output": salida, "outputs": salidas,
+                       "state": [{**s, "value": None} for s in dependencia.get("state", [])]},
+            "intervalo": segundo_plano["interval"] / 1000 if segundo_plano else None,
+        }
+    return callbacks
+
+
+# ── Servidor ───────────────────────────────────────────────────────────────────
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Servidor:
+    """
+    gunicorn con `workers` × `hilos` en un puerto libre, con las cachés en un directorio
+    temporal propio para que ninguna configuración aproveche lo calculado por otra.
+    """
+
+    def __init__(self, workers, hilos, sin_cache=False, precalentar=False):
+        self.workers = workers
+        self.hilos = hilos
+        self.sin_cache = sin_cache
+        self.precalentar = precalentar
+        self.base = f"http://127.0.0.1:{puerto_libre()}"
+
+    def __enter__(self):
+        self.temporal = tempfile.TemporaryDirectory(prefix="metagame-carga-")
+        entorno = {
+            **os.environ,
+            "METAGAME_CACHE_RESPUESTAS": "" if self.sin_cache else os.path.join(self.temporal.name, "respuestas.sqlite"),
+        }
+        # Vacío desactiva el segundo plano: se respeta si así viene del entorno
+        if os.environ.get("METAGAME_SEGUNDO_PLANO") != "":
+            entorno["METAGAME_SEGUNDO_PLANO"] = os.path.join(self.temporal.name, "segundo_plano")
+
+        self.log = open(os.path.join(self.temporal.name, "gunicorn.log"), "w")
+        if self.precalentar and not self.sin_cache:
+            subprocess.run([sys.executable, "precalentar.py"], cwd=DIRECTORIO, env=entorno,
+                           stdout=self.log, stderr=subprocess.STDOUT, check=True)
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "pythontest6:server", "--preload",
+             "--workers", str(self.workers), "--threads", str(self.hilos),
+             "--bind", self.base.removeprefix("http://"), "--timeout", str(TIMEOUT)],
+            cwd=DIRECTORIO, env=entorno, stdout=self.log, stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+        try:
+            self._esperar()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _esperar(self):
+        limite = time.monotonic() + ESPERA_ARRANQUE
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError(f"gunicorn terminó al arrancar:\n{self._log()}")
+            try:
+                if requests.get(self.base + "/_dash-dependencies", timeout=5).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"gunicorn no respondió en {ESPERA_ARRANQUE} s:\n{self._log()}")
+
+    def _log(self):
+        self.log.flush()
+        return "".join(open(self.log.name).readlines()[-20:])
+
+    def __exit__(self, *_):
+        # El grupo entero: el master, sus workers y los trabajos en segundo plano
+        try:
+            os.killpg(self.proceso.pid, signal.SIGTERM)
+            self.proceso.wait(timeout=30)
+        except ProcessLookupError:
+            pass
+        except subprocess.TimeoutExpired:
+            os.killpg(self.proceso.pid, signal.SIGKILL)
+            self.proceso.wait()
+        self.log.close()
+        self.temporal.cleanup()
+
+
+# ── Usuarios ───────────────────────────────────────────────────────────────────
+def ejecutar(sesion, url, cuerpo, intervalo):
+    """
+    Un request de tab completo; True si terminó con el contenido. En segundo plano
+    repite lo que hace el navegador: lanza el trabajo y lo consulta cada `intervalo`
+    hasta que la respuesta trae el resultado (o viene entera de la caché de respuestas).
+    """
+    respuesta = sesion.post(url, json=cuerpo, timeout=TIMEOUT)
+    if respuesta.status_code != 200:
+        return False
+    if intervalo is None:
+        return True
+    datos = respuesta.json()
+    consulta = {"cacheKey": datos.get("cacheKey"), "job": datos.get("job")}
+    limite = time.monotonic() + TIMEOUT
+    while "response" not in datos:
+        if time.monotonic() > limite:
+            return False
+        time.sleep(intervalo)
+        respuesta = sesion.post(url, params=consulta, json=cuerpo, timeout=TIMEOUT)
+        if respuesta.status_code != 200:
+            return False
+        datos = respuesta.json()
+    return True
+
+
+def usuario(base, cargas, callbacks, desde, hasta, resultados):
+    """Recorre las cargas desde la posición `desde` hasta el instante `hasta`, una a la vez."""
+    sesion = requests.Session()
+    url = base + RUTA_CALLBACKS
+    i = desde
+    while time.perf_counter() < hasta:
+        cuerpo = cargas[i % len(cargas)]
+        i += 1
+        tab = tab_carga(cuerpo)
+        callback = callbacks.get(tab)
+        inicio = time.perf_counter()
+        try:
+            ok = callback is not None and ejecutar(sesion, url, {**cuerpo, **callback["cuerpo"]}, callback["intervalo"])
+        except (requests.RequestException, ValueError):
+            ok = False
+        resultados.append((tab, inicio, time.perf_counter() - inicio, ok))
+
+
+def medir(base, cargas, usuarios, duracion, calentamiento):
+    """(tab, inicio, segundos, ok) de los requests que empezaron después del calentamiento."""
+    callbacks = callbacks_tabs(base)
+    resultados = []
+    comienzo = time.perf_counter()
+    hilos = [threading.Thread(target=usuario,
+                              args=(base, cargas, callbacks, k * len(cargas) // usuarios,
+                                    comienzo + calentamiento + duracion, resultados))
+             for k in range(usuarios)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return [r for r in resultados if r[1] >= comienzo + calentamiento]
+
+
+# ── Reporte ────────────────────────────────────────────────────────────────────
+def resumir(resultados, duracion):
+    """Por tab (y en total): requests, errores, requests por segundo y percentiles en ms."""
+    grupos = {}
+    for tab, _, segundos, ok in resultados:
+        grupos.setdefault(tab, []).append((segundos, ok))
+    grupos["total"] = [(segundos, ok) for _, _, segundos, ok in resultados]
+
+    resumen = []
+    for tab, medidas in grupos.items():
+        latencias = np.array([s for s, ok in medidas if ok]) * 1000
+        percentiles = np.percentile(latencias, [50, 95, 99]) if len(latencias) else [None] * 3
+        resumen.append({
+            'tab': tab,
+            'peticiones': len(medidas),
+            'errores': sum(not ok for _, ok in medidas),
+            'por_segundo': round(len(latencias) / duracion, 2),
+            **{f'p{p}_ms': None if v is None else round(float(v), 1) for p, v in zip((50, 95, 99), percentiles)},
+        })
+    return resumen
+
+
+def imprimir(resumen):
+    print(f"  {'tab':<18} {'requests':>8} {'errores':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in resumen:
+        latencias = "".join(f" {'-' if r[k] is None else f'{r[k]:.1f}':>9}" for k in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f"  {r['tab']:<18} {r['peticiones']:>8} {r['errores']:>8} {r['por_segundo']:>8.2f}{latencias}")
+
+
+# ── Ejecución ──────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de los callbacks de tabs contra gunicorn")
+    parser.add_argument("--cargas", type=Path, help="JSONL con los cuerpos de los requests a reproducir")
+    parser.add_argument("--grabar", type=Path, help="genera las cargas, las guarda en este JSONL y termina")
+    parser.add_argument("--peticiones", type=int, default=PETICIONES, help="cargas a generar sin --cargas")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--tabs", nargs="+", help="generar solo cargas de estas tabs")
+    parser.add_argument("--configuraciones", nargs="+", default=CONFIGURACIONES, help="workers x hilos, p. ej. 2x4")
+    parser.add_argument("--url", help="medir un servidor ya levantado en lugar de arrancar gunicorn")
+    parser.add_argument("--usuarios", type=int, default=USUARIOS)
+    parser.add_argument("--duracion", type=float, default=DURACION)
+    parser.add_argument("--calentamiento", type=float, default=CALENTAMIENTO)
+    parser.add_argument("--sin-cache", action="store_true", help="desactiva la caché de respuestas")
+    parser.add_argument("--precalentar", action="store_true", help="corre precalentar.py antes de cada configuración")
+    parser.add_argument("--salida", type=Path, help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    cargas = leer_cargas(args.cargas) if args.cargas else generar_cargas(args.peticiones, args.semilla, args.tabs)
+    if args.grabar:
+        args.grabar.write_text("".join(json.dumps(c, ensure_ascii=False) + "\n" for c in cargas), encoding="utf-8")
+        print(f"  ✓ Guardadas {len(cargas)} cargas en {args.grabar}")
+        sys.exit(0)
+    if not cargas:
+        sys.exit("  ✗ No hay cargas de tabs para reproducir")
+
+    def correr(base):
+        resultados = medir(base, cargas, args.usuarios, args.duracion, args.calentamiento)
+        resumen = resumir(resultados, args.duracion)
+        imprimir(resumen)
+        return resumen
+
+    informe = []
+    if args.url:
+        print(f"\n{args.url} ({args.usuarios} usuarios, {args.duracion:.0f} s)")
+        informe.append({'url': args.url, 'resumen': correr(args.url.rstrip("/"))})
+    for configuracion in ([] if args.url else args.configuraciones):
+        workers, hilos = (int(n) for n in configuracion.lower().split("x"))
+        print(f"\n{workers} workers × {hilos} hilos ({args.usuarios} usuarios, {args.duracion:.0f} s)")
+        try:
+            with Servidor(workers, hilos, args.sin_cache, args.precalentar) as servidor:
+                informe.append({'workers': workers, 'hilos': hilos, 'resumen': correr(servidor.base)})
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"  ✗ {e}")
+            informe.append({'workers': workers, 'hilos': hilos, 'error': str(e)})
+
+    if args.salida:
+        parametros = {'usuarios': args.usuarios, 'duracion': args.duracion, 'calentamiento': args.calentamiento,
+                      'sin_cache': args.sin_cache, 'cargas': len(cargas)}
+        args.salida.write_text(json.dumps({'parametros': parametros, 'configuraciones': informe},
+                                          indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\n  ✓ Guardado {args.salida}")
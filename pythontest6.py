@@ -1,34 +1,94 @@
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, ctx, Input, Output, State, MATCH, ALL
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 import plotly.express as px
+from plotly.io.json import to_json_plotly
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import dash_bootstrap_components as dbc
 from scipy.stats import norm
+import bisect
 import calendar
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado, a lo sumo dos procesos escriben el mismo archivo
+    fcntl = None
+try:
+    import diskcache
+    import multiprocess
+except ImportError:  # sin dash[diskcache] las tabs pesadas corren dentro del request, como las demás
+    diskcache = multiprocess = None
+try:
+    import duckdb
+except ImportError:  # sin duckdb solo está el motor de consultas de pandas (METAGAME_MOTOR)
+    duckdb = None
+import flask
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from formato_datos import ARCHIVO_TORNEOS, CLAVE_ORIGEN, MANIFIESTO, agregar_torneos, hash_archivo
+
+# Caché de disco local de los callbacks en segundo plano (ver CALLBACKS EN SEGUNDO PLANO);
+# vacío desactiva el modo y las tabs pesadas corren dentro del request
+RUTA_SEGUNDO_PLANO = os.environ.get(
+    "METAGAME_SEGUNDO_PLANO", os.path.join(tempfile.gettempdir(), "metagame_segundo_plano")
+)
+EXPIRA_SEGUNDO_PLANO = 600   # segundos que se guarda un resultado desde que se lee por primera vez
+# Segundos que un agregado queda en la caché de disco: lleva la versión de datos en la
+# clave, así que solo vence para no juntar los de versiones viejas
+EXPIRA_AGREGADOS = 24 * 3600
+# Los trabajos nacen con fork (os.register_at_fork repara los locks del hijo) y se recogen
+# con os.waitid: sin ellos (Windows, macOS) las tabs pesadas corren dentro del request
+FORK_DISPONIBLE = hasattr(os, 'register_at_fork') and hasattr(os, 'waitid')
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-server = app.server
 
-# ========== CARGAR DATOS ==========
-# Parquet ya tiene tipos correctos (fechas, numéricos) — sin conversiones extra
-meta   = pd.read_parquet("metaR.parquet")
-cruces = pd.read_parquet("cruces.parquet")
-
-# Pre-procesar datos una sola vez al inicio (no en cada callback)
-meta_fecha_min = meta['Fecha'].min()
-meta_fecha_max = meta['Fecha'].max()
-fechas_unicas = sorted(meta['Fecha'].unique(), reverse=True)
-
-# Obtener meses disponibles para la Liga
-if 'Mes' in meta.columns and 'Liga' in meta.columns:
-    df_solo_liga = meta[meta['Liga'].astype(str).str.lower().str.strip() == 'si']
-    meses_ordenados = df_solo_liga.groupby('Mes')['Fecha'].max().sort_values(ascending=False).index.tolist()
-    meses_disponibles = [m for m in meses_ordenados if pd.notna(m)]
-else:
-    meses_disponibles = []
+class GestorSegundoPlano(dash.DiskcacheManager):
+    """
+    DiskcacheManager que recoge el proceso de cada trabajo apenas termina. La consulta
+    que lee el resultado (y termina el trabajo) puede caer en otro worker, que no puede
+    recogerlo y espera hasta un segundo a que desaparezca.
+    """
+
+    def call_job_fn(self, key, job_fn, args, context):
+        job = super().call_job_fn(key, job_fn, args, context)
+        threading.Thread(target=self._recoger, args=(job,), name="trabajo", daemon=True).start()
+        return job
+
+    @staticmethod
+    def _recoger(job):
+        # Se espera sin recogerlo y lo recoge multiprocess, que así lo saca de sus hijos activos
+        os.waitid(os.P_PID, job, os.WEXITED | os.WNOWAIT)
+        multiprocess.active_children()
+
+
+gestor_segundo_plano = GestorSegundoPlano(
+    diskcache.Cache(RUTA_SEGUNDO_PLANO),
+    # La versión de datos entra en la clave de cada trabajo: dos usuarios con los mismos
+    # parámetros comparten el resultado, pero nunca el de otra versión
+    cache_by=[lambda: almacen.actual.version],
+    expire=EXPIRA_SEGUNDO_PLANO
+) if diskcache is not None and RUTA_SEGUNDO_PLANO and FORK_DISPONIBLE else None
+
+# Cada trabajo corre en un proceso que termina al responder: lo que calcula (agregados,
+# meses congelados de la liga) se guarda también en la caché de disco del gestor, que
+# comparten los workers y los trabajos siguientes
+disco_segundo_plano = gestor_segundo_plano.handle if gestor_segundo_plano is not None else None
+
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
+                background_callback_manager=gestor_segundo_plano)
+server = app.server
 
 # Definir eventos
 eventos = {
@@ -39,225 +99,1818 @@ eventos = {
     "Mazos jugados desde baneo de Monastery Swiftspear": datetime(2023, 12, 4)
 }
 
-# ========== UI ==========
-app.layout = dbc.Container([
-    html.H1("Metagame Santiago Pauper MTG", className="mt-3 mb-4"),
-
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    dcc.Tabs(
-                        id="tabs",
-                        value="metagame",
-                        vertical=True,
-                        parent_style={
-                            'width': '250px',
-                            'min-width': '250px',
-                            'margin-right': '20px'
-                        },
-                        style={
-                            'height': '100%',
-                            'border-right': '1px solid #d6d6d6',
-                            'background': '#f8f9fa'
-                        },
-                        children=[
-                            dcc.Tab(
-                                label="Metagame",
-                                value="metagame",
-                                style={
-                                    'padding': '12px 20px',
-                                    'font-size': '14px',
-                                    'text-align': 'left',
-                                    'margin-bottom': '8px'
-                                },
-                                selected_style={
-                                    'border-left': '4px solid #007bff',
-                                    'font-weight': 'bold',
-                                    'background-color': '#e9ecef'
-                                }
-                            ),
-                            dcc.Tab(
-                                label="Torneos ganados o podios",
-                                value="top_distribution",
-                                style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
-                                selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
-                            ),
-                            dcc.Tab(
-                                label="Presencia mensual",
-                                value="evolution",
-                                style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
-                                selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
-                            ),
-                            dcc.Tab(
-                                label="Tasa de Conversión",
-                                value="conversion_table",
-                                style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
-                                selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
-                            ),
-                            dcc.Tab(
-                                label="Winrate por mazo",
-                                value="winrate",
-                                style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
-                                selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
-                            ),
-                            dcc.Tab(
-                                label="Winrate vs Porcentaje de Juego",
-                                value="winrate_juego",
-                                style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
-                                selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
-                            ),
-                            dcc.Tab(
-                                label="Cruces entre mazos",
-                                value="heatmap",
-                                style={'padding': '10px', 'font-size': '14px'},
-                                selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
-                            ),
-                            dcc.Tab(
-                                label="Liga Mensual",
-                                value="liga",
-                                style={'margin-top': '10px', 'padding': '10px', 'font-size': '14px', 'background-color': '#e3f2fd'},
-                                selected_style={'border-left': '4px solid #007bff', 'font-weight': 'bold', 'background-color': '#bbdefb'}
-                            ),
-                        ]
-                    ),
-
-                    # Filtros condicionales
-                    html.Div(id="filtro-metagame", children=[
-                        dbc.RadioItems(
-                            id="filtro-metagame-radio",
-                            options=[
-                                {"label": "Por evento", "value": "evento"},
-                                {"label": "Por rango de fechas", "value": "fechas"},
-                                {"label": "Torneo específico", "value": "fecha_puntual"}
-                            ],
-                            value="evento"
-                        )
-                    ], style={'display': 'none'}),
+# ========== ÍNDICE DE FECHAS ==========
+class IndiceFechas:
+    """
+    Índice sobre una tabla ordenada por fecha. Cada torneo (fecha única) tiene un
+    ordinal y la fila donde empieza, así que cualquier ventana temporal se resuelve
+    con searchsorted en O(log n) a un rango contiguo de filas, sin máscara ni copia.
+    Las filas sin fecha (NaT) quedan al final y nunca entran en una ventana.
+    """
 
-                    html.Div(id="filtro-winrate", children=[
-                        dbc.RadioItems(
-                            id="filtro-winrate-radio",
-                            options=[
-                                {"label": "Por evento", "value": "evento"},
-                                {"label": "Por rango de fechas", "value": "fechas"}
-                            ],
-                            value="evento"
-                        )
-                    ], style={'display': 'none'}),
+    def __init__(self, fechas, cortes=()):
+        valores = fechas.to_numpy(dtype='datetime64[ns]')
+        n_validas = int((~np.isnat(valores)).sum())
+        self.torneos, inicio = np.unique(valores[:n_validas], return_index=True)
+        self.limites = np.append(inicio, n_validas)
+        # Los cortes de `eventos` se resuelven a ordinales una sola vez
+        self.cortes = {pd.Timestamp(c): self.ordinal(c) for c in cortes}
 
-                    html.Div(id="filtro-heatmap", children=[
-                        dbc.RadioItems(
-                            id="filtro-heatmap-radio",
-                            options=[{"label": "Por evento", "value": "evento"}],
-                            value="evento"
-                        )
-                    ], style={'display': 'none'}),
+    def ordinal(self, fecha, lado='left'):
+        return int(np.searchsorted(self.torneos, pd.Timestamp(fecha).to_datetime64(), side=lado))
+
+    def filas_torneos(self, t_inicio, t_fin):
+        """Filas de los torneos con ordinal en [t_inicio, t_fin)."""
+        return slice(int(self.limites[t_inicio]), int(self.limites[max(t_inicio, t_fin)]))
+
+    def rango(self, ventana):
+        """Ordinales [t_inicio, t_fin) de los torneos de una ventana de `normalizar_ventana`."""
+        if ventana[0] == "evento":
+            t_inicio = self.cortes.get(ventana[1])
+            return (self.ordinal(ventana[1]) if t_inicio is None else t_inicio), len(self.torneos)
+        elif ventana[0] == "fechas":
+            return self.ordinal(ventana[1]), self.ordinal(ventana[2], 'right')
+        return self.ordinal(ventana[1]), self.ordinal(ventana[1], 'right')
+
+    def filas(self, ventana):
+        """Slice de filas para una ventana de `normalizar_ventana`."""
+        return self.filas_torneos(*self.rango(ventana))
+
+
+# ========== SUMAS ACUMULADAS POR ARQUETIPO ==========
+# Métricas de la tabla torneo × arquetipo (agregar_torneos) que se suman por arquetipo
+METRICAS_ARQUETIPO = ['Apariciones', 'Jugadores', 'Wins', 'Loses', 'Draws', 'Top1', 'Top3']
+
+
+class ResumenArquetipos:
+    """
+    Totales por arquetipo de una ventana: una fila por arquetipo presente con las
+    METRICAS_ARQUETIPO, en orden de primera aparición en la ventana (el de value_counts,
+    así los empates se ordenan igual), y el número de torneos de la ventana.
+    """
+
+    def __init__(self, filas, n_torneos):
+        self.filas = filas
+        self.n_torneos = n_torneos
+
+    @property
+    def empty(self):
+        return self.filas.empty
+
+    def por_arquetipo(self):
+        """Las mismas filas en orden de categoría, el de un groupby por Arquetipo."""
+        return self.filas.sort_values('Arquetipo', kind='stable', ignore_index=True)
+
+
+def resumen_desde_codigos(codigos, totales, categorias, n_torneos):
+    """ResumenArquetipos con los arquetipos `codigos` (ya en orden) y sus totales (una fila por código)."""
+    filas = pd.DataFrame(totales.astype(np.int64), columns=METRICAS_ARQUETIPO)
+    filas.insert(0, 'Arquetipo', pd.Categorical.from_codes(codigos, categories=categorias))
+    return ResumenArquetipos(filas, n_torneos)
+
+
+def resumir_torneos(torneos):
+    """ResumenArquetipos de filas torneo × arquetipo recorriéndolas (sin índice)."""
+    categorias = torneos['Arquetipo'].cat.categories
+    codigos = torneos['Arquetipo'].cat.codes.to_numpy()
+    validos = codigos >= 0
+    codigos = codigos[validos]
+    presentes, primera = np.unique(codigos, return_index=True)
+    orden = presentes[np.argsort(primera)]
+    totales = np.column_stack([
+        np.bincount(codigos, weights=torneos[m].to_numpy()[validos], minlength=len(categorias))[orden]
+        for m in METRICAS_ARQUETIPO
+    ])
+    return resumen_desde_codigos(orden, totales.reshape(len(orden), len(METRICAS_ARQUETIPO)),
+                                 categorias, len(torneos['Fecha'].unique()))
+
+
+class SumasAcumuladas:
+    """
+    Sumas acumuladas de las METRICAS_ARQUETIPO por torneo (en orden de fecha) y
+    arquetipo: la fila t tiene los totales de los torneos con ordinal < t, así que
+    los de cualquier rango [t_inicio, t_fin) salen de restar dos filas, en
+    O(arquetipos) sin importar cuánta historia haya.
+
+    Para el orden de primera aparición se guarda además, por arquetipo, la lista
+    ordenada de las filas de la tabla torneo × arquetipo en que aparece.
+    """
+
+    def __init__(self, torneos, indice):
+        self.indice = indice
+        self.categorias = torneos['Arquetipo'].cat.categories
+        n_arquetipos = len(self.categorias)
+        codigos = torneos['Arquetipo'].cat.codes.to_numpy().astype(np.int64)
+        ordinales = np.repeat(np.arange(len(indice.torneos)), np.diff(indice.limites))
+        validos = np.flatnonzero(codigos[:len(ordinales)] >= 0)
+
+        # Cada (torneo, arquetipo) es una sola fila de la tabla: basta asignar y acumular
+        self.acumulado = np.zeros((len(indice.torneos) + 1, n_arquetipos, len(METRICAS_ARQUETIPO)), dtype=np.int64)
+        self.acumulado[ordinales[validos] + 1, codigos[validos]] = torneos[METRICAS_ARQUETIPO].to_numpy()[validos]
+        np.cumsum(self.acumulado, axis=0, out=self.acumulado)
+
+        # Claves arquetipo * n + fila, ordenadas: la primera fila >= inicio de cada
+        # arquetipo sale de un searchsorted
+        self._n = len(torneos)
+        self._claves = np.sort(codigos[validos] * self._n + validos)
+
+    def resumen(self, t_inicio, t_fin):
+        t_fin = max(t_inicio, t_fin)
+        totales = self.acumulado[t_fin] - self.acumulado[t_inicio]
+        presentes = np.flatnonzero(totales[:, 0] > 0)
+        base = presentes * self._n
+        primera = self._claves[np.searchsorted(self._claves, base + self.indice.limites[t_inicio])] - base
+        orden = presentes[np.argsort(primera)]
+        return resumen_desde_codigos(orden, totales[orden], self.categorias, t_fin - t_inicio)
+
+
+# ========== CUBO MENSUAL ==========
+class ConteosMensuales:
+    """
+    Filas de una ventana por mes × arquetipo (meses como Timestamp del día 1 en el
+    índice, arquetipos presentes como columnas categóricas) y sus fechas extremas.
+
+    Se normalizan una sola vez: `porcentajes` (cada mes suma 100) y `orden` (los
+    arquetipos de más a menos filas en la ventana), así cada valor del slider de
+    evolution es solo una selección de columnas.
+    """
+
+    def __init__(self, conteos, fecha_min, fecha_max):
+        self.conteos = conteos
+        self.fecha_min = fecha_min
+        self.fecha_max = fecha_max
+        self.porcentajes = conteos.div(conteos.sum(axis=1), axis=0) * 100
+        self.orden = conteos.sum().sort_values(ascending=False).index
+
+    def media_movil(self, meses):
+        """
+        Porcentajes sobre los últimos `meses` meses de la ventana (menos al principio):
+        las filas de cada arquetipo en esos meses sobre el total, restando dos filas de
+        las sumas acumuladas por mes en lugar de un rolling por columna.
+        """
+        if meses <= 1:
+            return self.porcentajes
+        conteos = self.conteos.to_numpy()
+        acumulado = np.vstack([np.zeros((1, conteos.shape[1]), dtype=conteos.dtype), np.cumsum(conteos, axis=0)])
+        hasta = np.arange(1, len(conteos) + 1)
+        sumas = acumulado[hasta] - acumulado[np.maximum(hasta - meses, 0)]
+        return pd.DataFrame(sumas / sumas.sum(axis=1, keepdims=True) * 100,
+                            index=self.conteos.index, columns=self.conteos.columns)
+
+
+class CuboMensual:
+    """
+    Apariciones por mes × arquetipo para evolution: las sumas acumuladas por torneo
+    (SumasAcumuladas) tomadas en el borde de cada mes, una fila por mes. Los conteos
+    mensuales de cualquier ventana son diferencias entre filas consecutivas; solo los
+    meses de los extremos, que una ventana puede cortar a mitad de mes, usan las
+    sumas del torneo donde empieza o termina. O(meses × arquetipos) sin recorrer filas.
+    """
+
+    def __init__(self, sumas):
+        self.sumas = sumas
+        torneos = sumas.indice.torneos
+        meses, inicio = np.unique(torneos.astype('datetime64[M]'), return_index=True)
+        self.meses = meses.astype('datetime64[ns]')
+        self.limites = np.append(inicio, len(torneos))
+        self.acumulado = sumas.acumulado[self.limites, :, 0]
+
+    def conteos(self, t_inicio, t_fin):
+        t_fin = max(t_inicio, t_fin)
+        # Meses [m_inicio, m_fin) con torneos en la ventana; sus bordes extremos se recortan a ella
+        m_inicio = int(np.searchsorted(self.limites, t_inicio, side='right')) - 1
+        m_fin = max(m_inicio, int(np.searchsorted(self.limites, t_fin)))
+        bordes = self.acumulado[m_inicio:m_fin + 1].copy()
+        bordes[0] = self.sumas.acumulado[t_inicio, :, 0]
+        bordes[-1] = self.sumas.acumulado[t_fin, :, 0]
+        conteos = np.diff(bordes, axis=0)
+
+        # Como el groupby sobre las filas: solo meses y arquetipos con alguna fila
+        con_filas = conteos.sum(axis=1) > 0
+        presentes = np.flatnonzero(conteos.sum(axis=0) > 0)
+        tabla = pd.DataFrame(
+            conteos[con_filas][:, presentes],
+            index=pd.DatetimeIndex(self.meses[m_inicio:m_fin][con_filas], name='Mes'),
+            columns=pd.CategoricalIndex(pd.Categorical.from_codes(presentes, categories=self.sumas.categorias),
+                                        name='Arquetipo')
+        )
+        fechas = self.sumas.indice.torneos[t_inicio:t_fin]
+        if len(fechas) == 0:
+            return ConteosMensuales(tabla, pd.NaT, pd.NaT)
+        return ConteosMensuales(tabla, pd.Timestamp(fechas[0]), pd.Timestamp(fechas[-1]))
+
+
+# ========== CUBO DE CRUCES ==========
+class MatrizCruces:
+    """
+    Cruces de una ventana agregados mazo × mazo: victorias y partidas por celda,
+    qué celdas tienen algún cruce (`presente`) y las partidas de cada mazo
+    (incluidas las sin rival). `n_torneos` en 0 es una ventana sin cruces.
+    """
+
+    def __init__(self, nombres, victorias, partidas, presente, partidas_por_mazo, n_torneos):
+        self.nombres = nombres
+        self.victorias = victorias
+        self.partidas = partidas
+        self.presente = presente
+        self.partidas_por_mazo = partidas_por_mazo
+        self.n_torneos = n_torneos
+
+    @property
+    def empty(self):
+        return self.n_torneos == 0
+
+
+def celdas_cruces(df_cruces):
+    """
+    Cada cruce como dos filas dirigidas, (mazo1 vs mazo2, v1) y (mazo2 vs mazo1, v2),
+    ambas con v1 + v2 partidas. Sin rival (bye o mazo faltante) el rival es el código
+    d, una columna extra fuera de la matriz. Devuelve (fila del cruce, mazo, rival,
+    victorias, partidas, d) solo para las filas con mazo.
+    """
+    n = len(df_cruces)
+    # mazo1 y mazo2 comparten el diccionario de arquetipos: sus códigos indexan la matriz
+    d = len(df_cruces['mazo1'].cat.categories)
+    codigos = np.concatenate([df_cruces['mazo1'].cat.codes.to_numpy(), df_cruces['mazo2'].cat.codes.to_numpy()]).astype(np.int64)
+
+    v1 = df_cruces['v1'].to_numpy(dtype=float)
+    v2 = df_cruces['v2'].to_numpy(dtype=float)
+    total = v1 + v2
+
+    mazo = codigos
+    rival = np.concatenate([codigos[n:], codigos[:n]])
+    rival = np.where(rival >= 0, rival, d)
+    victorias = np.nan_to_num(np.concatenate([v1, v2]))
+    partidas = np.nan_to_num(np.concatenate([total, total]))
+    fila = np.tile(np.arange(n), 2)
+
+    con_mazo = mazo >= 0
+    return fila[con_mazo], mazo[con_mazo], rival[con_mazo], victorias[con_mazo], partidas[con_mazo], d
+
+
+def cubo_cruces(cruces, indice):
+    """
+    Victorias, partidas y número de cruces acumulados por torneo (en orden de fecha)
+    de cada celda mazo × rival, con el rival sin mazo como última columna. Se
+    devuelve plano, una columna por métrica, para poder compartirlo como tabla Arrow.
+    Los resultados son enteros (partidas ganadas), así que int32 es exacto.
+    """
+    fila, mazo, rival, victorias, partidas, d = celdas_cruces(cruces)
+    n_torneos = len(indice.torneos)
+    # Las filas sin fecha quedan fuera de todos los torneos
+    en_torneo = fila < indice.limites[-1]
+    ordinal = np.repeat(np.arange(n_torneos), np.diff(indice.limites))[fila[en_torneo]]
+    celda = ((ordinal + 1) * d + mazo[en_torneo]) * (d + 1) + rival[en_torneo]
+
+    tamano = (n_torneos + 1) * d * (d + 1)
+    columnas = {}
+    for nombre, pesos in (('victorias', victorias[en_torneo]), ('partidas', partidas[en_torneo]), ('cruces', None)):
+        acumulado = np.bincount(celda, weights=pesos, minlength=tamano).astype(np.int32).reshape(n_torneos + 1, -1)
+        columnas[nombre] = np.cumsum(acumulado, axis=0, out=acumulado).reshape(-1)
+    return pd.DataFrame(columnas)
+
+
+class CuboCruces:
+    """
+    Matriz de cruces de cualquier ventana desde el cubo acumulado (cubo_cruces):
+    la diferencia de dos cortes por torneo, O(mazos²) sin recorrer cruces. Las
+    columnas pueden ser vistas de solo lectura sobre un archivo compartido.
+    """
+
+    def __init__(self, cubo, nombres, indice):
+        self.nombres = np.asarray(nombres, dtype=object)
+        self.indice = indice
+        d = len(self.nombres)
+        forma = (len(indice.torneos) + 1, d, d + 1)
+        self.victorias, self.partidas, self.cruces = (cubo[c].to_numpy().reshape(forma)
+                                                      for c in ('victorias', 'partidas', 'cruces'))
+
+    def matriz(self, t_inicio, t_fin):
+        t_fin = max(t_inicio, t_fin)
+        d = len(self.nombres)
+        victorias = (self.victorias[t_fin] - self.victorias[t_inicio]).astype(float)
+        partidas = (self.partidas[t_fin] - self.partidas[t_inicio]).astype(float)
+        presente = (self.cruces[t_fin, :, :d] - self.cruces[t_inicio, :, :d]) > 0
+        return MatrizCruces(self.nombres, victorias[:, :d], partidas[:, :d], presente,
+                            partidas.sum(axis=1), t_fin - t_inicio)
+
+
+# ========== CARGAR DATOS ==========
+def ruta_datos(nombre):
+    """La carpeta particionada si existe (tiene manifiesto); si no, el parquet único."""
+    return nombre if Path(nombre, MANIFIESTO).exists() else f"{nombre}.parquet"
+
+
+def archivo_version(ruta):
+    """
+    Archivo cuyo contenido define la versión de los datos: el parquet mismo o, en un
+    dataset particionado, el manifiesto (se escribe al final, con el hash de cada partición).
+    """
+    return Path(ruta, MANIFIESTO) if Path(ruta).is_dir() else Path(ruta)
+
+
+# Se resuelven con ruta_datos en cada revisión de AlmacenDatos: pasar de la carpeta al
+# parquet único (o al revés) también es un cambio de datos
+NOMBRE_META = "metaR"
+NOMBRE_CRUCES = "cruces"
+
+# Columnas que usa alguna tab; el resto (Fecha2, Trimestre, Variante, ronda) no se lee
+COLUMNAS_META = ['Fecha', 'Standing', 'Mes', 'Liga', 'Arquetipo', 'Jugador', 'Wins', 'Loses', 'Draws',
+                 '%VPO', '%JG', '%JGO', 'Top3', 'Top1']
+COLUMNAS_CRUCES = ['fecha', 'mazo1', 'mazo2', 'v1', 'v2']
+
+# Columnas de texto que se leen directo como diccionario de Arrow (llegan a pandas como
+# categóricos): así no se crea un objeto str de Python por fila al cargar
+COLUMNAS_TEXTO = ['Mes', 'Liga', 'Arquetipo', 'Jugador', 'mazo1', 'mazo2']
+
+
+def leer_dataset(ruta, columnas, filtro=None):
+    """
+    Abre el parquet (o la carpeta particionada) como dataset de Arrow y lee solo las
+    columnas pedidas; con `filtro` se saltan los grupos de filas y particiones cuyas
+    estadísticas min/max no pueden cumplirlo. Las columnas de partición no se agregan.
+    """
+    formato = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=COLUMNAS_TEXTO))
+    dataset = ds.dataset(ruta, format=formato)
+    columnas = [c for c in columnas if c in dataset.schema.names]
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+
+# Cada cuántos segundos se revisa si hay parquet nuevos (0 desactiva la recarga)
+INTERVALO_RECARGA = int(os.environ.get("METAGAME_RECARGA_SEGUNDOS", "30"))
+
+
+def como_categorico(serie, categorias=None):
+    """
+    Categórico con las categorías presentes en orden alfabético (como astype('category')),
+    venga la serie como texto o ya como diccionario de Arrow en orden de aparición.
+    """
+    if categorias is None:
+        categorias = serie.dropna().unique()
+    categorias = sorted(categorias)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # astype no reordena: dos CategoricalDtype no ordenados con las mismas categorías son iguales
+        return serie.cat.set_categories(categorias)
+    return serie.astype(pd.CategoricalDtype(categorias))
+
+
+def reducir_enteros(df):
+    for col in df.select_dtypes('integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def codificar_meta(meta):
+    """
+    Representación compacta de metaR: Arquetipo (categorías en orden alfabético),
+    Jugador, Mes y Liga son categóricos, la marca de Liga queda precalculada en `EsLiga`
+    y los enteros se reducen al menor tipo que los contiene.
+    Los porcentajes (%VPO, %JG, %JGO) se dejan en float64 para no alterar promedios.
+    """
+    meta = meta.copy()
+    meta.columns = meta.columns.str.strip()
+
+    for col in ('Arquetipo', 'Jugador', 'Mes', 'Liga'):
+        if col in meta.columns:
+            meta[col] = como_categorico(meta[col])
+    if 'Liga' in meta.columns:
+        # La marca se evalúa una vez por categoría; los nulos (código -1) quedan en False
+        es_liga = meta['Liga'].cat.categories.astype(str).str.lower().str.strip() == 'si'
+        meta['EsLiga'] = np.append(es_liga, False)[meta['Liga'].cat.codes.to_numpy()]
+
+    return reducir_enteros(meta)
+
+
+def codificar_cruces(cruces):
+    """
+    mazo1 y mazo2 comparten un mismo diccionario de arquetipos (categóricos con las
+    mismas categorías, en orden alfabético), así sus códigos se pueden cruzar directo.
+    """
+    cruces = cruces.copy()
+    arquetipos = set(cruces['mazo1'].dropna().unique()) | set(cruces['mazo2'].dropna().unique())
+    cruces['mazo1'] = como_categorico(cruces['mazo1'], arquetipos)
+    cruces['mazo2'] = como_categorico(cruces['mazo2'], arquetipos)
+
+    # Los resultados de cruces son enteros pequeños con NaN: float32 es exacto
+    for col in ('v1', 'v2'):
+        cruces[col] = pd.to_numeric(cruces[col], downcast='float')
+
+    return reducir_enteros(cruces)
+
+
+def preparar_meta(meta):
+    """metaR codificado y ordenado por fecha: así lo usan (y lo comparten) todas las tabs."""
+    return codificar_meta(meta).sort_values('Fecha', kind='stable').reset_index(drop=True)
+
+
+def preparar_cruces(cruces):
+    return codificar_cruces(cruces).sort_values('fecha', kind='stable').reset_index(drop=True)
+
+
+def leer_torneos(ruta, ruta_meta):
+    """
+    Tabla torneo × arquetipo de xlsxtoparquet.py, solo si se generó desde el metaR
+    vigente (el hash de su origen está en los metadatos). Si falta o quedó desfasada
+    devuelve None y DatosVersion la calcula desde meta.
+    """
+    if not Path(ruta).exists():
+        return None
+    tabla = pq.read_table(ruta, read_dictionary=['Arquetipo'])
+    if (tabla.schema.metadata or {}).get(CLAVE_ORIGEN) != hash_archivo(archivo_version(ruta_meta)).encode():
+        print(f"  ✗ {ruta} no corresponde a {ruta_meta}; se agrega desde meta")
+        return None
+    return tabla.to_pandas()
+
+
+# ========== TABLAS COMPARTIDAS (ARROW IPC) ==========
+# Las tablas ya preparadas se guardan una vez por versión en Arrow IPC sin comprimir
+# y se abren con memory_map: los workers de gunicorn (y las recargas de cada uno)
+# comparten las mismas páginas de la caché del sistema operativo en lugar de tener
+# cada uno su copia privada. Vacío desactiva los archivos compartidos.
+RUTA_IPC = os.environ.get("METAGAME_IPC", os.path.join(tempfile.gettempdir(), "metagame_ipc"))
+# Va en el nombre de los archivos junto con la versión de datos: se incrementa cuando
+# cambia cómo se preparan las tablas, para no abrir archivos de un formato anterior
+FORMATO_IPC = 2
+
+
+def a_arrow(df):
+    """
+    Tabla Arrow con la misma representación que el DataFrame: los categóricos como
+    diccionarios con las mismas categorías y códigos, y los NaN como valores (no nulos)
+    para que al leer no haya que rellenar nada.
+    """
+    columnas = {}
+    for c in df.columns:
+        serie = df[c]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            columnas[c] = pa.DictionaryArray.from_arrays(
+                pa.array(codigos, mask=codigos < 0), pa.array(serie.cat.categories.to_numpy(dtype=object))
+            )
+        else:
+            columnas[c] = pa.array(serie.to_numpy(), from_pandas=False)
+    return pa.table(columnas)
+
+
+def desde_arrow(tabla):
+    """
+    DataFrame que apunta a los buffers de la tabla sin copiarlos (salvo los booleanos,
+    que Arrow guarda como bits). Los códigos de los categóricos se toman directo del
+    buffer de índices, donde los nulos conservan el -1 con que se escribieron.
+    """
+    categoricos = {}
+    for nombre, columna in zip(tabla.column_names, tabla.columns):
+        if pa.types.is_dictionary(columna.type):
+            arr = columna.combine_chunks()
+            indices = arr.indices
+            codigos = np.frombuffer(indices.buffers()[1], dtype=indices.type.to_pandas_dtype(),
+                                    count=len(arr), offset=indices.offset * indices.type.bit_width // 8)
+            categoricos[nombre] = pd.Categorical.from_codes(
+                codigos, categories=pd.Index(arr.dictionary.to_pylist(), dtype=object), validate=False
+            )
+    # split_blocks evita que pandas consolide (y copie) las columnas del mismo tipo
+    df = tabla.drop_columns(list(categoricos)).to_pandas(split_blocks=True)
+    for nombre, categorico in categoricos.items():
+        df.insert(tabla.column_names.index(nombre), nombre, categorico)
+    return df
+
+
+def escribir_ipc(tabla, ruta):
+    tmp = ruta.with_name(f".{ruta.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(tmp), "wb") as f, ipc.new_file(f, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    os.replace(tmp, ruta)
+
+
+def tabla_compartida(version, nombre, preparar):
+    """
+    Devuelve la tabla `nombre` de la versión dada abierta desde su archivo IPC. El primer
+    proceso que la pide la prepara (`preparar()`) y la escribe; el resto solo la mapea.
+    """
+    if not RUTA_IPC:
+        return preparar()
+    ruta = Path(RUTA_IPC, f"{version}-{FORMATO_IPC}-{nombre}.arrow")
+    try:
+        if not ruta.exists():
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            # Los workers arrancan a la vez: uno prepara y escribe, los demás esperan el archivo
+            with open(ruta.with_name(f".{ruta.name}.lock"), "w") as candado:
+                if fcntl is not None:
+                    fcntl.flock(candado, fcntl.LOCK_EX)
+                if not ruta.exists():
+                    escribir_ipc(a_arrow(preparar()), ruta)
+                    # Las versiones anteriores ya no se abren; los procesos que aún las
+                    # mapean conservan sus páginas hasta soltarlas
+                    for viejo in ruta.parent.glob(f"*-{nombre}.arrow"):
+                        if viejo != ruta:
+                            viejo.unlink(missing_ok=True)
+                            viejo.with_name(f".{viejo.name}.lock").unlink(missing_ok=True)
+        return desde_arrow(ipc.open_file(pa.memory_map(str(ruta))).read_all())
+    except OSError as e:
+        print(f"  ✗ Sin tabla compartida para {nombre} ({e}); se usa una copia privada")
+        return preparar()
+
+
+class DatosVersion:
+    """
+    Una versión inmutable de los datos junto con todo lo que se deriva de ella
+    (índices de fechas, opciones de los dropdowns). Cada request toma una sola
+    versión al empezar, así que nunca mezcla datos de dos cargas distintas.
+
+    `cruces` puede ser el DataFrame o una función que lo lee: solo el heatmap lo
+    usa, así que en ese caso se carga (y se indexa y acumula en CuboCruces) la
+    primera vez que se pide. `compartir(nombre, preparar)` decide dónde vive el
+    cubo; AlmacenDatos lo guarda como tabla compartida entre workers.
+    Con `preparadas` las tablas ya vienen codificadas y ordenadas (preparar_meta,
+    preparar_cruces) y se usan tal cual, sin copiarlas.
+
+    `torneos` es la tabla torneo × arquetipo (agregar_torneos); si no viene se
+    calcula desde meta. Sobre ella se acumulan las sumas por arquetipo con que las
+    tabs que solo agregan por arquetipo resuelven cualquier ventana (`resumen`), y
+    por mes las de evolution (`conteos_mensuales`).
+
+    Las tabs no consultan la versión directamente sino su motor de consultas
+    (motor_consultas), que se crea la primera vez que se pide.
+    """
+
+    def __init__(self, meta, cruces, version, preparadas=False, torneos=None, compartir=None):
+        # Parquet ya tiene tipos correctos (fechas, numéricos); solo se compactan.
+        # Las tablas se ordenan por fecha una sola vez para poder filtrar por rangos contiguos
+        self.meta = meta if preparadas else preparar_meta(meta)
+        self.version = version
+        leer_cruces = cruces if callable(cruces) else (lambda: cruces)
+        self._leer_cruces = leer_cruces if preparadas else (lambda: preparar_cruces(leer_cruces()))
+        self._cruces = None
+        self._lock_cruces = threading.Lock()
+        self._compartir = compartir or (lambda nombre, preparar: preparar())
+
+        # Pre-procesar datos una sola vez por versión (no en cada callback)
+        self.meta_fecha_min = self.meta['Fecha'].min()
+        self.meta_fecha_max = self.meta['Fecha'].max()
+        self.fechas_unicas = sorted(self.meta['Fecha'].unique(), reverse=True)
+
+        # Obtener meses disponibles para la Liga
+        if 'Mes' in self.meta.columns and 'EsLiga' in self.meta.columns:
+            df_solo_liga = self.meta[self.meta['EsLiga']]
+            meses_ordenados = df_solo_liga.groupby('Mes', observed=True)['Fecha'].max().sort_values(ascending=False).index.tolist()
+            self.meses_disponibles = [m for m in meses_ordenados if pd.notna(m)]
+        else:
+            self.meses_disponibles = []
+
+        self.indice_meta = IndiceFechas(self.meta['Fecha'], cortes=eventos.values())
+
+        # Ordenada por fecha como meta: las ventanas se resuelven con su propio índice
+        self.torneos = agregar_torneos(self.meta) if torneos is None else torneos
+        self.torneos['Arquetipo'] = como_categorico(self.torneos['Arquetipo'], self.meta['Arquetipo'].cat.categories)
+        self.indice_torneos = IndiceFechas(self.torneos['Fecha'], cortes=eventos.values())
+        self.acumulado = SumasAcumuladas(self.torneos, self.indice_torneos)
+        self.mensual = CuboMensual(self.acumulado)
+        self.motor = None
+
+    def _cargar_cruces(self):
+        if self._cruces is None:
+            with self._lock_cruces:
+                if self._cruces is None:
+                    cruces = self._leer_cruces()
+                    indice = IndiceFechas(cruces['fecha'], cortes=eventos.values())
+                    cubo = self._compartir("cubo_cruces", lambda: cubo_cruces(cruces, indice))
+                    # De las filas solo quedan el cubo y su índice de fechas
+                    self._cruces = CuboCruces(cubo, cruces['mazo1'].cat.categories, indice)
+        return self._cruces
+
+    def filtrar_meta(self, ventana):
+        return self.meta.iloc[self.indice_meta.filas(ventana)]
+
+    def resumen(self, ventana):
+        """ResumenArquetipos de la ventana desde las sumas acumuladas."""
+        return self.acumulado.resumen(*self.indice_torneos.rango(ventana))
+
+    def conteos_mensuales(self, ventana):
+        """ConteosMensuales de la ventana desde el cubo mensual."""
+        return self.mensual.conteos(*self.indice_torneos.rango(ventana))
+
+    def matriz(self, ventana):
+        """MatrizCruces de la ventana desde el cubo acumulado."""
+        cubo = self._cargar_cruces()
+        return cubo.matriz(*cubo.indice.rango(ventana))
+
+
+class AlmacenDatos:
+    """
+    Mantiene la versión vigente de metaR/cruces y la recarga en caliente.
+
+    Un hilo por worker revisa mtime y tamaño de los parquet (o del manifiesto de un
+    dataset particionado); si cambiaron y el contenido es distinto, carga la nueva
+    versión en segundo plano y la publica con una sola asignación, sin reiniciar gunicorn. El hash del contenido es el
+    token de versión que usan las cachés para invalidarse.
+    """
 
-                    html.Div(id="filtro-liga", children=[
-                        html.Label("Selecciona el mes de Liga:", className="fw-bold"),
+    def __init__(self, nombre_meta, nombre_cruces, intervalo=INTERVALO_RECARGA):
+        self.nombres = (nombre_meta, nombre_cruces)
+        self.intervalo = intervalo
+        self._firma = self._firma_archivos()
+        self.actual = self._cargar()
+        self._pid_vigilancia = None
+        self._lock = threading.Lock()
+
+    @property
+    def rutas(self):
+        """Rutas vigentes de metaR y cruces: la carpeta particionada o el parquet único."""
+        return tuple(map(ruta_datos, self.nombres))
+
+    def _firma_archivos(self):
+        return tuple((a, os.stat(a).st_mtime_ns, os.stat(a).st_size) for a in map(archivo_version, self.rutas))
+
+    def _version(self, rutas):
+        # Hash del contenido leído por bloques: no se retienen los bytes de los archivos
+        h = hashlib.blake2b(digest_size=8)
+        for r in rutas:
+            with open(archivo_version(r), "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    h.update(bloque)
+        return h.hexdigest()
+
+    def _cargar(self):
+        rutas = self.rutas
+        version = self._version(rutas)
+        if getattr(self, 'actual', None) is not None and version == self.actual.version:
+            return self.actual
+        # Si un archivo se reemplaza entre el hash y la lectura, su firma ya cambió y la
+        # próxima revisión vuelve a cargar
+        ruta_meta, ruta_cruces = rutas
+        meta = tabla_compartida(version, "meta", lambda: preparar_meta(leer_dataset(ruta_meta, COLUMNAS_META)))
+        # Ninguna ventana empieza antes del primer torneo de meta (el mínimo del selector de fechas)
+        desde = meta['Fecha'].min()
+        filtro_cruces = ds.field('fecha') >= desde if pd.notna(desde) else None
+        return DatosVersion(
+            meta,
+            lambda: tabla_compartida(version, "cruces", lambda: preparar_cruces(
+                leer_dataset(ruta_cruces, COLUMNAS_CRUCES, filtro_cruces)
+            )),
+            version,
+            preparadas=True,
+            torneos=leer_torneos(ARCHIVO_TORNEOS, ruta_meta),
+            compartir=lambda nombre, preparar: tabla_compartida(version, nombre, preparar)
+        )
+
+    def revisar(self):
+        """Recarga si los parquet cambiaron. Devuelve True si se publicó una versión nueva."""
+        firma = self._firma_archivos()
+        if firma == self._firma:
+            return False
+
+        anterior = self.actual
+        # Si el archivo está a medio escribir la lectura falla y se reintenta en la próxima revisión
+        nuevo = self._cargar()
+        self._firma = firma
+        if nuevo is anterior:
+            return False
+
+        self.actual = nuevo
+        cache_agregados.limpiar()
+        if cache_respuestas is not None:
+            cache_respuestas.purgar(nuevo.version)
+        print(f"Datos recargados: versión {anterior.version} → {nuevo.version}")
+        return True
+
+    def iniciar_vigilancia(self):
+        """Arranca el hilo de recarga en este proceso (una vez por worker, también tras un fork)."""
+        if self.intervalo <= 0 or self._pid_vigilancia == os.getpid():
+            return
+        with self._lock:
+            if self._pid_vigilancia == os.getpid():
+                return
+            self._pid_vigilancia = os.getpid()
+            threading.Thread(target=self._vigilar, name="recarga-datos", daemon=True).start()
+
+    def _vigilar(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"  ✗ Error al recargar datos: {e}")
+
+
+# ========== CACHÉ DE AGREGADOS ==========
+def leer_disco(disco, clave):
+    """Valor guardado en una caché de diskcache, o None si no está o no se pudo leer."""
+    try:
+        return disco.get(clave)
+    except Exception as e:
+        print(f"  ✗ Error al leer {clave} de la caché de disco: {e}")
+        return None
+
+
+def guardar_disco(disco, clave, valor, expira=None):
+    try:
+        disco.set(clave, valor, expire=expira)
+    except Exception as e:
+        print(f"  ✗ Error al guardar {clave} en la caché de disco: {e}")
+
+
+class CacheLRU:
+    """
+    Caché LRU acotada para los DataFrames agregados intermedios. Los aciertos y
+    fallos de agregado() se cuentan por tab en /metrics (metagame_cache_agregados_total).
+
+    Con `disco` (una caché de diskcache) tiene un segundo nivel compartido entre
+    procesos: lo calculado se guarda en los dos y un fallo en memoria se busca en el
+    disco antes de calcular.
+    """
+
+    def __init__(self, max_entradas=256, disco=None, expira=None):
+        self.max_entradas = max_entradas
+        self.disco = disco
+        self.expira = expira
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, calcular):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                return self._datos[clave]
+
+        # Se calcula fuera del lock para no bloquear a otros hilos del worker
+        valor = None if self.disco is None else leer_disco(self.disco, f"agregado|{clave!r}")
+        if valor is None:
+            valor = calcular()
+            if self.disco is not None:
+                guardar_disco(self.disco, f"agregado|{clave!r}", valor, self.expira)
+
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+cache_agregados = CacheLRU(max_entradas=256, disco=disco_segundo_plano, expira=EXPIRA_AGREGADOS)
+
+
+def normalizar_ventana(filtro, evento=None, start_date=None, end_date=None, fecha_unica=None):
+    """
+    Convierte los valores de los controles en una clave hashable e independiente
+    del formato en que Dash envía las fechas (string ISO, Timestamp, etc.).
+    """
+    if filtro == "evento":
+        return ("evento", pd.Timestamp(eventos[evento]))
+    elif filtro == "fechas":
+        return ("fechas", pd.Timestamp(start_date), pd.Timestamp(end_date))
+    return ("fecha_puntual", pd.Timestamp(fecha_unica))
+
+
+def agregado(tab, ventana, parametros, calcular, version=None):
+    """
+    Devuelve el agregado de `tab` para la ventana, parámetros y versión de datos
+    dados usando la caché. Sin ventana (llamadas directas a las funciones update_*)
+    se calcula siempre.
+    """
+    if ventana is None:
+        return calcular()
+    calculado = []
+    valor = cache_agregados.obtener((tab, ventana, parametros, version), lambda: calculado.append(True) or calcular())
+    metricas.incrementar("metagame_cache_agregados_total", {"tab": tab, "resultado": "fallo" if calculado else "acierto"})
+    return valor
+
+
+almacen = AlmacenDatos(NOMBRE_META, NOMBRE_CRUCES)
+
+
+@server.before_request
+def _iniciar_recarga():
+    almacen.iniciar_vigilancia()
+
+
+# ========== MOTORES DE CONSULTA ==========
+# Quién resuelve las agregaciones de las tabs: "pandas" (las tablas en memoria de cada
+# versión) o "duckdb" (SQL sobre los parquet, en proceso y en varios hilos; requiere
+# pip install duckdb)
+MOTOR_CONSULTAS = os.environ.get("METAGAME_MOTOR", "pandas")
+
+
+class MotorConsultas:
+    """
+    Interfaz común de los motores de consulta de una versión de datos. Los dos motores
+    devuelven lo mismo, así las update_* no saben cuál respondió:
+
+    - resumen(ventana): ResumenArquetipos (apariciones, jugadores, W/L/D, Top1, Top3)
+    - conteos_mensuales(ventana): ConteosMensuales (filas por mes × arquetipo)
+    - matriz(ventana): MatrizCruces (victorias y partidas mazo × mazo)
+    - liga(mes): AcumuladaLiga para 'Acumulada'; para un mes, sus filas de liga
+    - filas(ventana): las filas de jugadores (la tabla de un torneo)
+
+    `consulta` guarda un resultado en la caché de agregados con la versión en la clave.
+    """
+
+    def __init__(self, datos):
+        self.datos = datos
+
+    def consulta(self, nombre, argumentos, calcular):
+        return cache_agregados.obtener((type(self).__name__, nombre, argumentos, self.datos.version), calcular)
+
+
+class MotorPandas(MotorConsultas):
+    """Las tablas en memoria de la DatosVersion: sumas acumuladas, cubos mensual y de cruces, filas por rango."""
+
+    def resumen(self, ventana):
+        return self.datos.resumen(ventana)
+
+    def conteos_mensuales(self, ventana):
+        return self.datos.conteos_mensuales(ventana)
+
+    def matriz(self, ventana):
+        return self.datos.matriz(ventana)
+
+    def liga(self, mes):
+        meta = self.datos.meta
+        if mes == 'Acumulada':
+            return self.consulta("liga", mes, lambda: acumulada_liga(meta))
+        return meta[(meta['Mes'] == mes) & meta['EsLiga']]
+
+    def filas(self, ventana):
+        return self.datos.filtrar_meta(ventana)
+
+
+def identificador(nombre):
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def fuente_parquet(ruta):
+    """read_parquet de DuckDB sobre el parquet o la carpeta particionada (sin columnas de partición)."""
+    patron = str(Path(ruta, "**", "*.parquet") if Path(ruta).is_dir() else Path(ruta)).replace("'", "''")
+    return f"read_parquet('{patron}', filename = true, file_row_number = true, hive_partitioning = false)"
+
+
+def condicion_ventana(ventana, columna):
+    """Condición SQL y parámetros de una ventana de `normalizar_ventana` (los mismos torneos que IndiceFechas.rango)."""
+    fechas = [pd.Timestamp(f).to_pydatetime() for f in ventana[1:]]
+    if ventana[0] == "evento":
+        return f"{columna} >= ?", fechas
+    elif ventana[0] == "fechas":
+        return f"{columna} BETWEEN ? AND ?", fechas
+    return f"{columna} = ?", fechas
+
+
+class MotorDuckDB(MotorConsultas):
+    """
+    Las mismas agregaciones como SQL de DuckDB directo sobre los parquet (o las carpetas
+    particionadas), en proceso y sin servidor: cada consulta lee solo las columnas que
+    usa, la agrega en varios hilos y a pandas solo llega el resultado, del tamaño de los
+    arquetipos o de los jugadores y no del historial.
+
+    Reproduce lo que hacen las tablas en memoria: los arquetipos en orden de primera
+    aparición por (Fecha, archivo, fila del archivo), el de metaR ordenado por fecha;
+    las categorías de Arquetipo y Jugador de todo metaR; los cruces desde el primer
+    torneo de metaR. Lee los archivos al consultar: si cambian, hasta la próxima recarga
+    responde con los nuevos bajo la versión anterior.
+    """
+
+    def __init__(self, datos, ruta_meta, ruta_cruces):
+        super().__init__(datos)
+        self.rutas = (ruta_meta, ruta_cruces)
+        self._local = threading.local()
+        self._categorias = {}
+
+    def _vistas(self):
+        ruta_meta, ruta_cruces = self.rutas
+        # Como codificar_meta: los nombres de columna del Excel pueden traer espacios
+        meta = ", ".join(f"{identificador(c)} AS {identificador(c.strip())}"
+                         for c in ds.dataset(ruta_meta, format="parquet").schema.names if c.strip() in COLUMNAS_META)
+        cruces = ", ".join(identificador(c) for c in ds.dataset(ruta_cruces, format="parquet").schema.names
+                           if c in COLUMNAS_CRUCES)
+        desde = self.datos.meta_fecha_min
+        filtro_cruces = f"WHERE fecha >= TIMESTAMP '{desde.isoformat(sep=' ')}'" if pd.notna(desde) else ""
+        return [
+            f"""CREATE VIEW meta AS SELECT {meta}, coalesce(lower(trim("Liga")) = 'si', false) AS EsLiga,
+                       filename AS archivo, file_row_number AS fila
+                FROM {fuente_parquet(ruta_meta)}""",
+            f"CREATE VIEW cruces AS SELECT {cruces} FROM {fuente_parquet(ruta_cruces)} {filtro_cruces}",
+        ]
+
+    def _conexion(self):
+        # Una base en memoria (solo con las vistas) por hilo y por proceso: las conexiones
+        # de DuckDB no se comparten entre hilos ni sobreviven a un fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            con = duckdb.connect()
+            for vista in self._vistas():
+                con.execute(vista)
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return self._local.con
+
+    def _sql(self, sql, parametros=()):
+        return self._conexion().execute(sql, list(parametros)).df()
+
+    def categorias(self, columna):
+        """Categorías de una columna de texto de metaR en orden alfabético, como en codificar_meta."""
+        if columna not in self._categorias:
+            valores = self._sql(f"SELECT DISTINCT {columna} AS valor FROM meta WHERE {columna} IS NOT NULL")['valor']
+            self._categorias[columna] = pd.Index(sorted(valores), dtype=object)
+        return self._categorias[columna]
+
+    def resumen(self, ventana):
+        return self.consulta("resumen", ventana, lambda: self._resumen(ventana))
+
+    def _resumen(self, ventana):
+        condicion, parametros = condicion_ventana(ventana, "Fecha")
+        sumas = ", ".join(f"CAST(coalesce(sum({c}), 0) AS BIGINT) AS {c}" for c in METRICAS_ARQUETIPO[2:])
+        filas = self._sql(f"""
+            SELECT Arquetipo, count(*) AS Apariciones, count(Standing) AS Jugadores, {sumas}
+            FROM meta WHERE {condicion} AND Arquetipo IS NOT NULL
+            GROUP BY Arquetipo ORDER BY min((Fecha, archivo, fila))""", parametros)
+        n_torneos = self._sql(f"SELECT count(DISTINCT Fecha) AS n FROM meta WHERE {condicion}", parametros)['n'].iloc[0]
+        categorias = self.categorias('Arquetipo')
+        return resumen_desde_codigos(categorias.get_indexer(filas['Arquetipo']),
+                                     filas[METRICAS_ARQUETIPO].to_numpy(), categorias, int(n_torneos))
+
+    def conteos_mensuales(self, ventana):
+        return self.consulta("conteos_mensuales", ventana, lambda: self._conteos_mensuales(ventana))
+
+    def _conteos_mensuales(self, ventana):
+        condicion, parametros = condicion_ventana(ventana, "Fecha")
+        filas = self._sql(f"""
+            SELECT date_trunc('month', Fecha) AS Mes, Arquetipo, count(*) AS n
+            FROM meta WHERE {condicion} AND Arquetipo IS NOT NULL GROUP BY ALL""", parametros)
+        extremos = self._sql(f"SELECT min(Fecha) AS minima, max(Fecha) AS maxima FROM meta WHERE {condicion}", parametros)
+        filas['Mes'] = filas['Mes'].astype('datetime64[ns]')
+        filas['Arquetipo'] = como_categorico(filas['Arquetipo'], self.categorias('Arquetipo'))
+        # El mismo groupby + unstack que sobre las filas: mismo orden de meses y de columnas
+        conteos = filas.groupby(['Mes', 'Arquetipo'], observed=True)['n'].sum().unstack(fill_value=0)
+        return ConteosMensuales(conteos, extremos['minima'].iloc[0], extremos['maxima'].iloc[0])
+
+    def nombres_cruces(self):
+        """Diccionario de mazos de los cruces en orden alfabético, como en codificar_cruces."""
+        if 'cruces' not in self._categorias:
+            valores = self._sql("""
+                SELECT mazo1 AS mazo FROM cruces WHERE mazo1 IS NOT NULL
+                UNION SELECT mazo2 FROM cruces WHERE mazo2 IS NOT NULL""")['mazo']
+            self._categorias['cruces'] = pd.Index(sorted(valores), dtype=object)
+        return self._categorias['cruces']
+
+    def matriz(self, ventana):
+        return self.consulta("matriz", ventana, lambda: self._matriz(ventana))
+
+    def _matriz(self, ventana):
+        condicion, parametros = condicion_ventana(ventana, "fecha")
+        # Cada cruce como dos filas dirigidas, como celdas_cruces: sin resultado no suma
+        # partidas y sin rival solo cuenta para las partidas del mazo
+        celdas = self._sql(f"""
+            WITH ventana AS (SELECT * FROM cruces WHERE {condicion}),
+            dirigidas AS (
+                SELECT mazo1 AS mazo, mazo2 AS rival, coalesce(v1, 0) AS victorias, coalesce(v1 + v2, 0) AS partidas
+                FROM ventana
+                UNION ALL
+                SELECT mazo2, mazo1, coalesce(v2, 0), coalesce(v1 + v2, 0) FROM ventana
+            )
+            SELECT mazo, rival, sum(victorias) AS victorias, sum(partidas) AS partidas, count(*) AS cruces
+            FROM dirigidas WHERE mazo IS NOT NULL GROUP BY ALL""", parametros)
+        n_torneos = self._sql(f"SELECT count(DISTINCT fecha) AS n FROM cruces WHERE {condicion}", parametros)['n'].iloc[0]
+
+        nombres = self.nombres_cruces()
+        d = len(nombres)
+        mazo = nombres.get_indexer(celdas['mazo'])
+        rival = nombres.get_indexer(celdas['rival'])
+        rival = np.where(rival >= 0, rival, d)
+        victorias, partidas, cruces = (np.zeros((d, d + 1)) for _ in range(3))
+        victorias[mazo, rival] = celdas['victorias'].to_numpy()
+        partidas[mazo, rival] = celdas['partidas'].to_numpy()
+        cruces[mazo, rival] = celdas['cruces'].to_numpy()
+        return MatrizCruces(np.asarray(nombres, dtype=object), victorias[:, :d], partidas[:, :d],
+                            cruces[:, :d] > 0, partidas.sum(axis=1), int(n_torneos))
+
+    def liga(self, mes):
+        if mes == 'Acumulada':
+            return self.consulta("liga", mes, self._acumulada)
+        return self.consulta("liga", mes, lambda: self._filas("EsLiga AND Mes = ?", [mes]))
+
+    def _acumulada(self):
+        avanzar(10, "Consultando la liga")
+        # Puntos del mes por jugador: las 4 mejores fechas (Wins * 3 + Draws) más una por asistencia
+        puntos = self._sql("""
+            WITH liga AS (
+                SELECT Mes, Jugador, Fecha, coalesce(Wins * 3 + Draws, 0) AS puntos, Standing, "%VPO", "%JG", "%JGO",
+                       row_number() OVER (PARTITION BY Mes, Jugador ORDER BY coalesce(Wins * 3 + Draws, 0) DESC) AS orden
+                FROM meta WHERE EsLiga AND Mes IS NOT NULL AND Jugador IS NOT NULL
+            )
+            SELECT Mes, Jugador,
+                   sum(puntos) FILTER (WHERE orden <= 4) + count(DISTINCT Fecha) AS Puntos_M,
+                   count(*) FILTER (WHERE Standing = 1) AS Torneos_Ganados_M,
+                   fsum("%VPO") / count("%VPO") AS VPO_M,
+                   fsum("%JG") / count("%JG") AS JG_M,
+                   fsum("%JGO") / count("%JGO") AS JGO_M,
+                   count(DISTINCT Fecha) AS Asistencia_M
+            FROM liga GROUP BY ALL""")
+        if puntos.empty:
+            return AcumuladaLiga([], {}, None)
+        meses = self._sql("""
+            SELECT Mes, min(Fecha) AS primera, count(DISTINCT CAST(Fecha AS DATE)) AS fechas_jugadas
+            FROM meta WHERE EsLiga AND Mes IS NOT NULL GROUP BY Mes ORDER BY max(Fecha)""")
+        stats_global = self._sql("""
+            SELECT Jugador, count(DISTINCT Fecha) AS Asistencia_Total,
+                   count(*) FILTER (WHERE Standing = 1) AS Torneos_Ganados,
+                   fsum("%VPO") / count("%VPO") AS VPO_Acum,
+                   fsum("%JG") / count("%JG") AS JG_Acum,
+                   fsum("%JGO") / count("%JGO") AS JGO_Acum
+            FROM meta WHERE EsLiga AND Jugador IS NOT NULL GROUP BY Jugador""")
+
+        # Jugadores como en las tablas en memoria: categóricos de todo metaR, en orden de nombre
+        jugadores = self.categorias('Jugador')
+        puntos['Jugador'] = como_categorico(puntos['Jugador'], jugadores)
+        puntos = puntos.sort_values('Jugador').set_index('Jugador')
+        stats_global['Jugador'] = como_categorico(stats_global['Jugador'], jugadores)
+        stats_global = stats_global.sort_values('Jugador').set_index('Jugador')
+
+        columnas = ['Puntos_M', 'Torneos_Ganados_M', 'VPO_M', 'JG_M', 'JGO_M', 'Asistencia_M']
+        standings = {
+            mes: standings_desde_desempate(puntos.loc[puntos['Mes'] == mes, columnas],
+                                           fechas_jugadas >= contar_martes_del_mes(primera))
+            for mes, primera, fechas_jugadas in meses[['Mes', 'primera', 'fechas_jugadas']].itertuples(index=False)
+        }
+        return AcumuladaLiga(meses['Mes'].tolist(), standings, stats_global)
+
+    def filas(self, ventana):
+        condicion, parametros = condicion_ventana(ventana, "Fecha")
+        return self.consulta("filas", ventana, lambda: self._filas(condicion, parametros))
+
+    def _filas(self, condicion, parametros):
+        filas = self._sql(f"""
+            SELECT * EXCLUDE (EsLiga, archivo, fila) FROM meta WHERE {condicion}
+            ORDER BY Fecha, archivo, fila""", parametros)
+        filas = codificar_meta(filas)
+        for columna in filas.select_dtypes('category'):
+            filas[columna] = filas[columna].cat.set_categories(self.categorias(columna))
+        return filas
+
+
+MOTORES = {"pandas": MotorPandas, "duckdb": MotorDuckDB}
+if MOTOR_CONSULTAS not in MOTORES:
+    raise ValueError(f"METAGAME_MOTOR debe ser uno de {', '.join(MOTORES)}, no {MOTOR_CONSULTAS!r}")
+if MOTOR_CONSULTAS == "duckdb" and duckdb is None:
+    print("  ✗ METAGAME_MOTOR=duckdb pero duckdb no está instalado; se usa pandas")
+    MOTOR_CONSULTAS = "pandas"
+
+
+def motor_consultas(datos):
+    """Motor de consultas de una versión de datos (uno por DatosVersion, creado al pedirlo)."""
+    if datos.motor is None:
+        if MOTOR_CONSULTAS == "duckdb":
+            datos.motor = MotorDuckDB(datos, *almacen.rutas)
+        else:
+            datos.motor = MotorPandas(datos)
+    return datos.motor
+
+
+# ========== MÉTRICAS ==========
+# (tipo, ayuda, límites de los buckets) de cada métrica que se expone en /metrics
+DEFINICION_METRICAS = {
+    "metagame_callback_segundos": (
+        "histogram", "Duración de los requests de callbacks de Dash, por tab",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    ),
+    "metagame_render_segundos": (
+        "histogram", "Duración de update_tab_content (la update_* de la tab) dentro del callback",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    ),
+    "metagame_respuesta_bytes": (
+        "histogram", "Tamaño del cuerpo de las respuestas de callbacks, por tab",
+        (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+    ),
+    "metagame_cache_respuestas_total": ("counter", "Consultas a la caché de respuestas, por tab y resultado", None),
+    "metagame_cache_agregados_total": ("counter", "Consultas a la caché de agregados, por tab y resultado", None),
+}
+
+# Archivo SQLite donde cada worker publica sus métricas para que /metrics sume las de
+# todos (cualquier worker puede atender el scrape); vacío deja solo las del proceso
+RUTA_METRICAS = os.environ.get(
+    "METAGAME_METRICAS", os.path.join(tempfile.gettempdir(), "metagame_metricas.sqlite")
+)
+INTERVALO_METRICAS = float(os.environ.get("METAGAME_METRICAS_SEGUNDOS", "5"))
+
+
+def etiquetas_texto(etiquetas):
+    # JSON escapa comillas, barras y saltos de línea igual que el formato de Prometheus
+    return ",".join(f"{k}={json.dumps(str(v), ensure_ascii=False)}" for k, v in sorted(etiquetas.items()))
+
+
+class Metricas:
+    """
+    Contadores e histogramas por etiqueta en memoria del proceso. Un hilo por worker
+    publica su instantánea en SQLite cada INTERVALO_METRICAS segundos si cambió
+    (fuera del camino de los requests); /metrics
+    suma las de todos los procesos (también las de workers ya reciclados, así los
+    contadores nunca bajan) y las devuelve en el formato de texto de Prometheus.
+    """
+
+    def __init__(self, ruta, intervalo=INTERVALO_METRICAS):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._valores = {}
+        self._pendiente = False
+        self._local = threading.local()
+        self._proceso = None
+        self._pid_hilo = None
+
+    def incrementar(self, nombre, etiquetas, valor=1):
+        clave = etiquetas_texto(etiquetas)
+        with self._lock:
+            por_etiqueta = self._valores.setdefault(nombre, {})
+            por_etiqueta[clave] = por_etiqueta.get(clave, 0) + valor
+            self._pendiente = True
+
+    def observar(self, nombre, etiquetas, valor):
+        limites = DEFINICION_METRICAS[nombre][2]
+        clave = etiquetas_texto(etiquetas)
+        with self._lock:
+            por_etiqueta = self._valores.setdefault(nombre, {})
+            # Cuentas por bucket (no acumuladas), la suma y el total
+            cuentas = por_etiqueta.setdefault(clave, [0] * (len(limites) + 3))
+            cuentas[bisect.bisect_left(limites, valor)] += 1
+            cuentas[-2] += valor
+            cuentas[-1] += 1
+            self._pendiente = True
+
+    def instantanea(self):
+        with self._lock:
+            self._pendiente = False
+            return json.dumps(self._valores)
+
+    def _id_proceso(self):
+        # pid y hora de arranque: un worker nuevo que reusa el pid de uno reciclado no pisa su fila
+        if self._proceso is None or self._proceso[0] != os.getpid():
+            self._proceso = (os.getpid(), f"{os.getpid()}-{time.time_ns()}")
+        return self._proceso[1]
+
+    def _conexion(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS metricas (proceso TEXT PRIMARY KEY, valores TEXT NOT NULL)")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return self._local.con
+
+    def iniciar_publicacion(self):
+        """Arranca el hilo que publica las métricas de este proceso (una vez por worker)."""
+        if not self.ruta or self._pid_hilo == os.getpid():
+            return
+        with self._lock:
+            if self._pid_hilo == os.getpid():
+                return
+            self._pid_hilo = os.getpid()
+        threading.Thread(target=self._publicar_periodicamente, name="metricas", daemon=True).start()
+
+    def _publicar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo)
+            if self._pendiente:
+                self.publicar()
+
+    def publicar(self):
+        try:
+            self._conexion().execute("INSERT OR REPLACE INTO metricas (proceso, valores) VALUES (?, ?)",
+                                     (self._id_proceso(), self.instantanea()))
+        except sqlite3.Error as e:
+            print(f"  ✗ Error al publicar métricas: {e}")
+
+    def _todas(self):
+        if not self.ruta:
+            return [json.loads(self.instantanea())]
+        self.publicar()
+        try:
+            filas = self._conexion().execute("SELECT valores FROM metricas").fetchall()
+        except sqlite3.Error:
+            return [json.loads(self.instantanea())]
+        return [json.loads(valores) for valores, in filas]
+
+    def texto(self):
+        """Las métricas de todos los procesos sumadas, en formato de texto de Prometheus."""
+        suma = {}
+        for valores in self._todas():
+            for nombre, por_etiqueta in valores.items():
+                destino = suma.setdefault(nombre, {})
+                for clave, valor in por_etiqueta.items():
+                    if isinstance(valor, list):
+                        previo = destino.get(clave, [0] * len(valor))
+                        destino[clave] = [a + b for a, b in zip(previo, valor)]
+                    else:
+                        destino[clave] = destino.get(clave, 0) + valor
+
+        lineas = []
+        for nombre, (tipo, ayuda, limites) in DEFINICION_METRICAS.items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for clave, valor in sorted(suma.get(nombre, {}).items()):
+                if tipo != "histogram":
+                    lineas.append(f"{nombre}{{{clave}}} {valor}")
+                    continue
+                separador = "," if clave else ""
+                for limite, acumulado in zip(list(limites) + ["+Inf"], np.cumsum(valor[:-2])):
+                    lineas.append(f'{nombre}_bucket{{{clave}{separador}le="{limite}"}} {acumulado}')
+                lineas.append(f"{nombre}_sum{{{clave}}} {valor[-2]}")
+                lineas.append(f"{nombre}_count{{{clave}}} {valor[-1]}")
+        return "\n".join(lineas) + "\n"
+
+
+metricas = Metricas(RUTA_METRICAS)
+
+
+def tab_callback(cuerpo):
+    """Tab cuyo contenido escribe el request de callback ('tabla' para la paginación), o None."""
+    # Con varias salidas Dash las une como "..contenido-<tab>.children...<otra>.<prop>.."
+    salida = cuerpo.get("output", "").lstrip(".")
+    if salida.startswith("contenido-"):
+        tab = salida[len("contenido-"):].split(".", 1)[0]
+        return tab if tab in TABS else None
+    return "tabla" if "tabla-cuerpo" in salida else None
+
+
+def medir_render(funcion, *args, **kwargs):
+    """Llama a `funcion` y anota su duración para la métrica de render y Server-Timing."""
+    inicio = time.perf_counter()
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        if flask.has_request_context():
+            flask.g.render_segundos = time.perf_counter() - inicio
+
+
+@server.before_request
+def _iniciar_medicion():
+    if flask.request.method != "POST" or flask.request.path != RUTA_CALLBACKS:
+        return None
+    flask.g.inicio_callback = time.perf_counter()
+    flask.g.tab_callback = tab_callback(flask.request.get_json(silent=True) or {}) or "otro"
+
+
+@server.after_request
+def _registrar_medicion(response):
+    inicio = flask.g.pop("inicio_callback", None)
+    if inicio is None:
+        return response
+    total = time.perf_counter() - inicio
+    etiquetas = {"tab": flask.g.tab_callback}
+    metricas.observar("metagame_callback_segundos", etiquetas, total)
+    tiempos = [f"total;dur={total * 1000:.1f}"]
+
+    render = flask.g.pop("render_segundos", None)
+    if render is not None:
+        metricas.observar("metagame_render_segundos", etiquetas, render)
+        tiempos.append(f"render;dur={render * 1000:.1f}")
+    if flask.g.pop("respuesta_cacheada", False):
+        tiempos.append('cache;desc="respuesta"')
+    if not response.direct_passthrough:
+        metricas.observar("metagame_respuesta_bytes", etiquetas, response.calculate_content_length() or 0)
+
+    response.headers["Server-Timing"] = ", ".join(tiempos)
+    metricas.iniciar_publicacion()
+    return response
+
+
+@server.route("/metrics")
+def _exponer_metricas():
+    return flask.Response(metricas.texto(), mimetype="text/plain; version=0.0.4")
+
+
+# ========== CACHÉ DE RESPUESTAS (COMPARTIDA ENTRE WORKERS) ==========
+# Archivo SQLite compartido por todos los workers; vacío desactiva la caché
+RUTA_CACHE_RESPUESTAS = os.environ.get(
+    "METAGAME_CACHE_RESPUESTAS", os.path.join(tempfile.gettempdir(), "metagame_respuestas.sqlite")
+)
+RUTA_CALLBACKS = app.config.routes_pathname_prefix + "_dash-update-component"
+
+
+class CacheRespuestas:
+    """
+    Respuestas ya serializadas de los callbacks de tabs, guardadas en SQLite (modo WAL)
+    para que las compartan todos los workers de gunicorn. Un acierto se devuelve como
+    bytes directamente desde Flask, sin pasar por pandas, Plotly ni la serialización
+    de Dash. Al cambiar la versión de datos se borran las respuestas viejas.
+    """
+
+    def __init__(self, ruta, max_entradas=2000):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self._local = threading.local()
+        self._inserciones = 0
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (las conexiones no sobreviven a un fork)
+        if getattr(self._local, 'pid', None) != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas ("
+                "clave TEXT PRIMARY KEY, version TEXT NOT NULL, cuerpo BLOB NOT NULL, creado REAL NOT NULL)"
+            )
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return self._local.con
+
+    def obtener(self, clave):
+        try:
+            fila = self._conexion().execute("SELECT cuerpo FROM respuestas WHERE clave = ?", (clave,)).fetchone()
+        except sqlite3.Error:
+            return None
+        # Aciertos y fallos se cuentan por tab en /metrics (metagame_cache_respuestas_total)
+        return None if fila is None else fila[0]
+
+    def guardar(self, clave, version, cuerpo):
+        try:
+            con = self._conexion()
+            con.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, version, cuerpo, creado) VALUES (?, ?, ?, ?)",
+                (clave, version, cuerpo, time.time())
+            )
+            self._inserciones += 1
+            if self._inserciones % 100 == 0:
+                self.purgar(version)
+        except sqlite3.Error as e:
+            print(f"  ✗ Error al guardar en la caché de respuestas: {e}")
+
+    def purgar(self, version_vigente):
+        """Borra las respuestas de otras versiones y las más antiguas sobre el máximo."""
+        con = self._conexion()
+        con.execute("DELETE FROM respuestas WHERE version != ?", (version_vigente,))
+        con.execute(
+            "DELETE FROM respuestas WHERE clave NOT IN "
+            "(SELECT clave FROM respuestas ORDER BY creado DESC LIMIT ?)",
+            (self.max_entradas,)
+        )
+
+
+cache_respuestas = CacheRespuestas(RUTA_CACHE_RESPUESTAS) if RUTA_CACHE_RESPUESTAS else None
+
+
+def clave_respuesta(cuerpo, version):
+    """
+    Clave canónica de un request de callback de tab: versión de datos, tab y sus
+    parámetros (el Store que escribe el enrutador) serializados con claves ordenadas.
+    Devuelve None para cualquier otro callback.
+    """
+    tab = tab_callback(cuerpo)
+    entradas = cuerpo.get("inputs") or [{}]
+    parametros = entradas[0].get("value")
+    if tab not in TABS or parametros is None:
+        return None
+    return clave_vista(version, tab, parametros)
+
+
+def clave_vista(version, tab, parametros):
+    return f"{version}|{tab}|{json.dumps(parametros, sort_keys=True, separators=(',', ':'))}"
+
+
+def respuesta_tab(tab, parametros):
+    """
+    Cuerpo de la respuesta de Dash al callback de la tab con esos parámetros, byte a byte
+    el que guardaría la caché de respuestas (precalentar.py la llena sin pasar por Flask).
+    """
+    salidas = {f"contenido-{tab}": {"children": update_tab_content(tab, **parametros)}}
+    if tab in TABS_SEGUNDO_PLANO:
+        salidas[f"renderizado-{tab}"] = {"data": parametros}
+    return to_json_plotly({"multi": True, "response": salidas}).encode()
+
+
+@server.before_request
+def _respuesta_cacheada():
+    if cache_respuestas is None or flask.request.method != "POST" or flask.request.path != RUTA_CALLBACKS:
+        return None
+    if gestor_segundo_plano is not None and "cacheKey" in flask.request.args:
+        # Consulta de un trabajo en segundo plano: el cuerpo ya no trae los parámetros, la
+        # clave se anotó al lanzarlo y la respuesta se guarda cuando trae el resultado
+        flask.g.clave_respuesta = gestor_segundo_plano.handle.get(clave_trabajo(flask.request.args["cacheKey"]))
+        return None
+    # La versión se toma antes de que corra el callback: la respuesta guardada nunca
+    # puede ser más vieja que la versión de su clave
+    clave = clave_respuesta(flask.request.get_json(silent=True) or {}, almacen.actual.version)
+    if clave is None:
+        return None
+    cuerpo = cache_respuestas.obtener(clave)
+    metricas.incrementar("metagame_cache_respuestas_total",
+                         {"tab": flask.g.get("tab_callback", "otro"), "resultado": "fallo" if cuerpo is None else "acierto"})
+    if cuerpo is not None:
+        flask.g.respuesta_cacheada = True
+        return flask.Response(cuerpo, mimetype="application/json")
+    flask.g.clave_respuesta = clave
+
+
+@server.after_request
+def _guardar_respuesta(response):
+    clave = flask.g.pop("clave_respuesta", None)
+    if clave is None or response.status_code != 200 or response.direct_passthrough:
+        return response
+    if flask.g.get("tab_callback") in TABS_SEGUNDO_PLANO:
+        # Una tab en segundo plano responde primero el trabajo lanzado y después su avance:
+        # solo se guarda la respuesta que trae el resultado
+        datos = json.loads(response.get_data())
+        if "cacheKey" in datos:
+            gestor_segundo_plano.handle.set(clave_trabajo(datos["cacheKey"]), clave, expire=EXPIRA_SEGUNDO_PLANO)
+        if "response" not in datos:
+            return response
+    cache_respuestas.guardar(clave, clave.split("|", 1)[0], response.get_data())
+    return response
+
+
+# ========== CONFIGURACIÓN DE TABS ==========
+TABS = ["metagame", "top_distribution", "evolution", "conversion_table",
+        "winrate", "winrate_juego", "heatmap", "liga"]
+
+# Tabs cuyo render puede ocupar un worker por segundos (la liga Acumulada, heatmaps con
+# muchos mazos, la evolución de años de torneos): si hay gestor corren en segundo plano
+TABS_SEGUNDO_PLANO = [t for t in ["evolution", "heatmap", "liga"] if gestor_segundo_plano is not None]
+
+# Por tab: visibilidad de (filtro-metagame, filtro-winrate, filtro-heatmap, filtro-liga)
+# y estado deshabilitado de (evento, fechas, fecha única, color, mínimo de partidas,
+# top mazos, top mazos evolución, media móvil)
+VISIBILIDAD_FILTROS = {
+    "metagame":         (True, False, False, False, False, False, False, True, True, False, True, True),
+    "conversion_table": (False, False, False, False, False, True, True, False, True, True, True, True),
+    "winrate":          (False, False, False, False, False, True, True, True, False, True, True, True),
+    "winrate_juego":    (False, True, False, False, False, False, True, False, True, True, True, True),
+    "heatmap":          (False, False, True, False, False, False, True, True, False, True, True, True),
+    "top_distribution": (False, False, False, False, False, True, True, False, True, True, True, True),
+    "evolution":        (False, False, False, False, False, True, True, True, True, True, False, False),
+    "liga":             (False, False, False, True, True, True, True, True, True, True, True, True),
+}
+
+# Controles de la barra lateral: (nombre del parámetro en update_tab_content, id, propiedad)
+CONTROLES = [
+    ("filtro_metagame", "filtro-metagame-radio", "value"),
+    ("filtro_winrate", "filtro-winrate-radio", "value"),
+    ("filtro_heatmap", "filtro-heatmap-radio", "value"),
+    ("evento", "evento-dropdown", "value"),
+    ("start_date", "fechas-picker", "start_date"),
+    ("end_date", "fechas-picker", "end_date"),
+    ("fecha_unica", "fecha-unica-dropdown", "value"),
+    ("color_opcion", "color-opcion-dropdown", "value"),
+    ("n_top", "top-mazos-slider", "value"),
+    ("n_top_evolution", "top-mazos-slider2", "value"),
+    ("meses_media", "media-movil-slider", "value"),
+    ("min_juegos", "min-juegos-slider", "value"),
+    ("mes_liga", "selector-mes-liga", "value"),
+]
+
+# Parámetros que usa cada tab. Los filtros (filtro_*) agregan además los parámetros
+# de fecha según la opción elegida (PARAMETROS_FILTRO)
+PARAMETROS_TAB = {
+    "metagame": ["filtro_metagame", "n_top"],
+    "top_distribution": ["evento", "color_opcion"],
+    "evolution": ["evento", "n_top_evolution", "meses_media"],
+    "conversion_table": ["evento", "color_opcion"],
+    "winrate": ["filtro_winrate", "min_juegos"],
+    "winrate_juego": ["filtro_winrate", "color_opcion"],
+    "heatmap": ["filtro_heatmap", "min_juegos"],
+    "liga": ["mes_liga"],
+}
+PARAMETROS_FILTRO = {
+    "evento": ["evento"],
+    "fechas": ["start_date", "end_date"],
+    "fecha_puntual": ["fecha_unica"],
+}
+
+
+def parametros_tab(tab, valores):
+    """Los parámetros que el enrutador escribe en el Store de la tab para esos valores de los controles."""
+    claves = list(PARAMETROS_TAB[tab])
+    for c in PARAMETROS_TAB[tab]:
+        if c.startswith("filtro_"):
+            claves += PARAMETROS_FILTRO.get(valores[c], [])
+    return {c: valores[c] for c in claves}
+
+
+# ========== UI ==========
+def serve_layout():
+    """
+    Dash evalúa el layout en cada carga de página: las opciones de los dropdowns
+    y el rango de fechas salen siempre de la versión de datos vigente.
+    """
+    datos = almacen.actual
+    return dbc.Container([
+        html.H1("Metagame Santiago Pauper MTG", className="mt-3 mb-4"),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        dcc.Tabs(
+                            id="tabs",
+                            value="metagame",
+                            vertical=True,
+                            parent_style={
+                                'width': '250px',
+                                'min-width': '250px',
+                                'margin-right': '20px'
+                            },
+                            style={
+                                'height': '100%',
+                                'border-right': '1px solid #d6d6d6',
+                                'background': '#f8f9fa'
+                            },
+                            children=[
+                                dcc.Tab(
+                                    label="Metagame",
+                                    value="metagame",
+                                    style={
+                                        'padding': '12px 20px',
+                                        'font-size': '14px',
+                                        'text-align': 'left',
+                                        'margin-bottom': '8px'
+                                    },
+                                    selected_style={
+                                        'border-left': '4px solid #007bff',
+                                        'font-weight': 'bold',
+                                        'background-color': '#e9ecef'
+                                    }
+                                ),
+                                dcc.Tab(
+                                    label="Torneos ganados o podios",
+                                    value="top_distribution",
+                                    style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
+                                    selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
+                                ),
+                                dcc.Tab(
+                                    label="Presencia mensual",
+                                    value="evolution",
+                                    style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
+                                    selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
+                                ),
+                                dcc.Tab(
+                                    label="Tasa de Conversión",
+                                    value="conversion_table",
+                                    style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
+                                    selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
+                                ),
+                                dcc.Tab(
+                                    label="Winrate por mazo",
+                                    value="winrate",
+                                    style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
+                                    selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
+                                ),
+                                dcc.Tab(
+                                    label="Winrate vs Porcentaje de Juego",
+                                    value="winrate_juego",
+                                    style={'margin-bottom': '5px', 'padding': '10px', 'font-size': '14px'},
+                                    selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
+                                ),
+                                dcc.Tab(
+                                    label="Cruces entre mazos",
+                                    value="heatmap",
+                                    style={'padding': '10px', 'font-size': '14px'},
+                                    selected_style={'border-bottom': '3px solid #007bff', 'font-weight': 'bold'}
+                                ),
+                                dcc.Tab(
+                                    label="Liga Mensual",
+                                    value="liga",
+                                    style={'margin-top': '10px', 'padding': '10px', 'font-size': '14px', 'background-color': '#e3f2fd'},
+                                    selected_style={'border-left': '4px solid #007bff', 'font-weight': 'bold', 'background-color': '#bbdefb'}
+                                ),
+                            ]
+                        ),
+
+                        # Filtros condicionales
+                        html.Div(id="filtro-metagame", children=[
+                            dbc.RadioItems(
+                                id="filtro-metagame-radio",
+                                options=[
+                                    {"label": "Por evento", "value": "evento"},
+                                    {"label": "Por rango de fechas", "value": "fechas"},
+                                    {"label": "Torneo específico", "value": "fecha_puntual"}
+                                ],
+                                value="evento"
+                            )
+                        ], style={'display': 'none'}),
+
+                        html.Div(id="filtro-winrate", children=[
+                            dbc.RadioItems(
+                                id="filtro-winrate-radio",
+                                options=[
+                                    {"label": "Por evento", "value": "evento"},
+                                    {"label": "Por rango de fechas", "value": "fechas"}
+                                ],
+                                value="evento"
+                            )
+                        ], style={'display': 'none'}),
+
+                        html.Div(id="filtro-heatmap", children=[
+                            dbc.RadioItems(
+                                id="filtro-heatmap-radio",
+                                options=[
+                                    {"label": "Por evento", "value": "evento"},
+                                    {"label": "Por rango de fechas", "value": "fechas"}
+                                ],
+                                value="evento"
+                            )
+                        ], style={'display': 'none'}),
+
+                        html.Div(id="filtro-liga", children=[
+                            html.Label("Selecciona el mes de Liga:", className="fw-bold"),
+                            dcc.Dropdown(
+                                id='selector-mes-liga',
+                                options=[{'label': str(m), 'value': m} for m in datos.meses_disponibles] + [{'label': 'Tabla Acumulada', 'value': 'Acumulada'}],
+                                value=datos.meses_disponibles[0] if datos.meses_disponibles else 'Acumulada',
+                                placeholder="Mes...",
+                                className="mb-3"
+                            )
+                        ], style={'display': 'none'}),
+
+                        # Selector de evento (compartido)
+                        dcc.Dropdown(
+                            id="evento-dropdown",
+                            options=[{"label": k, "value": k} for k in eventos.keys()],
+                            style={'font-size': '12px'},
+                            value=list(eventos.keys())[0],
+                            disabled=False,
+                            className="mb-3"
+                        ),
+
+                        # Selector de rango de fechas
+                        dcc.DatePickerRange(
+                            id="fechas-picker",
+                            start_date=datos.meta_fecha_min,
+                            end_date=datos.meta_fecha_max,
+                            display_format='YYYY-MM-DD',
+                            disabled=True,
+                            className="mb-3"
+                        ),
+
+                        # Selector de fecha puntual
                         dcc.Dropdown(
-                            id='selector-mes-liga',
-                            options=[{'label': str(m), 'value': m} for m in meses_disponibles] + [{'label': 'Tabla Acumulada', 'value': 'Acumulada'}],
-                            value=meses_disponibles[0] if meses_disponibles else 'Acumulada',
-                            placeholder="Mes...",
+                            id="fecha-unica-dropdown",
+                            options=[{"label": str(date.date()), "value": date}
+                                    for date in datos.fechas_unicas],
+                            disabled=True,
                             className="mb-3"
+                        ),
+
+                        # Selector de color para Winrate vs Porcentaje
+                        dcc.Dropdown(
+                            id="color-opcion-dropdown",
+                            options=[
+                                {"label": "Torneos ganados", "value": "Top1"},
+                                {"label": "Presencia en podio", "value": "Top3"}
+                            ],
+                            value="Top1",
+                            disabled=True,
+                            className="mb-3"
+                        ),
+
+                        html.Label("Top mazos más jugados:"),
+                        dcc.Slider(
+                            id='top-mazos-slider',
+                            min=5,
+                            max=20,
+                            step=1,
+                            value=10,
+                            marks={i: str(i) for i in range(5, 21, 5)}
+                        ),
+
+                        html.Label("Cantidad mazos más jugados"),
+                        dcc.Slider(
+                            id='top-mazos-slider2',
+                            min=3,
+                            max=8,
+                            step=1,
+                            value=5,
+                            marks={i: str(i) for i in range(3, 9)}
+                        ),
+
+                        html.Label("Media móvil (meses):"),
+                        dcc.Slider(
+                            id='media-movil-slider',
+                            min=1,
+                            max=6,
+                            step=1,
+                            value=1,
+                            marks={i: str(i) for i in range(1, 7)}
+                        ),
+
+                        html.Label("Minimo de partidas:"),
+                        dcc.Slider(
+                            id="min-juegos-slider",
+                            min=20,
+                            max=50,
+                            step=1,
+                            value=30,
+                            marks={i: str(i) for i in range(20, 51, 5)},
+                            tooltip={"placement": "bottom", "always_visible": True},
+                            className="mb-4"
                         )
-                    ], style={'display': 'none'}),
-
-                    # Selector de evento (compartido)
-                    dcc.Dropdown(
-                        id="evento-dropdown",
-                        options=[{"label": k, "value": k} for k in eventos.keys()],
-                        style={'font-size': '12px'},
-                        value=list(eventos.keys())[0],
-                        disabled=False,
-                        className="mb-3"
-                    ),
-
-                    # Selector de rango de fechas
-                    dcc.DatePickerRange(
-                        id="fechas-picker",
-                        start_date=meta_fecha_min,
-                        end_date=meta_fecha_max,
-                        display_format='YYYY-MM-DD',
-                        disabled=True,
-                        className="mb-3"
-                    ),
-
-                    # Selector de fecha puntual
-                    dcc.Dropdown(
-                        id="fecha-unica-dropdown",
-                        options=[{"label": str(date.date()), "value": date}
-                                for date in fechas_unicas],
-                        disabled=True,
-                        className="mb-3"
-                    ),
-
-                    # Selector de color para Winrate vs Porcentaje
-                    dcc.Dropdown(
-                        id="color-opcion-dropdown",
-                        options=[
-                            {"label": "Torneos ganados", "value": "Top1"},
-                            {"label": "Presencia en podio", "value": "Top3"}
-                        ],
-                        value="Top1",
-                        disabled=True,
-                        className="mb-3"
-                    ),
-
-                    html.Label("Top mazos más jugados:"),
-                    dcc.Slider(
-                        id='top-mazos-slider',
-                        min=5,
-                        max=20,
-                        step=1,
-                        value=10,
-                        marks={i: str(i) for i in range(5, 21, 5)}
-                    ),
-
-                    html.Label("Cantidad mazos más jugados"),
-                    dcc.Slider(
-                        id='top-mazos-slider2',
-                        min=3,
-                        max=8,
-                        step=1,
-                        value=5,
-                        marks={i: str(i) for i in range(3, 9)}
-                    ),
-
-                    html.Label("Minimo de partidas:"),
-                    dcc.Slider(
-                        id="min-juegos-slider",
-                        min=20,
-                        max=50,
-                        step=1,
-                        value=30,
-                        marks={i: str(i) for i in range(20, 51, 5)},
-                        tooltip={"placement": "bottom", "always_visible": True},
-                        className="mb-4"
-                    )
+                    ])
                 ])
-            ])
-        ], md=3),
-
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    dcc.Loading(
-                        id="loading-content",
-                        type="circle",
-                        color="#007bff",
-                        children=html.Div(id="tab-content")
-                    )
-                ])
-            ], style={"height": "650px", "overflow-y": "auto"})
-        ], md=9)
-    ])
-], fluid=True)
+            ], md=3),
+
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        # Avance de las tabs en segundo plano; visible solo mientras corre su trabajo
+                        *[dbc.Progress(id=f"progreso-{t}", value=0, striped=True, animated=True,
+                                       className="mb-2", style={'display': 'none'})
+                          for t in TABS_SEGUNDO_PLANO],
+                        dcc.Loading(
+                            id="loading-content",
+                            type="circle",
+                            color="#007bff",
+                            children=html.Div(id="tab-content", children=[
+                                html.Div(id=f"contenido-{t}", style={} if t == "metagame" else {'display': 'none'})
+                                for t in TABS
+                            ])
+                        )
+                    ])
+                ], style={"height": "650px", "overflow-y": "auto"})
+            ], md=9)
+        ]),
+
+        # Parámetros vigentes de cada tab (los escribe el enrutador clientside)
+        *[dcc.Store(id=f"parametros-{t}") for t in TABS],
+        # Parámetros del último contenido terminado de cada tab en segundo plano
+        *[dcc.Store(id=f"renderizado-{t}") for t in TABS_SEGUNDO_PLANO]
+    ], fluid=True)
+
+
+app.layout = serve_layout
+
+# ========== CALLBACKS EN SEGUNDO PLANO ==========
+# Función de avance del trabajo en curso: solo la tiene el hilo que corre una tab en segundo plano
+_avance = threading.local()
+
+
+def avanzar(porcentaje, etapa):
+    """Informa el avance de la tab que corre en segundo plano; dentro de un request no hace nada."""
+    informar = getattr(_avance, 'informar', None)
+    if informar is not None:
+        informar((porcentaje, etapa))
+
+
+def registrar_callback_segundo_plano(tab):
+    """
+    Callback de una tab de TABS_SEGUNDO_PLANO como callback en segundo plano de Dash:
+    el worker solo lanza el trabajo (un proceso aparte) y responde las consultas del
+    navegador, que muestra el avance en la barra de la tab. Cambiar de tab lo cancela.
+    Además escribe en `renderizado-<tab>` los parámetros que terminó de dibujar.
+
+    La clave del trabajo sale del código de la función y sus argumentos; como los
+    parámetros de cada tab tienen claves distintas, no se confunden trabajos entre tabs.
+    """
+    @app.callback(
+        Output(f"contenido-{tab}", "children"),
+        Output(f"renderizado-{tab}", "data"),
+        Input(f"parametros-{tab}", "data"),
+        background=True,
+        progress=[Output(f"progreso-{tab}", "value"), Output(f"progreso-{tab}", "label")],
+        progress_default=[0, ""],
+        running=[(Output(f"progreso-{tab}", "style"), {}, {'display': 'none'})],
+        cancel=[Input("tabs", "value")],
+        prevent_initial_call=True
+    )
+    def render_tab_segundo_plano(informar, parametros):
+        if parametros is None:
+            raise PreventUpdate
+        _avance.informar = informar
+        avanzar(5, "Consultando datos")
+        return update_tab_content(tab, **parametros), parametros
+
+
+def clave_trabajo(cache_key):
+    """Clave en la caché del gestor que guarda la clave de respuesta de un trabajo lanzado."""
+    return f"{cache_key}-clave-respuesta"
+
+
+def _reiniciar_locks():
+    # Los trabajos nacen con fork desde un worker que tiene otros hilos (recarga,
+    # métricas): un lock tomado por uno de ellos en ese instante quedaría tomado
+    # para siempre en el proceso hijo
+    for objeto in (almacen, cache_agregados, metricas, motor_liga):
+        objeto._lock = threading.Lock()
+
+
+if gestor_segundo_plano is not None:
+    os.register_at_fork(after_in_child=_reiniciar_locks)
+
 
 # ========== CALLBACKS ==========
-@app.callback(
+# La visibilidad de filtros y contenidos se resuelve en el navegador, sin ir al servidor
+app.clientside_callback(
+    """
+    function(tab) {
+        const config = __VISIBILIDAD__;
+        const fila = config.filtros[tab];
+        const estilo = (visible) => ({display: visible ? 'block' : 'none'});
+        return [
+            ...fila.visibles.map(estilo),
+            ...fila.deshabilitados,
+            ...config.tabs.map((t) => estilo(t === tab))
+        ];
+    }
+    """.replace("__VISIBILIDAD__", json.dumps({
+        'filtros': {t: {'visibles': v[:4], 'deshabilitados': v[4:]} for t, v in VISIBILIDAD_FILTROS.items()},
+        'tabs': TABS
+    })),
     [Output("filtro-metagame", "style"),
      Output("filtro-winrate", "style"),
      Output("filtro-heatmap", "style"),
@@ -268,120 +1921,232 @@ app.layout = dbc.Container([
      Output("color-opcion-dropdown", "disabled"),
      Output("min-juegos-slider", "disabled"),
      Output("top-mazos-slider", "disabled"),
-     Output("top-mazos-slider2", "disabled")],
-    [Input("tabs", "value")]
+     Output("top-mazos-slider2", "disabled"),
+     Output("media-movil-slider", "disabled")] +
+    [Output(f"contenido-{t}", "style") for t in TABS],
+    Input("tabs", "value")
 )
-def update_filtros_visibilidad(tab):
-    if tab == "metagame":
-        return (
-            {"display": "block"}, {"display": "none"}, {"display": "none"}, {"display": "none"},
-            False, False, False, True, True, False, True
-        )
-    elif tab == "conversion_table":
-        return (
-            {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "none"},
-            False, True, True, False, True, True, True
-        )
-    elif tab == "winrate":
-        return (
-            {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "none"},
-            False, True, True, True, False, True, True
-        )
-    elif tab == "winrate_juego":
-        return (
-            {"display": "none"}, {"display": "block"}, {"display": "none"}, {"display": "none"},
-            False, False, True, False, True, True, True
-        )
-    elif tab == "heatmap":
-        return (
-            {"display": "none"}, {"display": "none"}, {"display": "block"}, {"display": "none"},
-            False, True, True, True, False, True, True
-        )
-    elif tab == "top_distribution":
-        return (
-            {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "none"},
-            False, True, True, False, True, True, True
-        )
-    elif tab == "evolution":
-        return (
-            {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "none"},
-            False, True, True, True, True, True, False
-        )
-    elif tab == "liga":
-        return (
-            {"display": "none"}, {"display": "none"}, {"display": "none"}, {"display": "block"},
-            True, True, True, True, True, True, True
-        )
 
-
-@app.callback(
-    Output("tab-content", "children"),
-    [Input("tabs", "value"),
-     Input("filtro-metagame-radio", "value"),
-     Input("filtro-winrate-radio", "value"),
-     Input("filtro-heatmap-radio", "value"),
-     Input("evento-dropdown", "value"),
-     Input("fechas-picker", "start_date"),
-     Input("fechas-picker", "end_date"),
-     Input("fecha-unica-dropdown", "value"),
-     Input("color-opcion-dropdown", "value"),
-     Input("top-mazos-slider", "value"),
-     Input("top-mazos-slider2", "value"),
-     Input("min-juegos-slider", "value"),
-     Input("selector-mes-liga", "value")]
+# Enrutador: de todos los controles arma solo los parámetros que usa la tab activa y
+# solo escribe su Store si cambiaron. Así, mover un control que la tab no usa (o que
+# solo usa otra tab) no dispara ningún callback en el servidor. Un trabajo en segundo
+# plano cancelado al cambiar de tab deja el contenido a medias: al volver a la tab, si
+# lo último terminado no corresponde a sus parámetros, se vuelven a escribir.
+app.clientside_callback(
+    """
+    function(tab, ...args) {
+        const config = __ENRUTADOR__;
+        const valores = {};
+        config.controles.forEach((nombre, i) => { valores[nombre] = args[i]; });
+        const anteriores = args.slice(config.controles.length, config.controles.length + config.tabs.length);
+        const renderizados = args.slice(config.controles.length + config.tabs.length);
+        const disparadores = window.dash_clientside.callback_context.triggered.map((t) => t.prop_id);
+
+        const claves = [...config.parametros[tab]];
+        claves.filter((c) => c.startsWith('filtro_'))
+              .forEach((c) => claves.push(...(config.por_filtro[valores[c]] || [])));
+        const nuevos = {};
+        claves.forEach((c) => { nuevos[c] = valores[c]; });
+
+        return config.tabs.map((t, i) => {
+            if (t !== tab) {
+                return window.dash_clientside.no_update;
+            }
+            const j = config.segundo_plano.indexOf(t);
+            const inconcluso = j >= 0 && disparadores.includes('tabs.value') &&
+                JSON.stringify(renderizados[j]) !== JSON.stringify(nuevos);
+            if (!inconcluso && JSON.stringify(anteriores[i]) === JSON.stringify(nuevos)) {
+                return window.dash_clientside.no_update;
+            }
+            return nuevos;
+        });
+    }
+    """.replace("__ENRUTADOR__", json.dumps({
+        'controles': [nombre for nombre, _, _ in CONTROLES],
+        'parametros': PARAMETROS_TAB,
+        'por_filtro': PARAMETROS_FILTRO,
+        'tabs': TABS,
+        'segundo_plano': TABS_SEGUNDO_PLANO
+    })),
+    [Output(f"parametros-{t}", "data") for t in TABS],
+    [Input("tabs", "value")] + [Input(id_control, prop) for _, id_control, prop in CONTROLES],
+    [State(f"parametros-{t}", "data") for t in TABS] + [State(f"renderizado-{t}", "data") for t in TABS_SEGUNDO_PLANO]
 )
+
+
+def registrar_callback_tab(tab):
+    """Un callback por tab: solo depende del Store con los parámetros de esa tab."""
+    if tab in TABS_SEGUNDO_PLANO:
+        return registrar_callback_segundo_plano(tab)
+
+    @app.callback(
+        Output(f"contenido-{tab}", "children"),
+        Input(f"parametros-{tab}", "data"),
+        prevent_initial_call=True
+    )
+    def render_tab(parametros):
+        if parametros is None:
+            raise PreventUpdate
+        return medir_render(update_tab_content, tab, **parametros)
+
+
+for _tab in TABS:
+    registrar_callback_tab(_tab)
+
+
 def update_tab_content(tab, filtro_metagame=None, filtro_winrate=None, filtro_heatmap=None,
                        evento=None, start_date=None, end_date=None, fecha_unica=None,
-                       color_opcion=None, n_top=None, n_top_evolution=None, min_juegos=None, mes_liga=None):
+                       color_opcion=None, n_top=None, n_top_evolution=None, meses_media=1, min_juegos=None,
+                       mes_liga=None):
+
+    # Una sola versión de los datos para toda la request, aunque haya una recarga en curso
+    datos = almacen.actual
+    motor = motor_consultas(datos)
 
     if tab == "metagame":
-        if filtro_metagame == "evento":
-            fecha_corte = eventos[evento]
-            df_filtrado = meta[meta['Fecha'] >= fecha_corte]
-        elif filtro_metagame == "fechas":
-            df_filtrado = meta[(meta['Fecha'] >= start_date) & (meta['Fecha'] <= end_date)]
-        else:
-            df_filtrado = meta[meta['Fecha'] == fecha_unica]
-        return update_metagame(df_filtrado, filtro_metagame, evento, start_date, end_date, fecha_unica, n_top)
+        ventana = normalizar_ventana(filtro_metagame, evento, start_date, end_date, fecha_unica)
+        # Solo la tabla de un torneo necesita las filas de jugadores
+        df = motor.filas(ventana) if filtro_metagame == "fecha_puntual" else motor.resumen(ventana)
+        return update_metagame(df, filtro_metagame, evento, start_date, end_date, fecha_unica,
+                               n_top, ventana=ventana, version=datos.version)
 
     elif tab == "conversion_table":
-        fecha_corte = eventos[evento]
-        df_filtrado = meta[meta['Fecha'] >= fecha_corte]
-        return update_conversion_table(df_filtrado, color_opcion)
+        ventana = normalizar_ventana("evento", evento)
+        return update_conversion_table(motor.resumen(ventana), color_opcion, ventana=ventana, version=datos.version)
 
     elif tab == "evolution":
-        fecha_corte = eventos[evento]
-        df_filtrado = meta[meta['Fecha'] >= fecha_corte]
-        return update_evolution(df_filtrado, n_top_evolution)
+        ventana = normalizar_ventana("evento", evento)
+        return update_evolution(motor.conteos_mensuales(ventana), n_top_evolution, ventana=ventana,
+                                version=datos.version, meses_media=meses_media)
 
     elif tab == "winrate":
-        if filtro_winrate == "evento":
-            fecha_corte = eventos[evento]
-            df_filtrado = meta[meta['Fecha'] >= fecha_corte]
-        else:
-            df_filtrado = meta[(meta['Fecha'] >= start_date) & (meta['Fecha'] <= end_date)]
-        return update_winrate(df_filtrado, min_juegos)
+        ventana = normalizar_ventana(filtro_winrate, evento, start_date, end_date)
+        return update_winrate(motor.resumen(ventana), min_juegos, ventana=ventana, version=datos.version)
 
     elif tab == "winrate_juego":
-        if filtro_winrate == "evento":
-            fecha_corte = eventos[evento]
-            df_filtrado = meta[meta['Fecha'] >= fecha_corte]
-        else:
-            df_filtrado = meta[(meta['Fecha'] >= start_date) & (meta['Fecha'] <= end_date)]
-        return update_winrate_juego(df_filtrado, color_opcion)
+        ventana = normalizar_ventana(filtro_winrate, evento, start_date, end_date)
+        return update_winrate_juego(motor.resumen(ventana), color_opcion, ventana=ventana, version=datos.version)
 
     elif tab == "heatmap":
-        fecha_corte = eventos[evento]
-        df_filtrado = cruces[cruces['fecha'] >= fecha_corte]
-        return update_heatmap(df_filtrado, min_juegos)
+        ventana = normalizar_ventana(filtro_heatmap, evento, start_date, end_date)
+        return update_heatmap(motor.matriz(ventana), min_juegos, ventana=ventana, version=datos.version)
 
     elif tab == "top_distribution":
-        fecha_corte = eventos[evento]
-        df_filtrado = meta[meta['Fecha'] >= fecha_corte]
-        return update_top_distribution(df_filtrado, color_opcion)
+        ventana = normalizar_ventana("evento", evento)
+        return update_top_distribution(motor.resumen(ventana), color_opcion, ventana=ventana, version=datos.version)
 
     elif tab == "liga":
-        return update_liga(meta, mes_liga)
+        return update_liga(motor.liga(mes_liga), mes_liga, version=datos.version)
+
+
+# ========== TABLAS PAGINADAS ==========
+FILAS_POR_PAGINA = 50
+
+
+class Tabla:
+    """
+    Tabla completa (todas las filas, ya formateadas) de la que se sirven páginas.
+    `columnas` es una lista de (columna de df, título, clase del encabezado, clase de
+    las celdas); una clase None deja el componente sin className. `clase_fila` es la
+    columna de `df` con la clase de cada fila.
+    """
+
+    def __init__(self, df, columnas, clase_fila=None, **props):
+        self.df = df
+        self.columnas = columnas
+        self.clase_fila = clase_fila
+        self.props = props
+
+
+def con_clase(componente, hijos, clase):
+    return componente(hijos) if clase is None else componente(hijos, className=clase)
+
+
+def filas_tabla(tabla, df):
+    """
+    Filas <tr> armadas en una sola pasada sobre los arrays de cada columna, sin
+    iterrows ni conversiones celda por celda (el formato ya viene en la Tabla).
+    """
+    valores = zip(*[df[columna].tolist() for columna, _, _, _ in tabla.columnas])
+    clases_celda = [clase for _, _, _, clase in tabla.columnas]
+    clases_fila = df[tabla.clase_fila].tolist() if tabla.clase_fila else [None] * len(df)
+    return [
+        con_clase(html.Tr, [con_clase(html.Td, v, c) for v, c in zip(fila, clases_celda)], clase)
+        for fila, clase in zip(valores, clases_fila)
+    ]
+
+
+def pagina_tabla(tabla, pagina=1, orden=None):
+    """Ordena la tabla completa (orden = {'columna', 'ascendente'}) y corta la página pedida."""
+    df = tabla.df
+    if orden and orden.get('columna') in df.columns:
+        df = df.sort_values(orden['columna'], ascending=orden['ascendente'], kind='stable', na_position='last')
+    inicio = (pagina - 1) * FILAS_POR_PAGINA
+    return filas_tabla(tabla, df.iloc[inicio:inicio + FILAS_POR_PAGINA])
+
+
+def render_tabla(vista, tabla):
+    """
+    dbc.Table paginada del lado del servidor: solo viaja la primera página; el paginador
+    y los clics en los encabezados vuelven a `paginar_tabla`, que reconstruye la tabla
+    a partir de `vista` (la clave canónica de la tabla) y manda solo las filas pedidas.
+    """
+    n_paginas = max(1, -(-len(tabla.df) // FILAS_POR_PAGINA))
+    encabezado = html.Thead(html.Tr([
+        con_clase(html.Th, html.Span(
+            titulo, id={'type': 'tabla-orden', 'vista': vista, 'columna': columna},
+            n_clicks=0, style={'cursor': 'pointer'}
+        ), clase)
+        for columna, titulo, clase, _ in tabla.columnas
+    ]))
+    return html.Div([
+        dbc.Table([encabezado, html.Tbody(pagina_tabla(tabla), id={'type': 'tabla-cuerpo', 'vista': vista})],
+                  **tabla.props),
+        dbc.Pagination(
+            id={'type': 'tabla-pagina', 'vista': vista}, active_page=1, max_value=n_paginas,
+            fully_expanded=False, previous_next=True, first_last=True, size="sm",
+            class_name="justify-content-center", style={'display': 'none'} if n_paginas == 1 else None
+        ),
+        dcc.Store(id={'type': 'tabla-estado', 'vista': vista}, data={'columna': None, 'ascendente': True})
+    ])
+
+
+def construir_tabla(vista, datos):
+    """Reconstruye la Tabla de una vista ("liga|<mes>" o "torneo|<fecha iso>")."""
+    tipo, clave = vista.split("|", 1)
+    motor = motor_consultas(datos)
+    if tipo == "liga":
+        return tabla_liga(motor.liga(clave), clave)
+    if tipo == "torneo":
+        return tabla_torneo(motor.filas(normalizar_ventana("fecha_puntual", fecha_unica=clave)))
+    raise ValueError(f"Vista de tabla desconocida: {vista}")
+
+
+@app.callback(
+    Output({'type': 'tabla-cuerpo', 'vista': MATCH}, 'children'),
+    Output({'type': 'tabla-estado', 'vista': MATCH}, 'data'),
+    Output({'type': 'tabla-pagina', 'vista': MATCH}, 'active_page'),
+    Input({'type': 'tabla-pagina', 'vista': MATCH}, 'active_page'),
+    Input({'type': 'tabla-orden', 'vista': MATCH, 'columna': ALL}, 'n_clicks'),
+    State({'type': 'tabla-estado', 'vista': MATCH}, 'data'),
+    prevent_initial_call=True
+)
+def paginar_tabla(pagina, _clics, orden):
+    disparador = ctx.triggered_id
+    vista = disparador['vista']
+    nueva_pagina = dash.no_update
+    if disparador['type'] == 'tabla-orden':
+        # Un clic en la misma columna invierte el orden; cualquier orden nuevo vuelve a la página 1
+        columna = disparador['columna']
+        ascendente = not orden['ascendente'] if orden['columna'] == columna else True
+        orden = {'columna': columna, 'ascendente': ascendente}
+        pagina = nueva_pagina = 1
+
+    datos = almacen.actual
+    tabla = agregado("tabla", vista, (), lambda: construir_tabla(vista, datos), version=datos.version)
+    if tabla is None:
+        raise PreventUpdate
+    return pagina_tabla(tabla, pagina or 1, orden), orden, nueva_pagina
 
 
 # ========== FUNCIONES PARA ACTUALIZAR GRÁFICOS ==========
@@ -402,80 +2167,211 @@ def contar_martes_del_mes(fecha):
     return sum(1 for semana in calendario if semana[1] != 0)
 
 
-def update_liga(df, mes_seleccionado):
-    if not mes_seleccionado:
-        return html.Div("Por favor, selecciona una opción.", className="text-center p-4 mt-5")
+def standings_mes(df_m):
+    """
+    Puntos, orden de desempate y ganador de un mes de Liga.
+    Un mes está terminado cuando se jugaron tantas fechas como martes tiene.
+    """
+    df_m = df_m.copy()
+
+    fechas_jugadas = pd.to_datetime(df_m['Fecha']).dt.strftime('%Y-%m-%d').nunique()
+    fechas_esperadas = contar_martes_del_mes(df_m['Fecha'].iloc[0])
+
+    df_m['Puntos_F'] = (df_m['Wins'] * 3) + df_m['Draws']
+    asistencia_m = df_m.groupby('Jugador', observed=True)['Fecha'].nunique()
+    # Con Jugador categórico, pivot deja las filas en orden de aparición: se ordenan por nombre
+    pivot_m = df_m.pivot(index='Jugador', columns='Fecha', values='Puntos_F').fillna(0).sort_index()
+
+    # Suma de las 4 mejores fechas de cada jugador, más un punto por asistencia
+    mejores_4 = -np.sort(-pivot_m.to_numpy(), axis=1)[:, :4].sum(axis=1)
+    puntos = pd.Series(mejores_4, index=pivot_m.index) + asistencia_m.reindex(pivot_m.index, fill_value=0)
+
+    # ---- CORRECCIÓN DE DESEMPATE MENSUAL PARA LA ACUMULADA ----
+    stats_mes_aux = df_m.assign(Ganado=df_m['Standing'] == 1).groupby('Jugador', observed=True).agg(
+        Torneos_Ganados_M=('Ganado', 'sum'),
+        VPO_M=('%VPO', 'mean'),
+        JG_M=('%JG', 'mean'),
+        JGO_M=('%JGO', 'mean')
+    )
+    df_desempate = pd.DataFrame(puntos.rename('Puntos_M')).join(stats_mes_aux)
+    df_desempate['Asistencia_M'] = df_desempate.index.map(asistencia_m).fillna(0)
+    # -----------------------------------------------------------
 
-    df.columns = df.columns.str.strip()
+    return standings_desde_desempate(df_desempate, fechas_jugadas >= fechas_esperadas)
 
-    # ============================
-    # TABLA ACUMULADA
-    # ============================
-    if mes_seleccionado == 'Acumulada':
-        df_liga = df[df['Liga'].astype(str).str.lower().str.strip() == 'si'].copy()
 
-        if df_liga.empty:
-            return html.Div("No hay datos de liga disponibles.", className="text-center p-4 mt-5")
+def standings_desde_desempate(df_desempate, terminado):
+    """
+    Standing de un mes desde su tabla de desempate: una fila por jugador (en orden de
+    nombre) con Puntos_M, Torneos_Ganados_M, VPO_M, JG_M, JGO_M y Asistencia_M.
+    """
+    ranking = df_desempate.sort_values(
+        by=['Puntos_M', 'Asistencia_M', 'Torneos_Ganados_M', 'VPO_M', 'JG_M', 'JGO_M'],
+        ascending=[False, False, False, False, False, False]
+    )['Puntos_M']
+    return {
+        'puntos': df_desempate['Puntos_M'],
+        'ranking': ranking,
+        'terminado': terminado,
+        # Al estar ordenado con desempates, el index[0] es el ganador real
+        'ganador': ranking.index[0] if terminado else None
+    }
 
-        stats_global = df_liga.groupby('Jugador').agg(
-            Asistencia_Total=('Fecha', 'nunique'),
-            Torneos_Ganados=('Standing', lambda x: (x == 1).sum()),
-            VPO_Acum=('%VPO', 'mean'),
-            JG_Acum=('%JG', 'mean'),
-            JGO_Acum=('%JGO', 'mean')
-        )
 
-        meses_cols = df_liga.groupby('Mes')['Fecha'].max().sort_values().index.tolist()
+# Columnas de metaR que lee standings_mes: cualquier cambio en ellas cambia el mes
+COLUMNAS_STANDINGS = ['Fecha', 'Jugador', 'Standing', 'Wins', 'Draws', '%VPO', '%JG', '%JGO']
 
-        resultados_por_jugador = []
-        ranking_mensual_dict = {}
-        meses_terminados = []
 
-        for m in meses_cols:
-            df_m = df_liga[df_liga['Mes'] == m].copy()
+def firma_mes(df_m):
+    """Hash del contenido de las filas de un mes en las COLUMNAS_STANDINGS (y de las categorías de Jugador)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pd.util.hash_pandas_object(df_m[COLUMNAS_STANDINGS], index=False).to_numpy().tobytes())
+    # Las categorías de Jugador pasan al índice de los puntos: un jugador nuevo en otro mes también cuenta
+    if isinstance(df_m['Jugador'].dtype, pd.CategoricalDtype):
+        h.update(pd.util.hash_array(df_m['Jugador'].cat.categories.to_numpy(dtype=object)).tobytes())
+    return h.hexdigest()
 
-            fechas_jugadas = pd.to_datetime(df_m['Fecha']).dt.strftime('%Y-%m-%d').nunique()
-            
-            fecha_referencia = df_m['Fecha'].iloc[0]
-            fechas_esperadas = contar_martes_del_mes(fecha_referencia)
 
-            if fechas_jugadas >= fechas_esperadas:
-                meses_terminados.append(m)
+class MotorLiga:
+    """
+    Standings mensuales para la tabla Acumulada. Cada mes se guarda junto con la
+    firma de sus filas (firma_mes, un hash de todas las columnas que deciden puntos
+    y desempates), así que los meses terminados quedan congelados entre recargas y
+    solo se recalcula el mes abierto, o uno que haya sido corregido.
+
+    Con `disco` cada mes se guarda también ahí (sin vencimiento: la firma decide si
+    sirve). La Acumulada corre en un trabajo en segundo plano, cuyo proceso termina
+    al responder, y así los meses congelados les quedan a los trabajos siguientes.
+    """
 
-            df_m['Puntos_F'] = (df_m['Wins'] * 3) + df_m['Draws']
-            asistencia_m = df_m.groupby('Jugador')['Fecha'].nunique()
-            pivot_m = df_m.pivot(index='Jugador', columns='Fecha', values='Puntos_F').fillna(0)
+    def __init__(self, disco=None):
+        self.disco = disco
+        self._meses = {}
+        self._lock = threading.Lock()
+
+    def _guardado(self, mes, firma):
+        """Standing guardado del mes si corresponde a `firma`: el de este proceso o el del disco."""
+        with self._lock:
+            entrada = self._meses.get(mes)
+        if entrada is not None and entrada['firma'] == firma:
+            return entrada
+        entrada = None if self.disco is None else leer_disco(self.disco, f"liga_mes|{mes}")
+        if entrada is None or entrada['firma'] != firma:
+            return None
+        with self._lock:
+            self._meses[mes] = entrada
+        return entrada
+
+    def meses(self, df_liga):
+        """Devuelve los meses en orden cronológico y el standing de cada uno."""
+        filas_mes = dict(tuple(df_liga.groupby('Mes', observed=True)))
+        meses_cols = sorted(filas_mes, key=lambda m: filas_mes[m]['Fecha'].max())
+
+        standings = {}
+        for i, m in enumerate(meses_cols):
+            avanzar(10 + 80 * i // len(meses_cols), f"Standings de {m}")
+            firma = firma_mes(filas_mes[m])
+            entrada = self._guardado(m, firma)
+            if entrada is None:
+                entrada = dict(standings_mes(filas_mes[m]), firma=firma)
+                with self._lock:
+                    self._meses[m] = entrada
+                if self.disco is not None:
+                    guardar_disco(self.disco, f"liga_mes|{m}", entrada)
+            standings[m] = entrada
+        return meses_cols, standings
+
+
+motor_liga = MotorLiga(disco_segundo_plano)
+
+
+class AcumuladaLiga:
+    """
+    Lo que necesita la tabla Acumulada: los meses de liga en orden cronológico, el
+    standing de cada uno (standings_desde_desempate) y las estadísticas de todo el año
+    por jugador (Asistencia_Total, Torneos_Ganados, VPO_Acum, JG_Acum, JGO_Acum).
+    """
 
-            puntos_mes_dict = {}
-            for jugador, row in pivot_m.iterrows():
-                total_m = sum(sorted(row.values, reverse=True)[:4]) + asistencia_m.get(jugador, 0)
-                puntos_mes_dict[jugador] = total_m
+    def __init__(self, meses, standings, stats_global):
+        self.meses = meses
+        self.standings = standings
+        self.stats_global = stats_global
 
-            # ---- CORRECCIÓN DE DESEMPATE MENSUAL PARA LA ACUMULADA ----
-            stats_mes_aux = df_m.groupby('Jugador').agg(
-                Torneos_Ganados_M=('Standing', lambda x: (x == 1).sum()),
-                VPO_M=('%VPO', 'mean'),
-                JG_M=('%JG', 'mean'),
-                JGO_M=('%JGO', 'mean')
-            )
-            df_desempate = pd.DataFrame(pd.Series(puntos_mes_dict, name='Puntos_M')).join(stats_mes_aux)
-            df_desempate['Asistencia_M'] = df_desempate.index.map(asistencia_m).fillna(0)
-            
-            df_desempate = df_desempate.sort_values(
-                by=['Puntos_M', 'Asistencia_M', 'Torneos_Ganados_M', 'VPO_M', 'JG_M', 'JGO_M'],
-                ascending=[False, False, False, False, False, False]
-            )
-            ranking_mensual_dict[m] = df_desempate['Puntos_M']
-            # -----------------------------------------------------------
-            
-            resultados_por_jugador.append(pd.Series(puntos_mes_dict, name=m))
+    @property
+    def empty(self):
+        return not self.meses
+
+
+def acumulada_liga(df):
+    """AcumuladaLiga de lo que recibe la tab: la de un motor de consultas tal cual, o desde las filas de metaR."""
+    if isinstance(df, AcumuladaLiga):
+        return df
+    df_liga = df[df['EsLiga']].copy()
+
+    if df_liga.empty:
+        return AcumuladaLiga([], {}, None)
+
+    stats_global = df_liga.assign(Ganado=df_liga['Standing'] == 1).groupby('Jugador', observed=True).agg(
+        Asistencia_Total=('Fecha', 'nunique'),
+        Torneos_Ganados=('Ganado', 'sum'),
+        VPO_Acum=('%VPO', 'mean'),
+        JG_Acum=('%JG', 'mean'),
+        JGO_Acum=('%JGO', 'mean')
+    )
+
+    # Los meses terminados salen congelados del motor; solo se recalcula el mes abierto
+    meses_cols, standings = motor_liga.meses(df_liga)
+    return AcumuladaLiga(meses_cols, standings, stats_global)
+
+
+def columnas_liga(df, columnas, columna_total):
+    """
+    Formato de las celdas de la liga sobre columnas enteras: porcentajes a 2 decimales
+    y el resto de los números como enteros. Devuelve la especificación de columnas de la Tabla.
+    """
+    for c in columnas:
+        if c in ['%VPO', '%JG', '%JGO']:
+            # round de Python: Series.round puede diferir en el último decimal (x.xx5)
+            df[c] = [round(v, 2) for v in df[c].tolist()]
+        elif c not in ['Jugador', 'Posición'] and pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = df[c].astype('int64')
+    df['Jugador'] = df['Jugador'].astype(object)
+    return [
+        (c, c, "text-center align-middle",
+         "text-center align-middle" + (" fw-bold text-primary" if c == columna_total else ""))
+        for c in columnas
+    ]
+
+
+def tabla_liga(df, mes_seleccionado):
+    """
+    Tabla completa de la liga ('Acumulada' o un mes), o None si no hay datos. `df` son
+    las filas de metaR o lo que devuelve `liga` de un motor de consultas.
+    """
+    props = dict(bordered=True, hover=True, responsive=True, size="sm", style={'font-size': '12px'})
+
+    # ============================
+    # TABLA ACUMULADA
+    # ============================
+    if mes_seleccionado == 'Acumulada':
+        acumulada = acumulada_liga(df)
+
+        if acumulada.empty:
+            return None
+
+        stats_global = acumulada.stats_global
+        meses_cols, standings = acumulada.meses, acumulada.standings
+
+        ranking_mensual_dict = {m: standings[m]['ranking'] for m in meses_cols}
+        meses_terminados = [m for m in meses_cols if standings[m]['terminado']]
+        resultados_por_jugador = [standings[m]['puntos'].rename(m) for m in meses_cols]
 
         df_acumulado = pd.concat(resultados_por_jugador, axis=1).fillna(0)
         df_acumulado['Puntaje Total'] = df_acumulado.sum(axis=1)
 
         ligas_ganadas = {}
         for m in meses_terminados:
-            ganador = ranking_mensual_dict[m].index[0] # Al estar ordenado con desempates, el index[0] es el ganador real
+            ganador = standings[m]['ganador']
             ligas_ganadas[ganador] = ligas_ganadas.get(ganador, 0) + 1
 
         df_acumulado['Ligas Ganadas'] = df_acumulado.index.map(ligas_ganadas).fillna(0)
@@ -501,7 +2397,6 @@ def update_liga(df, mes_seleccionado):
         )
 
         columnas_finales = ['Posición', 'Jugador'] + meses_cols + ['Puntaje Total', 'Asistencia', 'Ligas Ganadas', 'Torneos Ganados', '%VPO', '%JG', '%JGO']
-        header = [html.Th(c, className="text-center align-middle") for c in columnas_finales]
 
         clasificados_mes = []
         for m in meses_terminados:
@@ -523,47 +2418,24 @@ def update_liga(df, mes_seleccionado):
             if j not in clasificados_mes and j not in clasificados_asistencia
         ][:6]
 
-        rows = []
-        for _, row in df_acumulado.iterrows():
-            jug = row['Jugador']
-            clase_fila = "table-success" if jug in clasificados_mes else "table-info" if jug in clasificados_anual else "table-warning" if jug in clasificados_asistencia else ""
-
-            celdas = []
-            for col in columnas_finales:
-                val = row[col]
-                if col in ['%VPO', '%JG', '%JGO']: val = round(val, 2)
-                elif isinstance(val, (int, float)) and col != 'Jugador': val = int(val)
-                celdas.append(html.Td(val, className="text-center align-middle" + (" fw-bold text-primary" if col == "Puntaje Total" else "")))
-            rows.append(html.Tr(celdas, className=clase_fila))
-
-        return html.Div([
-            html.H4("Carrera al Invitacional (Top 16)", className="text-center mb-2"),
-            html.Div([
-                html.Small([
-                    html.B("¡Importante!"),
-                    html.Br(),
-                    "1) Solo tiene asegurado su cupo el Clasificado mensual (color verde).",
-                    html.Br(),
-                    "2) Los cupos del Top Anual y Top Asistencia no están confirmados, solo se van a confirmar una vez jugado el ultimo mes de la Liga."
-                ], className="text-muted d-block text-center"),
-                html.Br(),
-                html.Span("● Clasificado mensual: Ganador del mes o mejor lugar del mes sin cupo (8)", className="text-success me-3 small"),
-                html.Span("● Top Anual (6) ", className="text-info me-3 small"),
-                html.Span("● Top Asistencia (2) ", className="text-warning small")
-            ], className="text-center mb-3"),
-            dbc.Table([html.Thead(html.Tr(header)), html.Tbody(rows)],
-                      bordered=True, hover=True, responsive=True, size="sm", style={'font-size': '12px'})
-        ])
+        jugadores = df_acumulado['Jugador']
+        df_acumulado['_clase'] = np.select(
+            [jugadores.isin(clasificados_mes), jugadores.isin(clasificados_anual), jugadores.isin(clasificados_asistencia)],
+            ["table-success", "table-info", "table-warning"],
+            default=""
+        )
+        columnas = columnas_liga(df_acumulado, columnas_finales, "Puntaje Total")
+        return Tabla(df_acumulado, columnas, clase_fila='_clase', **props)
 
     # ============================
     # TABLA MENSUAL
     # ============================
-    df_mes = df[(df['Mes'] == mes_seleccionado) & (df['Liga'].astype(str).str.lower().str.strip() == 'si')].copy()
+    df_mes = df[(df['Mes'] == mes_seleccionado) & df['EsLiga']].copy()
 
     if df_mes.empty:
-        return html.Div(f"Sin datos para {mes_seleccionado}", className="text-center p-4 mt-5")
+        return None
 
-    stats_mes = df_mes.groupby('Jugador').agg(
+    stats_mes = df_mes.groupby('Jugador', observed=True).agg(
         Torneos_Ganados=('Standing', lambda x: (x == 1).sum()),
         VPO_Prom=('%VPO', 'mean'),
         JG_Prom=('%JG', 'mean'),
@@ -575,12 +2447,13 @@ def update_liga(df, mes_seleccionado):
     mapeo = {f: f"Fecha {i+1}" for i, f in enumerate(fechas)}
     df_mes['N_Fecha'] = df_mes['Fecha'].map(mapeo)
 
-    tabla_puntos = df_mes.pivot(index='Jugador', columns='N_Fecha', values='Puntos_F').fillna(0)
-    tabla_mazos = df_mes.pivot(index='Jugador', columns='N_Fecha', values='Arquetipo').fillna("-")
+    # Con Jugador categórico, pivot deja las filas en orden de aparición: se ordenan por nombre
+    tabla_puntos = df_mes.pivot(index='Jugador', columns='N_Fecha', values='Puntos_F').fillna(0).sort_index()
+    tabla_mazos = df_mes.pivot(index='Jugador', columns='N_Fecha', values='Arquetipo').astype(object).fillna("-").sort_index()
     tabla_mazos.columns = [f"Mazo {col}" for col in tabla_mazos.columns]
 
     resumen = pd.concat([tabla_puntos, tabla_mazos], axis=1)
-    resumen['Asistencia'] = df_mes.groupby('Jugador')['Fecha'].nunique()
+    resumen['Asistencia'] = df_mes.groupby('Jugador', observed=True)['Fecha'].nunique()
     resumen['Puntos Totales'] = tabla_puntos.apply(lambda r: sum(sorted(r.values, reverse=True)[:4]), axis=1) + resumen['Asistencia']
 
     resumen = resumen.join(stats_mes).sort_values(
@@ -597,37 +2470,132 @@ def update_liga(df, mes_seleccionado):
     fechas_jugadas_mes = pd.to_datetime(df_mes['Fecha']).dt.strftime('%Y-%m-%d').nunique()
     mes_terminado = (fechas_jugadas_mes >= contar_martes_del_mes(df_mes['Fecha'].iloc[0]))
 
-    header_mensual = [html.Th(col, className="text-center align-middle") for col in orden_columnas]
+    resumen['_clase'] = np.where((resumen['Posición'] == 1) & mes_terminado, "table-warning fw-bold", "")
+    columnas = columnas_liga(resumen, orden_columnas, "Puntos Totales")
+    return Tabla(resumen, columnas, clase_fila='_clase', **props)
+
+
+def update_liga(df, mes_seleccionado, version=None):
+    if not mes_seleccionado:
+        return html.Div("Por favor, selecciona una opción.", className="text-center p-4 mt-5")
+
+    # La tabla completa queda en la caché de agregados (y en su disco, que la comparte con
+    # el worker cuando se arma en un trabajo en segundo plano): el paginador la vuelve a pedir
+    vista = f"liga|{mes_seleccionado}"
+    tabla = agregado("tabla", vista if version is not None else None, (),
+                     lambda: tabla_liga(df, mes_seleccionado), version=version)
 
-    rows = []
-    for _, row in resumen.iterrows():
-        clase = "table-warning fw-bold" if row['Posición'] == 1 and mes_terminado else ""
+    if mes_seleccionado == 'Acumulada':
+        if tabla is None:
+            return html.Div("No hay datos de liga disponibles.", className="text-center p-4 mt-5")
+        return html.Div([
+            html.H4("Carrera al Invitacional (Top 16)", className="text-center mb-2"),
+            html.Div([
+                html.Small([
+                    html.B("¡Importante!"),
+                    html.Br(),
+                    "1) Solo tiene asegurado su cupo el Clasificado mensual (color verde).",
+                    html.Br(),
+                    "2) Los cupos del Top Anual y Top Asistencia no están confirmados, solo se van a confirmar una vez jugado el ultimo mes de la Liga."
+                ], className="text-muted d-block text-center"),
+                html.Br(),
+                html.Span("● Clasificado mensual: Ganador del mes o mejor lugar del mes sin cupo (8)", className="text-success me-3 small"),
+                html.Span("● Top Anual (6) ", className="text-info me-3 small"),
+                html.Span("● Top Asistencia (2) ", className="text-warning small")
+            ], className="text-center mb-3"),
+            render_tabla(vista, tabla)
+        ])
 
-        celdas = []
-        for c in orden_columnas:
-            val = row[c]
-            if c in ['%VPO', '%JG', '%JGO']:
-                val = round(val, 2)
-            elif isinstance(val, (int, float)) and c not in ['Jugador', 'Posición']:
-                val = int(val)
-            
-            celdas.append(html.Td(val, className="text-center align-middle" + (" fw-bold text-primary" if c == "Puntos Totales" else "")))
-            
-        rows.append(html.Tr(celdas, className=clase))
+    if tabla is None:
+        return html.Div(f"Sin datos para {mes_seleccionado}", className="text-center p-4 mt-5")
 
     return html.Div([
         html.H4(f"Detalle Liga: {mes_seleccionado}", className="text-center mb-4"),
-        dbc.Table(
-            [
-                html.Thead(html.Tr(header_mensual)),
-                html.Tbody(rows)
-            ],
-            bordered=True, hover=True, responsive=True, size="sm", style={'font-size': '12px'}
-        )
+        render_tabla(vista, tabla)
     ])
 
 
-def update_metagame(df, filtro, evento, start_date, end_date, fecha_unica, n_top=20):
+def resumen_arquetipos(df):
+    """
+    ResumenArquetipos de lo que recibe la tab: el de DatosVersion.resumen tal cual,
+    o recorriendo filas torneo × arquetipo o de jugadores (llamadas directas).
+    """
+    if isinstance(df, ResumenArquetipos):
+        return df
+    return resumir_torneos(df if 'Apariciones' in df.columns else agregar_torneos(df))
+
+
+class EstadisticasArquetipos:
+    """
+    Estadísticas por arquetipo de una ventana, calculadas una vez y compartidas por
+    todas las tabs de arquetipos (metagame, conversion_table, top_distribution,
+    winrate, winrate_juego): cada una solo elige columnas, filtra y ordena.
+
+    Además de las METRICAS_ARQUETIPO trae los juegos (W + L + D), la participación
+    de cada arquetipo (en jugadores, Top1, Top3 y juegos, redondeada a 2 decimales),
+    la conversión de jugadores en Top1/Top3, el winrate y su IC 95%. `filas` va en
+    orden de primera aparición, el de value_counts (así los empates se ordenan
+    igual); `por_arquetipo` en orden de categoría, el de un groupby.
+    """
+
+    Z_IC = norm.ppf(1 - 0.05/2)
+
+    def __init__(self, resumen):
+        filas = resumen.filas.copy()
+        filas['Juegos'] = filas['Wins'] + filas['Loses'] + filas['Draws']
+        filas['Meta %'] = (filas['Jugadores'] / filas['Jugadores'].sum() * 100).round(2)
+        for top in ['Top1', 'Top3']:
+            filas[f'{top} %'] = (filas[top] / filas[top].sum() * 100).round(2)
+            filas[f'Factor {top} %'] = (filas[top] / filas['Jugadores'] * 100).round(2)
+        filas['% Juego'] = round(filas['Juegos'] / filas['Juegos'].sum() * 100, 2)
+
+        proporcion = filas['Wins'] / filas['Juegos']
+        margen = self.Z_IC * np.sqrt(proporcion * (1 - proporcion) / filas['Juegos'])
+        filas['Winrate'] = round(filas['Wins'] / filas['Juegos'] * 100, 2)
+        filas['IC inferior'] = 100 * (proporcion - margen)
+        filas['IC superior'] = 100 * (proporcion + margen)
+
+        self.filas = filas
+        self.por_arquetipo = filas.sort_values('Arquetipo', kind='stable', ignore_index=True)
+        self.n_torneos = resumen.n_torneos
+
+    @property
+    def empty(self):
+        return self.filas.empty
+
+
+def estadisticas_arquetipos(df, ventana=None, version=None):
+    """EstadisticasArquetipos de la ventana, una sola entrada de la caché de agregados para todas las tabs."""
+    return agregado("arquetipos", ventana, (), lambda: EstadisticasArquetipos(resumen_arquetipos(df)), version=version)
+
+
+def tabla_torneo(df):
+    """Tabla completa de resultados de un torneo, ordenada por Standing."""
+    df_tabla = df.assign(Puntos=(df['Wins'] * 3) + df['Draws']).sort_values('Standing', ascending=True)
+    tabla = pd.DataFrame({
+        'Pos.': df_tabla['Standing'].astype('int64'),
+        'Jugador': df_tabla['Jugador'].astype(object),
+        'Arquetipo': df_tabla['Arquetipo'].astype(object),
+        'W': df_tabla['Wins'].astype('int64'),
+        'L': df_tabla['Loses'].astype('int64'),
+        'D': df_tabla['Draws'].astype('int64'),
+        'Puntos': df_tabla['Puntos'].astype('int64'),
+        '_clase': np.where(df_tabla['Standing'] == 1, "table-warning fw-bold", "")
+    })
+    columnas = [
+        ('Pos.', "Pos.", "text-center", "text-center"),
+        ('Jugador', "Jugador", None, None),
+        ('Arquetipo', "Arquetipo", None, None),
+        ('W', "W", "text-center", "text-center"),
+        ('L', "L", "text-center", "text-center"),
+        ('D', "D", "text-center", "text-center"),
+        ('Puntos', "Puntos", "text-center", "text-center fw-bold text-primary")
+    ]
+    return Tabla(tabla, columnas, clase_fila='_clase',
+                 bordered=True, hover=True, striped=True, responsive=True, size="sm")
+
+
+def update_metagame(df, filtro, evento, start_date, end_date, fecha_unica, n_top=20, ventana=None, version=None):
     if df.empty:
         return dcc.Graph(figure=go.Figure().update_layout(
             title="No hay datos disponibles",
@@ -637,77 +2605,52 @@ def update_metagame(df, filtro, evento, start_date, end_date, fecha_unica, n_top
             paper_bgcolor='white'
         ))
 
-    conteo = df['Arquetipo'].value_counts().reset_index()
-    conteo.columns = ['Arquetipo', 'Freq']
-
-    if len(conteo) > n_top:
-        top_mazos = conteo.head(n_top)
-        otros_count = conteo['Freq'].iloc[n_top:].sum()
-        otros = pd.DataFrame({'Arquetipo': ['Otros'], 'Freq': [otros_count]})
-        conteo = pd.concat([top_mazos, otros]).sort_values('Freq')
-
     if filtro == "fecha_puntual":
-        df = df.copy()
-        df['Puntos'] = (df['Wins'] * 3) + df['Draws']
-        df_tabla = df.sort_values('Standing', ascending=True)
+        vista = f"torneo|{pd.Timestamp(fecha_unica).isoformat()}"
+        tabla = agregado("tabla", vista if ventana is not None else None, (), lambda: tabla_torneo(df), version=version)
         fecha_formateada = pd.to_datetime(fecha_unica).strftime("%d-%m-%Y")
 
-        table_header = [
-            html.Thead(html.Tr([
-                html.Th("Pos.", className="text-center"),
-                html.Th("Jugador"),
-                html.Th("Arquetipo"),
-                html.Th("W", className="text-center"),
-                html.Th("L", className="text-center"),
-                html.Th("D", className="text-center"),
-                html.Th("Puntos", className="text-center")
-            ]))
-        ]
-
-        rows = []
-        for _, row in df_tabla.iterrows():
-            pos = row['Standing']
-            clase_fila = "table-warning fw-bold" if pos == 1 else ""
-            rows.append(html.Tr([
-                html.Td(int(pos), className="text-center"),
-                html.Td(row['Jugador'] if 'Jugador' in row else "-"),
-                html.Td(row['Arquetipo']),
-                html.Td(int(row['Wins']), className="text-center"),
-                html.Td(int(row['Loses']), className="text-center"),
-                html.Td(int(row['Draws']), className="text-center"),
-                html.Td(int(row['Puntos']), className="text-center fw-bold text-primary")
-            ], className=clase_fila))
-
         return html.Div([
             html.H5(f"Resultados del Torneo: {fecha_formateada}", className="text-center mb-3"),
-            dbc.Table(table_header + [html.Tbody(rows)],
-                      bordered=True, hover=True, striped=True, responsive=True, size="sm")
+            render_tabla(vista, tabla)
         ])
-    else:
-        fig = go.Figure(go.Bar(
-            x=conteo['Freq'],
-            y=conteo['Arquetipo'],
-            orientation='h',
-            marker_color='dodgerblue'
-        ))
 
-        title = (evento if filtro == "evento" else f"Mazos desde {start_date} a {end_date}")
+    filas = estadisticas_arquetipos(df, ventana, version).filas
+    conteo = pd.DataFrame({'Arquetipo': filas['Arquetipo'].astype(object), 'Freq': filas['Apariciones']})
+    conteo = conteo.sort_values('Freq', ascending=False, kind='stable', ignore_index=True)
 
-        fig.update_layout(
-            title=title,
-            xaxis_title="Apariciones",
-            yaxis_title="Mazos",
-            plot_bgcolor='white',
-            paper_bgcolor='white',
-            height=700
-        )
-        return dcc.Graph(figure=fig)
+    if len(conteo) > n_top:
+        top_mazos = conteo.head(n_top)
+        otros_count = conteo['Freq'].iloc[n_top:].sum()
+        otros = pd.DataFrame({'Arquetipo': ['Otros'], 'Freq': [otros_count]})
+        conteo = pd.concat([top_mazos, otros]).sort_values('Freq', kind='stable')
+
+    fig = go.Figure(go.Bar(
+        x=conteo['Freq'],
+        y=conteo['Arquetipo'],
+        orientation='h',
+        marker_color='dodgerblue'
+    ))
+
+    title = (evento if filtro == "evento" else f"Mazos desde {start_date} a {end_date}")
+
+    fig.update_layout(
+        title=title,
+        xaxis_title="Apariciones",
+        yaxis_title="Mazos",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        height=700
+    )
+    return dcc.Graph(figure=fig)
 
 
-def update_top_distribution(df, top_type):
-    stats = df.groupby('Arquetipo')[top_type].sum().reset_index()
+def update_top_distribution(df, top_type, ventana=None, version=None):
+    estadisticas = estadisticas_arquetipos(df, ventana, version)
+    stats = estadisticas.por_arquetipo[['Arquetipo', top_type]]
     stats.columns = ['Arquetipo', 'Count']
     stats = stats[stats['Count'] > 0].sort_values('Count', ascending=False)
+    n_torneos = estadisticas.n_torneos
 
     if stats.empty:
         return dcc.Graph(figure=go.Figure().update_layout(
@@ -730,7 +2673,7 @@ def update_top_distribution(df, top_type):
         pull=[0.1 if i == 0 else 0 for i in range(len(stats))]
     ))
 
-    title = f"Distribución de {top_type} - {len(df['Fecha'].unique())} torneos"
+    title = f"Distribución de {top_type} - {n_torneos} torneos"
     fig.update_layout(
         title=dict(text=title, x=0.5, xanchor='center'),
         plot_bgcolor='white',
@@ -750,27 +2693,17 @@ def update_top_distribution(df, top_type):
     return dcc.Graph(figure=fig)
 
 
-def update_conversion_table(df, top_type):
+def update_conversion_table(df, top_type, ventana=None, version=None):
     if df.empty:
         return html.Div("No hay datos disponibles")
 
     label_exito = "Torneos ganados" if top_type == "Top1" else "Podios"
 
-    stats = df.groupby('Arquetipo').agg({
-        'Standing': 'count',
-        top_type: 'sum'
-    }).reset_index()
-
-    stats.columns = ['Arquetipo', 'Jugadores', 'Tops']
-
-    total_j = stats['Jugadores'].sum()
-    total_t = stats['Tops'].sum()
-
-    stats['Meta %'] = (stats['Jugadores'] / total_j * 100).round(2)
-    stats['Top %'] = (stats['Tops'] / total_t * 100).round(2)
-    stats['Neto'] = (stats['Top %'] - stats['Meta %']).round(2)
-    stats['Factor %'] = (stats['Tops'] / stats['Jugadores'] * 100).round(2)
+    stats = estadisticas_arquetipos(df, ventana, version).por_arquetipo[
+        ['Arquetipo', 'Jugadores', top_type, 'Meta %', f'{top_type} %', f'Factor {top_type} %']]
+    stats.columns = ['Arquetipo', 'Jugadores', 'Tops', 'Meta %', 'Top %', 'Factor %']
     stats = stats[stats['Tops'] >= 1]
+    stats = stats.assign(Neto=(stats['Top %'] - stats['Meta %']).round(2))
     stats = stats.sort_values('Neto', ascending=False)
 
     table_header = [
@@ -782,45 +2715,53 @@ def update_conversion_table(df, top_type):
         ]))
     ]
 
-    rows = []
-    for _, row in stats.iterrows():
-        if row['Neto'] > 0:
-            color_neto = "text-success"
-            prefijo = "+"
-        elif row['Neto'] < 0:
-            color_neto = "text-danger"
-            prefijo = ""
-        else:
-            color_neto = "text-dark"
-            prefijo = ""
-
-        rows.append(html.Tr([
-            html.Td(row['Arquetipo'], style={'font-weight': 'bold'}),
-            html.Td(f"{prefijo}{row['Neto']}%", className=f"fw-bold {color_neto}"),
-            html.Td(f"{row['Factor %']:.2f}%"),
-            html.Td(
-                html.Small(
-                    f"Meta: {row['Meta %']}% ({int(row['Jugadores'])}) | {label_exito}: {row['Top %']}% ({int(row['Tops'])})",
-                    className="text-muted",
-                    style={'font-size': '0.9rem'}
-                )
-            )
-        ]))
+    # Textos y clases armados por columna; las filas salen de una sola pasada con zip
+    neto = stats['Neto']
+    colores = np.select([neto > 0, neto < 0], ["text-success", "text-danger"], default="text-dark")
+    textos_neto = np.where(neto > 0, "+", "") + neto.astype(str) + "%"
+    textos_factor = stats['Factor %'].map("{:.2f}%".format)
+    textos_meta = ("Meta: " + stats['Meta %'].astype(str) + "% (" + stats['Jugadores'].astype(str) + ") | "
+                   + label_exito + ": " + stats['Top %'].astype(str) + "% (" + stats['Tops'].astype(str) + ")")
+
+    rows = [
+        html.Tr([
+            html.Td(arquetipo, style={'font-weight': 'bold'}),
+            html.Td(texto_neto, className=f"fw-bold {color}"),
+            html.Td(texto_factor),
+            html.Td(html.Small(texto_meta, className="text-muted", style={'font-size': '0.9rem'}))
+        ])
+        for arquetipo, texto_neto, color, texto_factor, texto_meta in zip(
+            stats['Arquetipo'].tolist(), textos_neto.tolist(), colores.tolist(),
+            textos_factor.tolist(), textos_meta.tolist()
+        )
+    ]
 
     return dbc.Table(table_header + [html.Tbody(rows)], bordered=True, hover=True, striped=True, responsive=True)
 
 
-def update_evolution(df, n_top=5):
-    df = df.copy()
-    df['Mes'] = df['Fecha'].dt.to_period('M').dt.to_timestamp()
+def conteos_mensuales(df):
+    """ConteosMensuales de lo que recibe la tab: el de un motor de consultas tal cual, o agrupando las filas."""
+    if isinstance(df, ConteosMensuales):
+        return df
+    df_mes = df.copy()
+    df_mes['Mes'] = df_mes['Fecha'].dt.to_period('M').dt.to_timestamp()
+    conteos = df_mes.groupby(['Mes', 'Arquetipo'], observed=True).size().unstack(fill_value=0)
+    return ConteosMensuales(conteos, df['Fecha'].min(), df['Fecha'].max())
 
-    monthly_counts = df.groupby(['Mes', 'Arquetipo']).size().unstack(fill_value=0)
-    monthly_pct = monthly_counts.div(monthly_counts.sum(axis=1), axis=0) * 100
 
-    top_mazos = monthly_counts.sum().sort_values(ascending=False).head(n_top).index
-    monthly_top_pct = monthly_pct[top_mazos]
+def update_evolution(df, n_top=5, ventana=None, version=None, meses_media=1):
+    """
+    Porcentaje mensual de los n_top arquetipos de la ventana; con `meses_media` > 1,
+    como media móvil de esa cantidad de meses.
+    """
+    conteos = agregado("evolution", ventana, (), lambda: conteos_mensuales(df), version=version)
+    fecha_min, fecha_max = conteos.fecha_min, conteos.fecha_max
+    avanzar(50, "Armando el gráfico")
+
+    top_mazos = conteos.orden[:n_top]
+    monthly_top_pct = conteos.media_movil(meses_media)[top_mazos]
     monthly_top_pct = monthly_top_pct[monthly_top_pct.sum(axis=1) > 0]
-    monthly_top_pct['Acumulado Top'] = monthly_top_pct.sum(axis=1)
+    monthly_top_pct = monthly_top_pct.assign(**{'Acumulado Top': monthly_top_pct.sum(axis=1)})
 
     fig = go.Figure()
     colors = px.colors.qualitative.Plotly
@@ -831,6 +2772,10 @@ def update_evolution(df, n_top=5):
         9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
     }
 
+    # Nombre del mes y acumulado: los mismos para todas las trazas
+    nombres_meses = monthly_top_pct.index.month.map(MESES_ES).to_numpy(dtype=str)
+    customdata = np.column_stack([nombres_meses, monthly_top_pct['Acumulado Top']])
+
     for i, mazo in enumerate(top_mazos):
         fig.add_trace(go.Scatter(
             x=monthly_top_pct.index,
@@ -851,10 +2796,7 @@ def update_evolution(df, n_top=5):
                 "<extra></extra>"
             ),
             text=[mazo]*len(monthly_top_pct),
-            customdata=np.column_stack([
-                [MESES_ES[mes.month] for mes in monthly_top_pct.index],
-                monthly_top_pct['Acumulado Top']
-            ])
+            customdata=customdata
         ))
 
     fig.add_trace(go.Scatter(
@@ -869,13 +2811,13 @@ def update_evolution(df, n_top=5):
             "Porcentaje total: %{y:.1f}%"
             "<extra></extra>"
         ),
-        customdata=[MESES_ES[mes.month] for mes in monthly_top_pct.index]
+        customdata=nombres_meses
     ))
 
     for evento, fecha_str in eventos.items():
         try:
             fecha_dt = pd.to_datetime(fecha_str)
-            if fecha_dt >= df['Fecha'].min() and fecha_dt <= df['Fecha'].max():
+            if fecha_dt >= fecha_min and fecha_dt <= fecha_max:
                 fig.add_vline(
                     x=fecha_dt.timestamp() * 1000,
                     line_width=1.5,
@@ -913,7 +2855,8 @@ def update_evolution(df, n_top=5):
     )
 
     fig.update_layout(
-        title=f'Porcentaje Mensual de Juego (Top {n_top} mazos)',
+        title=f'Porcentaje Mensual de Juego (Top {n_top} mazos)'
+              + (f' - media móvil de {meses_media} meses' if meses_media > 1 else ''),
         xaxis_title='Mes',
         yaxis_title='Porcentaje del Metagame (%)',
         hovermode='x unified',
@@ -940,18 +2883,16 @@ def update_evolution(df, n_top=5):
     return dcc.Graph(figure=fig)
 
 
-def update_winrate(df, min_juegos):
-    stats = df.groupby('Arquetipo').agg({
-        'Standing': 'count',
-        'Wins': 'sum',
-        'Loses': 'sum',
-        'Draws': 'sum',
-        'Top1': 'sum',
-        'Top3': 'sum'
-    }).reset_index()
+def stats_arquetipos(estadisticas, columnas):
+    """Columnas de EstadisticasArquetipos (en orden de categoría) con los nombres cortos de las tabs de winrate."""
+    stats = estadisticas.por_arquetipo[['Arquetipo', 'Wins', 'Loses', 'Draws', 'Top1', 'Top3', 'Juegos', *columnas]]
+    return stats.rename(columns={'Wins': 'win', 'Loses': 'lose', 'Draws': 'draw', 'Top1': 'top1', 'Top3': 'top3',
+                                 'Juegos': 'n', 'Winrate': 'perwinrate', '% Juego': 'perjuego',
+                                 'IC inferior': 'lower', 'IC superior': 'upper'})
 
-    stats.columns = ['Arquetipo', 'players', 'win', 'lose', 'draw', 'top1', 'top3']
-    stats['n'] = stats['win'] + stats['lose'] + stats['draw']
+
+def update_winrate(df, min_juegos, ventana=None, version=None):
+    stats = stats_arquetipos(estadisticas_arquetipos(df, ventana, version), ['Winrate', 'IC inferior', 'IC superior'])
     stats = stats[stats['n'] >= min_juegos]
 
     if stats.empty:
@@ -961,14 +2902,10 @@ def update_winrate(df, min_juegos):
             yaxis={"visible": False}
         ))
 
-    stats['perwinrate'] = round(stats['win'] / stats['n'] * 100, 2)
-    stats['perwinrate2'] = stats['win'] / stats['n']
-
-    z = norm.ppf(1 - 0.05/2)
-    stats['upper'] = 100 * (stats['perwinrate2'] + z * np.sqrt(stats['perwinrate2'] * (1 - stats['perwinrate2']) / stats['n']))
-    stats['lower'] = 100 * (stats['perwinrate2'] - z * np.sqrt(stats['perwinrate2'] * (1 - stats['perwinrate2']) / stats['n']))
     stats = stats.sort_values('perwinrate')
 
+    # Un solo trace: el IC va como barras de error asimétricas (arrays) en lugar de
+    # una forma de layout por arquetipo
     fig = go.Figure()
 
     fig.add_trace(go.Scatter(
@@ -976,20 +2913,22 @@ def update_winrate(df, min_juegos):
         y=stats['perwinrate'],
         mode='markers',
         marker=dict(size=10, color='rgba(55, 128, 191, 0.7)'),
+        error_y=dict(
+            type='data',
+            symmetric=False,
+            array=stats['upper'] - stats['perwinrate'],
+            arrayminus=stats['perwinrate'] - stats['lower'],
+            color='rgba(55, 128, 191, 0.7)',
+            thickness=1.5,
+            width=0
+        ),
         hoverinfo='text',
-        text=[f"Arquetipo: {row['Arquetipo']}<br>Winrate: {row['perwinrate']}%<br>Juegos: {row['n']}<br>Victorias: {row['win']}<br>Derrotas: {row['lose']}<br>Empates: {row['draw']}"
-              for _, row in stats.iterrows()],
+        text=[f"Arquetipo: {a}<br>Winrate: {w}%<br>Juegos: {n}<br>Victorias: {v}<br>Derrotas: {l}<br>Empates: {e}"
+              for a, w, n, v, l, e in zip(stats['Arquetipo'], stats['perwinrate'], stats['n'],
+                                          stats['win'], stats['lose'], stats['draw'])],
         name='Winrate'
     ))
 
-    for _, row in stats.iterrows():
-        fig.add_shape(
-            type='line',
-            x0=row['Arquetipo'], y0=row['lower'],
-            x1=row['Arquetipo'], y1=row['upper'],
-            line=dict(color='rgba(55, 128, 191, 0.7)', width=1.5)
-        )
-
     fig.add_hline(y=50, line_dash="dash", line_color="black")
     fig.add_hline(y=40, line_dash="dash", line_color="red")
     fig.add_hline(y=60, line_dash="dash", line_color="red")
@@ -1019,27 +2958,13 @@ def update_winrate(df, min_juegos):
     return dcc.Graph(figure=fig)
 
 
-def update_winrate_juego(df, color_opcion):
-    stats = df.groupby('Arquetipo').agg({
-        'Standing': 'count',
-        'Wins': 'sum',
-        'Loses': 'sum',
-        'Draws': 'sum',
-        'Top1': 'sum',
-        'Top3': 'sum'
-    }).reset_index()
-
-    stats.columns = ['Arquetipo', 'players', 'win', 'lose', 'draw', 'top1', 'top3']
-    stats['n'] = stats['win'] + stats['lose'] + stats['draw']
-    stats['perwinrate'] = round(stats['win'] / stats['n'] * 100, 2)
-    stats['perjuego'] = round(stats['n'] / stats['n'].sum() * 100, 2)
+def update_winrate_juego(df, color_opcion, ventana=None, version=None):
+    stats = stats_arquetipos(estadisticas_arquetipos(df, ventana, version), ['Winrate', '% Juego'])
     stats = stats[stats['perjuego'] > 1].reset_index(drop=True)
 
     color_var = 'top1' if color_opcion == "Top1" else 'top3'
     color_title = "Torneos ganados" if color_opcion == "Top1" else "Podios (Top3)"
 
-    fig = go.Figure()
-
     valores_unicos = sorted(stats[color_var].unique())
     mapeo_colores = {}
     valores_mayores_cero = [v for v in valores_unicos if v > 0]
@@ -1049,34 +2974,37 @@ def update_winrate_juego(df, color_opcion):
 
     if valores_mayores_cero:
         escala_rojos = px.colors.sequential.Reds[2:]
-        pasos_rojos = [escala_rojos[i] for i in range(len(valores_mayores_cero))]
+        if len(valores_mayores_cero) <= len(escala_rojos):
+            pasos_rojos = escala_rojos[:len(valores_mayores_cero)]
+        else:
+            # Más valores que tonos en la escala: se interpola sobre la misma escala
+            pasos_rojos = px.colors.sample_colorscale(
+                px.colors.make_colorscale(escala_rojos),
+                np.linspace(0, 1, len(valores_mayores_cero)))
         for i, val in enumerate(valores_mayores_cero):
             mapeo_colores[val] = pasos_rojos[i]
 
-    fig.add_trace(go.Scatter(
-        x=stats['perjuego'],
-        y=stats['perwinrate'],
-        mode='markers',
-        marker=dict(
-            size=stats['perjuego'] * 2,
-            color=[mapeo_colores[val] for val in stats[color_var]],
-        ),
-        hoverinfo='text',
-        text=[f"Arquetipo: {row['Arquetipo']}<br>Winrate: {row['perwinrate']}%<br>Juegos: {row['n']}<br>% Juego: {row['perjuego']}%<br>Top1: {row['top1']}<br>Top3: {row['top3']}"
-              for _, row in stats.iterrows()],
-        showlegend=False,
-        name=''
-    ))
+    # Un trace markers+text por valor de color: el nombre del arquetipo va como texto
+    # del punto (no una anotación por fila) y cada trace es su propia entrada de leyenda
+    fig = go.Figure()
 
     for valor_color in valores_unicos:
+        grupo = stats[stats[color_var] == valor_color]
         fig.add_trace(go.Scatter(
-            x=[None],
-            y=[None],
-            mode='markers',
+            x=grupo['perjuego'],
+            y=grupo['perwinrate'],
+            mode='markers+text',
             marker=dict(
-                size=12,
+                size=grupo['perjuego'] * 2,
                 color=mapeo_colores[valor_color],
             ),
+            text=grupo['Arquetipo'],
+            textposition='top center',
+            textfont=dict(size=10),
+            hoverinfo='text',
+            hovertext=[f"Arquetipo: {a}<br>Winrate: {w}%<br>Juegos: {n}<br>% Juego: {j}%<br>Top1: {t1}<br>Top3: {t3}"
+                       for a, w, n, j, t1, t3 in zip(grupo['Arquetipo'], grupo['perwinrate'], grupo['n'],
+                                                     grupo['perjuego'], grupo['top1'], grupo['top3'])],
             name=f'{color_title}: {valor_color}'
         ))
 
@@ -1084,18 +3012,6 @@ def update_winrate_juego(df, color_opcion):
     fig.add_hline(y=40, line_dash="dash", line_color="red")
     fig.add_hline(y=60, line_dash="dash", line_color="red")
 
-    annotations = []
-    for _, row in stats.iterrows():
-        annotations.append(dict(
-            x=row['perjuego'],
-            y=row['perwinrate'],
-            text=row['Arquetipo'],
-            showarrow=False,
-            font=dict(size=10),
-            xanchor='center',
-            yanchor='bottom'
-        ))
-
     fig.update_layout(
         plot_bgcolor='white',
         paper_bgcolor='white',
@@ -1110,7 +3026,6 @@ def update_winrate_juego(df, color_opcion):
             zeroline=False,
             range=[10, 80]
         ),
-        annotations=annotations,
         height=700,
         showlegend=True,
         legend_title_text=color_title
@@ -1119,7 +3034,32 @@ def update_winrate_juego(df, color_opcion):
     return dcc.Graph(figure=fig)
 
 
-def update_heatmap(df_filtrado, min_juegos=30):
+def matriz_cruces(df_cruces):
+    """
+    MatrizCruces de lo que recibe la tab: la del cubo acumulado (DatosVersion.matriz)
+    tal cual, o agregando filas de cruces en una sola pasada (bincount sobre los
+    códigos del diccionario de arquetipos), sin iterar fila por fila.
+
+    Los mazos o resultados faltantes (byes) se tratan igual que en el groupby
+    original: no forman celda, pero las partidas cuentan para el mazo.
+    """
+    if isinstance(df_cruces, MatrizCruces):
+        return df_cruces
+    _, mazo, rival, victorias, partidas, d = celdas_cruces(df_cruces)
+    partidas_por_mazo = np.bincount(mazo, weights=partidas, minlength=d)
+
+    con_par = rival < d
+    celda = mazo[con_par] * d + rival[con_par]
+    victorias_m = np.bincount(celda, weights=victorias[con_par], minlength=d * d).reshape(d, d)
+    partidas_m = np.bincount(celda, weights=partidas[con_par], minlength=d * d).reshape(d, d)
+    presente = np.bincount(celda, minlength=d * d).reshape(d, d) > 0
+
+    nombres = np.asarray(df_cruces['mazo1'].cat.categories, dtype=object)
+    return MatrizCruces(nombres, victorias_m, partidas_m, presente, partidas_por_mazo,
+                        len(df_cruces['fecha'].unique()) if len(df_cruces) else 0)
+
+
+def update_heatmap(df_filtrado, min_juegos=30, ventana=None, version=None):
     if df_filtrado.empty:
         return dcc.Graph(figure=go.Figure().update_layout(
             title="No hay datos disponibles para el heatmap",
@@ -1128,67 +3068,40 @@ def update_heatmap(df_filtrado, min_juegos=30):
         ))
 
     try:
-        df_working = df_filtrado.copy()
-        df_working['cruce'] = df_working.apply(
-            lambda row: ' - '.join(sorted([str(row['mazo1']), str(row['mazo2'])])),
-            axis=1
-        )
-
-        resultados = []
-        for _, row in df_working.iterrows():
-            total_partidas = row['v1'] + row['v2']
-            resultados.append({'mazo': row['mazo1'], 'vs_mazo': row['mazo2'], 'victorias': row['v1'], 'total_partidas': total_partidas, 'cruce': row['cruce']})
-            resultados.append({'mazo': row['mazo2'], 'vs_mazo': row['mazo1'], 'victorias': row['v2'], 'total_partidas': total_partidas, 'cruce': row['cruce']})
-
-        heatmap_data = pd.DataFrame(resultados)
-        heatmap_stats = heatmap_data.groupby(['mazo', 'vs_mazo']).agg({'victorias': 'sum', 'total_partidas': 'sum'}).reset_index()
-        heatmap_stats['winrate'] = round((heatmap_stats['victorias'] / heatmap_stats['total_partidas'].replace(0, 1)) * 100, 1)
-
-        mazo_counts = heatmap_data.groupby('mazo')['total_partidas'].sum()
-        mazos_validos = mazo_counts[mazo_counts >= min_juegos].index
-
-        heatmap_stats = heatmap_stats[heatmap_stats['mazo'].isin(mazos_validos) & heatmap_stats['vs_mazo'].isin(mazos_validos)]
-        all_mazos = sorted(pd.unique(pd.concat([heatmap_stats['mazo'], heatmap_stats['vs_mazo']])))
-        complete_grid = pd.DataFrame(index=all_mazos, columns=all_mazos)
-
-        for _, row in heatmap_stats.iterrows():
-            if row['mazo'] != row['vs_mazo']:
-                complete_grid.loc[row['mazo'], row['vs_mazo']] = row['winrate']
-
-        text_matrix = []
-        hover_matrix = []
-        for mazo_y in complete_grid.index:
-            row_text = []
-            row_hover = []
-            for mazo_x in complete_grid.columns:
-                if mazo_y == mazo_x:
-                    row_text.append("")
-                    row_hover.append("")
-                else:
-                    value = complete_grid.loc[mazo_y, mazo_x]
-                    if pd.notna(value):
-                        match_data = heatmap_stats[(heatmap_stats['mazo'] == mazo_y) & (heatmap_stats['vs_mazo'] == mazo_x)]
-                        if not match_data.empty:
-                            v = int(match_data.iloc[0]['victorias'])
-                            t = int(match_data.iloc[0]['total_partidas'])
-                            row_text.append(f"{value:.0f}%")
-                            row_hover.append(f"{mazo_y} vs {mazo_x}<br>Victorias: {v}<br>Juegos: {t}<br>Winrate: {value:.1f}%")
-                        else:
-                            row_text.append("")
-                            row_hover.append("")
-                    else:
-                        row_text.append("")
-                        row_hover.append("")
-            text_matrix.append(row_text)
-            hover_matrix.append(row_hover)
-
+        matriz = agregado("heatmap", ventana, (), lambda: matriz_cruces(df_filtrado), version=version)
+        avanzar(50, "Armando el heatmap")
+        nombres, victorias, partidas = matriz.nombres, matriz.victorias, matriz.partidas
+        presente, partidas_por_mazo = matriz.presente, matriz.partidas_por_mazo
+
+        # Solo cruces entre mazos con el mínimo de partidas, ordenados por nombre
+        validos = partidas_por_mazo >= min_juegos
+        presente = presente & validos[:, None] & validos[None, :]
+        idx = np.flatnonzero(presente.any(axis=1) | presente.any(axis=0))
+        idx = idx[np.argsort(nombres[idx], kind='stable')]
+        all_mazos = nombres[idx].tolist()
         num_mazos = len(all_mazos)
         tamano_fuente = max(8, 40 / num_mazos**0.5)
 
+        sel = np.ix_(idx, idx)
+        victorias, partidas, presente = victorias[sel], partidas[sel], presente[sel]
+        winrate = np.round(victorias / np.where(partidas == 0, 1, partidas) * 100, 1)
+        visible = presente & ~np.eye(len(idx), dtype=bool)
+
+        # z como object para serializar igual que la grilla original (NaN en celdas vacías)
+        z = np.where(visible, winrate, np.nan).astype(object)
+
+        etiquetas = np.asarray(all_mazos, dtype=str)
+        text_matrix = np.where(visible, np.char.add(np.char.mod('%.0f', winrate), '%'), '').tolist()
+        hover = np.char.add(np.char.add(etiquetas[:, None], ' vs '), etiquetas[None, :])
+        hover = np.char.add(hover, np.char.mod('<br>Victorias: %d', victorias.astype(np.int64)))
+        hover = np.char.add(hover, np.char.mod('<br>Juegos: %d', partidas.astype(np.int64)))
+        hover = np.char.add(hover, np.char.mod('<br>Winrate: %.1f%%', winrate))
+        hover_matrix = np.where(visible, hover, '').tolist()
+
         heatmap = go.Heatmap(
             x=all_mazos,
             y=all_mazos,
-            z=complete_grid.values,
+            z=z,
             colorscale=[[0, 'dodgerblue'], [0.5, 'whitesmoke'], [1.0, 'orangered']],
             zmin=0,
             zmax=100,
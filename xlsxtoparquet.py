@@ -6,55 +6,364 @@ Requiere: pip install pandas openpyxl pyarrow
 
 Uso:
     python convertir_a_parquet.py
+    python convertir_a_parquet.py --incremental
 
 Los archivos .parquet se generan en la misma carpeta que los Excel.
 Luego súbelos a GitHub junto con el código normalmente.
+
+Con --incremental se genera en cambio una carpeta por archivo (metaR/, cruces/)
+particionada por año y mes (anio=AAAA/mes=MM/datos.parquet) y un manifiesto con
+el hash del Excel y de cada partición. Si el Excel no cambió no se lee; si cambió,
+solo se reescriben las particiones con filas nuevas o modificadas. La app usa la
+carpeta en lugar del .parquet cuando existe, así que la conversión normal borra la
+carpeta de una corrida incremental anterior.
+
+De metaR se genera además torneos_arquetipos.parquet: una fila por torneo y
+arquetipo con apariciones, jugadores, W/L/D, Top1 y Top3 sumados. Las tabs que
+solo agregan por arquetipo se responden desde esa tabla, mucho más chica que las
+filas de jugadores.
+
+La conversión normal lee el Excel en streaming (openpyxl en modo solo lectura) y
+escribe el parquet por lotes de filas, con la memoria acotada por el tamaño del lote
+y no por el largo del historial. Los dos archivos se convierten en paralelo.
 """
 
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.io.parsers import TextParser
 from pathlib import Path
 
+from formato_datos import ARCHIVO_TORNEOS, CLAVE_ORIGEN, COLUMNAS_SUMA, MANIFIESTO, agregar_torneos, hash_archivo
+
 # ── Configuración ──────────────────────────────────────────────────────────────
 ARCHIVOS = {
     "metaR.xlsx": "metaR.parquet",
     "cruces.xlsx": "cruces.parquet",
 }
 
-def convertir(excel_path: Path, parquet_path: Path):
-    print(f"Leyendo  {excel_path.name} ...")
-    df = pd.read_excel(excel_path)
+# Columna de fecha de cada archivo: ordena las filas y define la partición
+COLUMNA_FECHA = {
+    "metaR.xlsx": "Fecha",
+    "cruces.xlsx": "fecha",
+}
 
-    # Conversiones de tipo según el archivo
-    if excel_path.name == "metaR.xlsx":
+SIN_FECHA = "__HIVE_DEFAULT_PARTITION__"
+FILAS_POR_GRUPO = 50_000
+FILAS_POR_LOTE = 10_000               # filas del Excel en memoria a la vez; cada lote es un grupo del parquet
+
+# Tabla agregada torneo × arquetipo que se deriva de cada archivo
+AGREGADOS = {
+    "metaR.xlsx": ARCHIVO_TORNEOS,
+}
+
+# Tipos de las columnas conocidas al escribir por lotes: un lote no ve el archivo entero,
+# así que el tipo no puede depender de si trae vacíos. Los enteros quedan enteros con
+# nulos en el parquet y pandas los lee como float solo si hay vacíos, igual que antes.
+# Las columnas que no están acá toman el tipo del primer lote.
+ESQUEMAS = {
+    "metaR.xlsx": {
+        "Fecha": pa.timestamp("ns"), "Fecha2": pa.int64(), "Standing": pa.int64(),
+        "Mes": pa.string(), "Trimestre": pa.int64(), "Liga": pa.string(),
+        "Arquetipo": pa.string(), "Variante": pa.string(), "Jugador": pa.string(),
+        "Wins": pa.int64(), "Loses": pa.int64(), "Draws": pa.int64(),
+        "%VPO": pa.float64(), "%JG": pa.float64(), "%JGO": pa.float64(),
+        "Top3": pa.int64(), "Top1": pa.int64(),
+    },
+    "cruces.xlsx": {
+        "fecha": pa.timestamp("ns"), "ronda": pa.int64(), "mazo1": pa.string(),
+        "mazo2": pa.string(), "v1": pa.float64(), "v2": pa.float64(),
+    },
+}
+
+
+def convertir_tipos(df: pd.DataFrame, nombre: str):
+    # Conversiones de tipo según el archivo; se aplican igual al Excel entero o a un lote
+    if nombre == "metaR.xlsx":
         df['Fecha'] = pd.to_datetime(df['Fecha'], format='%Y.%m.%d', errors='coerce')
         df['Top1']  = pd.to_numeric(df['Top1'],  errors='coerce')
         df['Top3']  = pd.to_numeric(df['Top3'],  errors='coerce')
 
-    elif excel_path.name == "cruces.xlsx":
+    elif nombre == "cruces.xlsx":
         df['fecha'] = pd.to_datetime(df['fecha'], format='%Y.%m.%d', errors='coerce')
 
-    df.to_parquet(parquet_path, index=False, engine='pyarrow')
-    print(f"  ✓ Guardado {parquet_path.name}  ({len(df)} filas, {parquet_path.stat().st_size // 1024} KB)")
+    return df
+
+
+def leer_excel(excel_path: Path):
+    print(f"Leyendo  {excel_path.name} ...")
+    return convertir_tipos(pd.read_excel(excel_path), excel_path.name)
+
+
+def leer_excel_por_lotes(excel_path: Path, filas=FILAS_POR_LOTE):
+    """
+    DataFrames de a `filas` filas de la primera hoja, con los tipos ya convertidos.
+    openpyxl en modo solo lectura va leyendo el xml de la hoja a medida que se piden
+    filas, así que nunca está el archivo entero en memoria. Cada lote pasa por el mismo
+    TextParser que usa pd.read_excel (números escritos como texto, vacíos, "NA", ...) y
+    las filas vacías del final se descartan igual que ahí.
+    """
+    print(f"Leyendo  {excel_path.name} por lotes de {filas} filas ...")
+    libro = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+
+    def a_dataframe(lote):
+        df = TextParser([columnas] + lote, header=0, skip_blank_lines=False).read()
+        return convertir_tipos(df, excel_path.name)
+
+    try:
+        hoja_filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = next(hoja_filas, ())
+        columnas = [f"Unnamed: {i}" if c is None else c for i, c in enumerate(encabezado)]
+        ancho = len(columnas)
+        vacia = (None,) * ancho
+        lote = []
+        vacias = 0          # filas vacías pendientes: solo se agregan si después hay datos
+        emitido = False
+        for fila in hoja_filas:
+            # En modo solo lectura las filas pueden venir más cortas o más largas que el encabezado
+            fila = (tuple(fila) + vacia)[:ancho]
+            if fila == vacia:
+                vacias += 1
+                continue
+            for _ in range(vacias):
+                lote.append(vacia)
+                if len(lote) == filas:
+                    yield a_dataframe(lote)
+                    lote, emitido = [], True
+            vacias = 0
+            lote.append(fila)
+            if len(lote) == filas:
+                yield a_dataframe(lote)
+                lote, emitido = [], True
+        # Una hoja sin filas deja igual un parquet con las columnas del encabezado
+        if lote or not emitido:
+            yield a_dataframe(lote)
+    finally:
+        libro.close()
+
+
+def esquema_lotes(lote: pd.DataFrame, nombre: str):
+    """Esquema fijo del parquet: los tipos de ESQUEMAS y, para el resto, los del primer lote."""
+    conocidos = ESQUEMAS.get(nombre, {})
+    inferido = pa.Schema.from_pandas(lote, preserve_index=False)
+    campos = [pa.field(f.name, conocidos.get(f.name, f.type)) for f in inferido]
+    return pa.schema(campos, metadata=inferido.metadata)
+
+
+def convertir(excel_path: Path, parquet_path: Path):
+    # Se escribe a un temporal y se reemplaza de una vez: la app recarga los parquet
+    # en caliente y nunca debe leer un archivo a medio escribir
+    tmp_path = parquet_path.with_suffix(".parquet.tmp")
+    con_agregado = excel_path.name in AGREGADOS
+    agregado = None
+    escritor = None
+    filas = 0
+    try:
+        # Cada lote es un grupo de filas del parquet; del Excel solo queda en memoria el
+        # lote actual y, para metaR, la tabla agregada (una fila por torneo y arquetipo)
+        for lote in leer_excel_por_lotes(excel_path):
+            if escritor is None:
+                escritor = pq.ParquetWriter(tmp_path, esquema_lotes(lote, excel_path.name))
+            escritor.write_table(pa.Table.from_pandas(lote, schema=escritor.schema, preserve_index=False))
+            if con_agregado:
+                agregado = combinar_agregados(agregado, agregar_lote(lote, filas))
+            filas += len(lote)
+    except BaseException:
+        if escritor is not None:
+            escritor.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    escritor.close()
+    os.replace(tmp_path, parquet_path)
+    print(f"  ✓ Guardado {parquet_path.name}  ({filas} filas, {parquet_path.stat().st_size // 1024} KB)")
+    descartar_dataset(parquet_path.with_suffix(""))
+    if con_agregado:
+        escribir_agregado(terminar_agregado(agregado), excel_path, parquet_path)
+
+
+# ── Tabla agregada torneo × arquetipo ──────────────────────────────────────────
+def agregar_lote(lote: pd.DataFrame, primera_fila: int):
+    """
+    Agregado parcial de un lote de metaR, con la posición en el Excel de la primera fila
+    de cada grupo (_fila) para poder ordenar al final como agregar_torneos.
+    """
+    lote = lote.rename(columns=str.strip)
+    lote = lote.assign(_fila=np.arange(primera_fila, primera_fila + len(lote)))
+    lote = lote[lote['Fecha'].notna()]
+    return lote.groupby(['Fecha', 'Arquetipo'], sort=False, dropna=False).agg(
+        _fila=('_fila', 'min'),
+        Apariciones=('Fecha', 'size'),
+        Jugadores=('Standing', 'count'),
+        **{c: (c, 'sum') for c in COLUMNAS_SUMA}
+    ).reset_index()
+
+
+def combinar_agregados(acumulado, parcial: pd.DataFrame):
+    if acumulado is None:
+        return parcial
+    return pd.concat([acumulado, parcial], ignore_index=True).groupby(
+        ['Fecha', 'Arquetipo'], sort=False, dropna=False).agg(
+        _fila=('_fila', 'min'),
+        **{c: (c, 'sum') for c in ['Apariciones', 'Jugadores'] + COLUMNAS_SUMA}
+    ).reset_index()
+
+
+def terminar_agregado(acumulado: pd.DataFrame):
+    """Mismo resultado que agregar_torneos sobre el archivo entero: por fecha y primera aparición."""
+    agregado = acumulado.sort_values(['Fecha', '_fila'], kind='stable').drop(columns='_fila')
+    return agregado.reset_index(drop=True).astype({c: 'int64' for c in ['Apariciones', 'Jugadores'] + COLUMNAS_SUMA})
+
+
+def agregado_vigente(excel_path: Path, origen: Path):
+    """True si el archivo no tiene tabla agregada o la suya se generó desde `origen` tal como está."""
+    nombre = AGREGADOS.get(excel_path.name)
+    if nombre is None:
+        return True
+    path = excel_path.with_name(nombre)
+    if not path.exists() or not origen.exists():
+        return False
+    metadatos = pq.read_schema(path).metadata or {}
+    return metadatos.get(CLAVE_ORIGEN) == hash_archivo(origen).encode()
+
+
+def escribir_agregado(agregado: pd.DataFrame, excel_path: Path, origen: Path):
+    """
+    Escribe la tabla agregada del archivo con el hash de `origen` (el parquet o el
+    manifiesto recién escrito) en los metadatos: la app solo la usa si coincide.
+    """
+    path = excel_path.with_name(AGREGADOS[excel_path.name])
+    tabla = pa.Table.from_pandas(agregado, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({**tabla.schema.metadata, CLAVE_ORIGEN: hash_archivo(origen).encode()})
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(tabla, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"  ✓ Guardado {path.name}  ({tabla.num_rows} filas, {path.stat().st_size // 1024} KB)")
+
+
+# ── Modo incremental ───────────────────────────────────────────────────────────
+
+
+def claves_particion(fechas: pd.Series):
+    """'anio=AAAA/mes=MM' por fila; las filas sin fecha van a la partición nula de Hive."""
+    claves = "anio=" + fechas.dt.strftime("%Y") + "/mes=" + fechas.dt.strftime("%m")
+    return claves.fillna(f"anio={SIN_FECHA}/mes={SIN_FECHA}")
+
+
+def escribir_particion(df: pd.DataFrame, esquema: pa.Schema, path: Path):
+    # Mismo esquema en todas las particiones (una columna vacía en un mes no cambia de tipo),
+    # grupos de filas ordenados por fecha y con estadísticas min/max
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tabla = pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(tabla, tmp_path, row_group_size=FILAS_POR_GRUPO, write_statistics=True)
+    os.replace(tmp_path, path)
+
+
+def borrar_particion(path: Path):
+    path.unlink(missing_ok=True)
+    for carpeta in (path.parent, path.parent.parent):
+        if carpeta.exists() and not any(carpeta.iterdir()):
+            carpeta.rmdir()
+
+
+def descartar_dataset(dataset_path: Path):
+    """
+    Borra la carpeta de una corrida --incremental anterior: la app la prefiere al
+    parquet único y seguiría sirviendo sus datos viejos. Primero el manifiesto, así la
+    app pasa al parquet aunque el borrado de las particiones quede a medias.
+    """
+    manifiesto_path = dataset_path / MANIFIESTO
+    if not manifiesto_path.exists():
+        return
+    manifiesto_path.unlink()
+    shutil.rmtree(dataset_path)
+    print(f"  ✓ Eliminada la carpeta {dataset_path.name}/ de una corrida incremental anterior")
+
+
+def convertir_incremental(excel_path: Path, dataset_path: Path):
+    manifiesto_path = dataset_path / MANIFIESTO
+    previo = json.loads(manifiesto_path.read_text(encoding="utf-8")) if manifiesto_path.exists() else {}
+    particiones_previas = previo.get("particiones", {})
+
+    hash_excel = hash_archivo(excel_path)
+    if previo.get("excel") == hash_excel and agregado_vigente(excel_path, manifiesto_path):
+        print(f"  ✓ {excel_path.name} sin cambios, no se lee")
+        return
+
+    columna = COLUMNA_FECHA[excel_path.name]
+    df = leer_excel(excel_path).sort_values(columna, kind="stable")
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    firma_esquema = esquema.remove_metadata().to_string().encode()
+
+    # Hash por fila; el de cada partición no depende del orden de las filas en el Excel
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    particiones = {}
+    reescritas = filas_reescritas = 0
+    for clave, posiciones in df.groupby(claves_particion(df[columna]).to_numpy()).indices.items():
+        digest = hashlib.blake2b(firma_esquema + np.sort(hashes[posiciones]).tobytes(), digest_size=16).hexdigest()
+        particiones[clave] = {"digest": digest, "filas": len(posiciones)}
+        if particiones_previas.get(clave, {}).get("digest") == digest:
+            continue
+        escribir_particion(df.iloc[posiciones], esquema, dataset_path / clave / "datos.parquet")
+        reescritas += 1
+        filas_reescritas += len(posiciones)
+
+    borradas = [clave for clave in particiones_previas if clave not in particiones]
+    for clave in borradas:
+        borrar_particion(dataset_path / clave / "datos.parquet")
+
+    # El manifiesto va al final: la app lo usa como señal (y versión) de una carga completa
+    tmp_path = dataset_path / f".{MANIFIESTO}.tmp"
+    tmp_path.write_text(json.dumps({"excel": hash_excel, "particiones": particiones}, indent=1), encoding="utf-8")
+    os.replace(tmp_path, manifiesto_path)
+    print(f"  ✓ {dataset_path.name}/: {reescritas} particiones reescritas ({filas_reescritas} filas), "
+          f"{len(borradas)} eliminadas, {len(particiones) - reescritas} sin cambios")
+    if excel_path.name in AGREGADOS:
+        escribir_agregado(agregar_torneos(df), excel_path, manifiesto_path)
+
 
 # ── Ejecución ──────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte metaR.xlsx y cruces.xlsx a parquet")
+    parser.add_argument("--incremental", action="store_true",
+                        help="dataset particionado por año/mes que solo reescribe lo que cambió")
+    args = parser.parse_args()
+
     base = Path(__file__).parent          # misma carpeta que este script
     errores = []
 
-    for excel_nombre, parquet_nombre in ARCHIVOS.items():
-        excel_path   = base / excel_nombre
-        parquet_path = base / parquet_nombre
+    # Un proceso por archivo: leer el Excel es casi todo CPU en openpyxl
+    with ProcessPoolExecutor(max_workers=len(ARCHIVOS)) as pool:
+        trabajos = {}
+        for excel_nombre, parquet_nombre in ARCHIVOS.items():
+            excel_path   = base / excel_nombre
+            parquet_path = base / parquet_nombre
 
-        if not excel_path.exists():
-            print(f"  ✗ No encontrado: {excel_path}  (¿está en la misma carpeta?)")
-            errores.append(excel_nombre)
-            continue
+            if not excel_path.exists():
+                print(f"  ✗ No encontrado: {excel_path}  (¿está en la misma carpeta?)")
+                errores.append(excel_nombre)
+                continue
+
+            if args.incremental:
+                trabajos[excel_nombre] = pool.submit(convertir_incremental, excel_path, base / Path(parquet_nombre).stem)
+            else:
+                trabajos[excel_nombre] = pool.submit(convertir, excel_path, parquet_path)
 
-        try:
-            convertir(excel_path, parquet_path)
-        except Exception as e:
-            print(f"  ✗ Error al convertir {excel_nombre}: {e}")
-            errores.append(excel_nombre)
+        for excel_nombre, trabajo in trabajos.items():
+            try:
+                trabajo.result()
+            except Exception as e:
+                print(f"  ✗ Error al convertir {excel_nombre}: {e}")
+                errores.append(excel_nombre)
 
     print()
     if errores: